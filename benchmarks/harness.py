@@ -0,0 +1,172 @@
+"""This module runs the compiler benchmarks.  Each benchmark compiles a
+synthetic program of a given shape a number of times, and records the best
+time of each phase of the compile, as reported by the profiler, along with its
+counters.  The results can be saved as a baseline, and later results compared
+against it to find regressions.  Each benchmark is run in a fresh process, so
+the peak memory it reports is its own.
+
+In offline mode the programs make no library calls, and are only generated,
+not assembled, so the JVM is never run.  Offline and online results are kept
+apart in the baseline, since they measure different work.
+"""
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+from benchmarks.program_generator import ProgramGenerator, ProgramShape
+from code_generation.code_generator import CodeGenerator
+from semantic_analysis.semantic_analyser import clear_lib_checker_cache
+from utilities.profiler import profiler, PHASES
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# The benchmarks, as (name, shape) tuples
+BENCHMARKS = [
+    ('small', ProgramShape(classes = 1, methods = 2, statements = 20,
+                           depth = 2, lib_call_density = 0.05)),
+    ('many_classes', ProgramShape(classes = 20, methods = 4, statements = 20,
+                                  depth = 2, lib_call_density = 0.05)),
+    ('long_methods', ProgramShape(classes = 2, methods = 2, statements = 300,
+                                  depth = 2, lib_call_density = 0.05)),
+    ('deep_exprs', ProgramShape(classes = 2, methods = 2, statements = 20,
+                                depth = 40, lib_call_density = 0.05)),
+    ('lib_calls', ProgramShape(classes = 2, methods = 4, statements = 40,
+                               depth = 2, lib_call_density = 0.5))]
+
+# Phases faster than this, in seconds, are too noisy to compare
+MIN_TIME = 0.005
+
+def run_benchmark(shape, offline = False, repeats = 3,
+                  parser_backend = 'earley'):
+    """Compile a program of the given shape repeats times, with the given
+    parser backend, and return the best time of each phase, the best total
+    time, the counters, and the peak resident memory of the process in KB.
+    """
+    if offline:
+        shape = ProgramShape(shape.classes, shape.methods, shape.statements,
+                             shape.depth, 0.0)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = ProgramGenerator(shape).write(tmp_dir)
+        times = dict()
+        total = None
+        counts = dict()
+        for _ in range(repeats):
+            # Each compile checks library calls afresh, as a separate run
+            # of jamlcomp would
+            clear_lib_checker_cache()
+            profiler.reset()
+            profiler.enabled = True
+            try:
+                code_gen = CodeGenerator(parser_backend = parser_backend)
+                if offline:
+                    code_gen.generate(path)
+                else:
+                    code_gen.compile_(path, tmp_dir, True)
+            finally:
+                profiler.enabled = False
+            data = profiler.to_dict()
+            for phase in data['phases']:
+                times[phase['name']] = min(times.get(phase['name'],
+                                                     phase['time']),
+                                           phase['time'])
+            if total is None or data['total_time'] < total:
+                total = data['total_time']
+            counts = data['counts']
+        profiler.reset()
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {'shape': shape.to_dict(), 'phases': times, 'total': total,
+                'counts': counts, 'peak_rss_kb': peak_rss}
+    finally:
+        shutil.rmtree(tmp_dir)
+
+def run_benchmarks(names = None, offline = False, repeats = 3,
+                   parser_backend = 'earley'):
+    """Run the benchmarks with the given names, or all of them, and return
+    their results indexed by name.
+    """
+    results = dict()
+    for name, shape in BENCHMARKS:
+        if names and name not in names:
+            continue
+        pool = multiprocessing.Pool(1)
+        try:
+            results[name] = pool.apply(run_benchmark,
+                                       (shape, offline, repeats,
+                                        parser_backend))
+        finally:
+            pool.terminate()
+    return results
+
+def load_baseline(path = BASELINE_PATH):
+    """Load the stored baseline, or an empty one if there is none."""
+    try:
+        return json.load(open(path))
+    except (IOError, ValueError):
+        return {'offline': {}, 'online': {}}
+
+def save_baseline(results, offline, path = BASELINE_PATH):
+    """Store results as the baseline for their mode, keeping the baseline
+    of the other mode.
+    """
+    baseline = load_baseline(path)
+    baseline[_get_mode(offline)].update(results)
+    out_file = open(path, 'w')
+    json.dump(baseline, out_file, indent = 1, sort_keys = True)
+    out_file.write('\n')
+    out_file.close()
+
+def compare(results, baseline, offline, tolerance = 0.25):
+    """Compare results with the baseline of their mode.  Returns a list of
+    (benchmark, phase, baseline time, time) tuples for each phase which is
+    more than tolerance slower, and a list of (benchmark, counter, baseline
+    value, value) tuples for each counter which has changed.
+    """
+    regressions = []
+    changed_counts = []
+    base_results = baseline.get(_get_mode(offline), {})
+    for name in sorted(results):
+        base = base_results.get(name)
+        if base is None:
+            continue
+        result = results[name]
+        times = dict(result['phases'], total = result['total'])
+        base_times = dict(base['phases'], total = base['total'])
+        for phase in sorted(times):
+            if phase not in base_times:
+                continue
+            base_time = base_times[phase]
+            if (times[phase] > base_time * (1 + tolerance) and
+                    times[phase] - base_time > MIN_TIME):
+                regressions.append((name, phase, base_time, times[phase]))
+        for counter in sorted(result['counts']):
+            base_count = base['counts'].get(counter)
+            if (base_count is not None and
+                    result['counts'][counter] != base_count):
+                changed_counts.append((name, counter, base_count,
+                                       result['counts'][counter]))
+    return regressions, changed_counts
+
+def format_results(results):
+    """Get a human readable table of results."""
+    lines = []
+    for name in sorted(results):
+        result = results[name]
+        lines.append(name + ' ' + json.dumps(result['shape'],
+                                             sort_keys = True))
+        for phase in PHASES:
+            if phase in result['phases']:
+                lines.append('    %-12s %10.4f' % (phase,
+                                                  result['phases'][phase]))
+        lines.append('    %-12s %10.4f' % ('total', result['total']))
+        if 'peak_rss_kb' in result:
+            lines.append('    %-12s %10d' % ('peak rss kb',
+                                             result['peak_rss_kb']))
+    return '\n'.join(lines)
+
+def _get_mode(offline):
+    if offline:
+        return 'offline'
+    return 'online'
@@ -0,0 +1,15 @@
+/**
+ * The Java baseline of the ArrayLoop kernel.
+ */
+public class ArrayLoopJava {
+    public static void main(String[] args) {
+        int[] a = new int[Integer.parseInt(args[0])];
+        for (int i = 0; i < a.length; i++) {
+            a[i] = i * 2;
+        }
+        long sum = 0;
+        for (int j = 0; j < a.length; j++) {
+            sum = sum + a[j];
+        }
+    }
+}
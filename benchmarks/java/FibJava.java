@@ -0,0 +1,16 @@
+/**
+ * The Java baseline of the Fib kernel.
+ */
+public class FibJava {
+    static int fib(int n) {
+        int ret = n;
+        if (n > 1) {
+            ret = fib(n - 1) + fib(n - 2);
+        }
+        return ret;
+    }
+
+    public static void main(String[] args) {
+        int x = fib(Integer.parseInt(args[0]));
+    }
+}
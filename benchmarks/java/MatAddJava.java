@@ -0,0 +1,22 @@
+/**
+ * The Java baseline of the MatAdd kernel.
+ */
+public class MatAddJava {
+    public static void main(String[] args) {
+        int size = Integer.parseInt(args[0]);
+        double[][] a = new double[size][size];
+        double[][] b = new double[size][size];
+        for (int i = 0; i < size; i++) {
+            for (int j = 0; j < size; j++) {
+                a[i][j] = i + j;
+                b[i][j] = i - j;
+            }
+        }
+        double[][] c = new double[size][size];
+        for (int i = 0; i < size; i++) {
+            for (int j = 0; j < size; j++) {
+                c[i][j] = a[i][j] + b[i][j];
+            }
+        }
+    }
+}
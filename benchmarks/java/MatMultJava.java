@@ -0,0 +1,26 @@
+/**
+ * The Java baseline of the MatMult kernel.
+ */
+public class MatMultJava {
+    public static void main(String[] args) {
+        int size = Integer.parseInt(args[0]);
+        double[][] a = new double[size][size];
+        double[][] b = new double[size][size];
+        for (int i = 0; i < size; i++) {
+            for (int j = 0; j < size; j++) {
+                a[i][j] = i + j;
+                b[i][j] = i - j;
+            }
+        }
+        double[][] c = new double[size][size];
+        for (int i = 0; i < size; i++) {
+            for (int j = 0; j < size; j++) {
+                double sum = 0;
+                for (int k = 0; k < size; k++) {
+                    sum += a[i][k] * b[k][j];
+                }
+                c[i][j] = sum;
+            }
+        }
+    }
+}
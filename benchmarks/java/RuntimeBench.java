@@ -0,0 +1,56 @@
+import java.lang.management.ManagementFactory;
+import java.lang.reflect.Method;
+
+/**
+ * Runs the main methods of benchmark kernels in a single JVM, measuring how
+ * many times each can be run a second, and the bytes allocated by each run.
+ */
+public class RuntimeBench {
+    /**
+     * Runs each kernel for warmupMs milliseconds, so it can be compiled by the
+     * JIT, then for measureMs milliseconds while it is measured.  For each
+     * kernel prints a line holding its class name, the number of runs
+     * measured, the time they took in nanoseconds, and the bytes they
+     * allocated.
+     *
+     * @param args First arg is warmupMs, second is measureMs, followed by a
+     *             class name and the argument to pass to its main method for
+     *             each kernel.
+     */
+    public static void main(String[] args) throws Exception {
+        long warmupNs = Long.parseLong(args[0]) * 1000000L;
+        long measureNs = Long.parseLong(args[1]) * 1000000L;
+        com.sun.management.ThreadMXBean threads =
+            (com.sun.management.ThreadMXBean)
+            ManagementFactory.getThreadMXBean();
+        long threadId = Thread.currentThread().getId();
+        for (int i = 2; i + 1 < args.length; i += 2) {
+            Method main = Class.forName(args[i]).getMethod("main",
+                                                           String[].class);
+            Object[] mainArgs = {new String[] {args[i + 1]}};
+            run(main, mainArgs, warmupNs);
+            long bytes = threads.getThreadAllocatedBytes(threadId);
+            long start = System.nanoTime();
+            long runs = run(main, mainArgs, measureNs);
+            long time = System.nanoTime() - start;
+            bytes = threads.getThreadAllocatedBytes(threadId) - bytes;
+            System.out.println(args[i] + " " + runs + " " + time + " " +
+                               bytes);
+        }
+    }
+
+    /**
+     * Runs a main method repeatedly for at least the given time, and returns
+     * the number of runs.
+     */
+    private static long run(Method main, Object[] mainArgs, long timeNs)
+            throws Exception {
+        long runs = 0;
+        long end = System.nanoTime() + timeNs;
+        do {
+            main.invoke(null, mainArgs);
+            runs++;
+        } while (System.nanoTime() < end);
+        return runs;
+    }
+}
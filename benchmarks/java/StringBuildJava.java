@@ -0,0 +1,12 @@
+/**
+ * The Java baseline of the StringBuild kernel.
+ */
+public class StringBuildJava {
+    public static void main(String[] args) {
+        int size = Integer.parseInt(args[0]);
+        String s = "";
+        for (int i = 0; i < size; i++) {
+            s = s + "x";
+        }
+    }
+}
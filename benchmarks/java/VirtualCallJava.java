@@ -0,0 +1,32 @@
+/**
+ * The Java baseline of the VirtualCall kernel.
+ */
+public class VirtualCallJava {
+    static class Shape {
+        int area() {
+            return 1;
+        }
+    }
+
+    static class Square extends Shape {
+        int area() {
+            return 4;
+        }
+    }
+
+    static class Rect extends Shape {
+        int area() {
+            return 6;
+        }
+    }
+
+    public static void main(String[] args) {
+        int size = Integer.parseInt(args[0]);
+        Shape a = new Square();
+        Shape b = new Rect();
+        int total = 0;
+        for (int i = 0; i < size; i++) {
+            total = total + a.area() + b.area();
+        }
+    }
+}
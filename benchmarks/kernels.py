@@ -0,0 +1,153 @@
+"""This module holds the corpus of JaML kernels which the runtime benchmarks
+measure the generated code with.  Each kernel is a set of class templates,
+filled in with its class name and problem size, and the name of the hand
+written Java class in ./java/ which does the same work.  The Java classes read
+the size from their first argument instead.
+"""
+
+class Kernel(object):
+    """A runtime benchmark kernel.  templates maps the suffix of the name of
+    each class to its source template; the main class has no suffix.
+    """
+    def __init__(self, name, templates, sizes, java_class):
+        self._name = name
+        self._templates = templates
+        self._sizes = sizes
+        self._java_class = java_class
+
+    def get_class_name(self, size):
+        """Get the name of the main class of the kernel for a size."""
+        return self._name + str(size)
+
+    def get_sources(self, size):
+        """Get the source of each class of the kernel for a size, indexed by
+        class name.
+        """
+        name = self.get_class_name(size)
+        return dict((name + suffix, template % {'name': name, 'size': size})
+                    for suffix, template in self._templates.items())
+
+    def _get_name(self):
+        return self._name
+
+    def _get_sizes(self):
+        return self._sizes
+
+    def _get_java_class(self):
+        return self._java_class
+
+    name = property(_get_name)
+    sizes = property(_get_sizes)
+    java_class = property(_get_java_class)
+
+MAT_MULT = '''class %(name)s {
+    static void main(String[] args) {
+        int size = %(size)d;
+        matrix A = |size, size|;
+        matrix B = |size, size|;
+        for (int i = 0; i < size; i++) {
+            for (int j = 0; j < size; j++) {
+                A|i,j| = i + j;
+                B|i,j| = i - j;
+            }
+        }
+        matrix C = A * B;
+    }
+}
+'''
+
+MAT_ADD = '''class %(name)s {
+    static void main(String[] args) {
+        int size = %(size)d;
+        matrix A = |size, size|;
+        matrix B = |size, size|;
+        for (int i = 0; i < size; i++) {
+            for (int j = 0; j < size; j++) {
+                A|i,j| = i + j;
+                B|i,j| = i - j;
+            }
+        }
+        matrix C = A + B;
+    }
+}
+'''
+
+FIB = '''class %(name)s {
+    static int fib(int n) {
+        int ret = n;
+        if (n > 1) {
+            ret = %(name)s.fib(n - 1) + %(name)s.fib(n - 2);
+        }
+        return ret;
+    }
+
+    static void main(String[] args) {
+        int x = %(name)s.fib(%(size)d);
+    }
+}
+'''
+
+STRING_BUILD = '''class %(name)s {
+    static void main(String[] args) {
+        String s = "";
+        for (int i = 0; i < %(size)d; i++) {
+            s = s + "x";
+        }
+    }
+}
+'''
+
+ARRAY_LOOP = '''class %(name)s {
+    static void main(String[] args) {
+        int[] a = new int[%(size)d];
+        for (int i = 0; i < a.length; i++) {
+            a[i] = i * 2;
+        }
+        long sum = 0;
+        for (int j = 0; j < a.length; j++) {
+            sum = sum + a[j];
+        }
+    }
+}
+'''
+
+VIRTUAL_CALL = {
+    '': '''class %(name)s {
+    static void main(String[] args) {
+        %(name)sShape a = new %(name)sSquare();
+        %(name)sShape b = new %(name)sRect();
+        int total = 0;
+        for (int i = 0; i < %(size)d; i++) {
+            total = total + a.area() + b.area();
+        }
+    }
+}
+''',
+    'Shape': '''class %(name)sShape {
+    int area() {
+        return 1;
+    }
+}
+''',
+    'Square': '''class %(name)sSquare extends %(name)sShape {
+    int area() {
+        return 4;
+    }
+}
+''',
+    'Rect': '''class %(name)sRect extends %(name)sShape {
+    int area() {
+        return 6;
+    }
+}
+'''}
+
+KERNELS = [Kernel('MatMult', {'': MAT_MULT}, [16, 64, 128], 'MatMultJava'),
+           Kernel('MatAdd', {'': MAT_ADD}, [16, 64, 256], 'MatAddJava'),
+           Kernel('Fib', {'': FIB}, [15, 25], 'FibJava'),
+           Kernel('StringBuild', {'': STRING_BUILD}, [100, 1000],
+                  'StringBuildJava'),
+           Kernel('ArrayLoop', {'': ARRAY_LOOP}, [1000, 100000],
+                  'ArrayLoopJava'),
+           Kernel('VirtualCall', VIRTUAL_CALL, [1000, 100000],
+                  'VirtualCallJava')]
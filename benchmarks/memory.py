@@ -0,0 +1,58 @@
+"""This module measures the memory taken by the ASTs of large synthetic
+programs.  It counts the size of the nodes themselves, their attribute
+dictionaries if they have them, and the containers holding their children, but
+not the values they hold, which are mostly strings shared with the tokens.
+"""
+import sys
+from benchmarks.program_generator import ProgramGenerator, ProgramShape
+from parser_.parser_ import Parser
+
+# The programs measured, as (name, shape) tuples
+PROGRAMS = [
+    ('long_methods', ProgramShape(classes = 1, methods = 4, statements = 500,
+                                  depth = 2)),
+    ('deep_exprs', ProgramShape(classes = 1, methods = 2, statements = 50,
+                                depth = 60))]
+
+def measure_ast_memory(shape):
+    """Parse a program of the given shape, and return the number of nodes in
+    its ASTs and the bytes they take.
+    """
+    to_visit = []
+    for name, source in ProgramGenerator(shape).generate_program():
+        to_visit.extend(Parser('file').parse_source(source))
+    num_nodes = 0
+    num_bytes = 0
+    while to_visit:
+        node = to_visit.pop()
+        num_nodes += 1
+        num_bytes += sys.getsizeof(node)
+        if hasattr(node, '__dict__'):
+            num_bytes += sys.getsizeof(node.__dict__)
+        if not node.is_leaf:
+            num_bytes += sys.getsizeof(node.children)
+            to_visit.extend(node.children)
+    return num_nodes, num_bytes
+
+def run_memory_benchmarks():
+    """Measure the ASTs of each program, and return the results indexed by
+    program name.
+    """
+    results = dict()
+    for name, shape in PROGRAMS:
+        num_nodes, num_bytes = measure_ast_memory(shape)
+        results[name] = {'shape': shape.to_dict(), 'nodes': num_nodes,
+                         'bytes': num_bytes,
+                         'bytes_per_node': num_bytes / float(num_nodes)}
+    return results
+
+def format_memory_results(results):
+    """Get a human readable table of memory results."""
+    lines = ['%-16s %10s %12s %14s' % ('Program', 'Nodes', 'Bytes',
+                                       'Bytes/node')]
+    for name in sorted(results):
+        result = results[name]
+        lines.append('%-16s %10d %12d %14.1f' % (name, result['nodes'],
+                                                  result['bytes'],
+                                                  result['bytes_per_node']))
+    return '\n'.join(lines)
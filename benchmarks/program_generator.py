@@ -0,0 +1,184 @@
+"""This module generates synthetic JaML programs to benchmark the compiler
+with.  The size and shape of a program is given by a ProgramShape, and the
+same shape and seed always give the same program.
+
+Every class but the main one is created and called from the main method of
+the main class, so the compiler finds all of them from the main class's file.
+Methods only use local variables and fields, never parameters, so programs
+without library calls can be type checked without running the JVM.
+"""
+import os
+import random
+
+class ProgramShape(object):
+    """The size and shape of a synthetic program.  lib_call_density is the
+    fraction of statements which call a library method.
+    """
+    def __init__(self, classes = 1, methods = 1, statements = 10, depth = 2,
+                 lib_call_density = 0.0):
+        self._classes = classes
+        self._methods = methods
+        self._statements = statements
+        self._depth = depth
+        self._lib_call_density = lib_call_density
+
+    def to_dict(self):
+        """Get the shape as a dict, which can be written as JSON."""
+        return {'classes': self._classes, 'methods': self._methods,
+                'statements': self._statements, 'depth': self._depth,
+                'lib_call_density': self._lib_call_density}
+
+    def _get_classes(self):
+        return self._classes
+
+    def _get_methods(self):
+        return self._methods
+
+    def _get_statements(self):
+        return self._statements
+
+    def _get_depth(self):
+        return self._depth
+
+    def _get_lib_call_density(self):
+        return self._lib_call_density
+
+    classes = property(_get_classes)
+    methods = property(_get_methods)
+    statements = property(_get_statements)
+    depth = property(_get_depth)
+    lib_call_density = property(_get_lib_call_density)
+
+class ProgramGenerator(object):
+    """Generates the source of synthetic programs."""
+    def __init__(self, shape, seed = 0):
+        self._shape = shape
+        self._random = random.Random(seed)
+        # The lines of the class being generated
+        self._lines = []
+        # The local variables declared in the method being generated
+        self._locals = []
+
+    def write(self, out_dir, prefix = 'Bench'):
+        """Write the source file of each class to out_dir, and return the
+        path of the main class's file.
+        """
+        sources = self.generate_program(prefix)
+        for name, source in sources:
+            out_file = open(os.path.join(out_dir, name + '.jml'), 'w')
+            out_file.write(source)
+            out_file.close()
+        return os.path.join(out_dir, sources[0][0] + '.jml')
+
+    def generate_program(self, prefix = 'Bench'):
+        """Get the name and source of each class in the program, main class
+        first.
+        """
+        names = [prefix + str(i) for i in range(self._shape.classes)]
+        sources = []
+        for idx, name in enumerate(names):
+            others = None
+            if idx == 0:
+                others = names[1:]
+            sources.append((name, self.generate_class(name, others)))
+        return sources
+
+    def generate_class(self, name, others = None):
+        """Get the source of a class.  If others is given, the class has a
+        main method which creates an instance of each of the other classes
+        and calls their methods.
+        """
+        self._lines = ['class ' + name + ' {', '    int total;']
+        for idx in range(self._shape.methods):
+            self._gen_method(idx)
+        if others is not None:
+            self._gen_main(name, others)
+        self._lines.append('}')
+        return '\n'.join(self._lines) + '\n'
+
+    def _gen_method(self, idx):
+        """Generate a method which returns the value of its last local."""
+        self._locals = []
+        self._lines.append('    int m' + str(idx) + '() {')
+        self._gen_decl(2)
+        for _ in range(self._shape.statements - 1):
+            self._gen_statement(2)
+        self._lines.append('        total = ' + self._locals[-1] + ';')
+        self._lines.append('        return total;')
+        self._lines.append('    }')
+
+    def _gen_main(self, name, others):
+        """Generate the main method, which calls each method of each class."""
+        self._lines.append('    static void main(String[] args) {')
+        self._lines.append('        int sum = 0;')
+        for idx, class_name in enumerate([name] + others):
+            var = 'o' + str(idx)
+            self._lines.append('        ' + class_name + ' ' + var +
+                               ' = new ' + class_name + '();')
+            for method in range(self._shape.methods):
+                self._lines.append('        sum = sum + ' + var + '.m' +
+                                   str(method) + '();')
+        self._lines.append('    }')
+
+    def _gen_statement(self, indent):
+        """Generate a random statement."""
+        if self._random.random() < self._shape.lib_call_density:
+            self._gen_lib_call(indent)
+            return
+        kind = self._random.choice(['decl', 'decl', 'assign', 'if', 'while'])
+        if kind == 'decl':
+            self._gen_decl(indent)
+        elif kind == 'assign':
+            self._add_line(indent, self._random.choice(self._locals) + ' = ' +
+                           self._gen_expr(self._shape.depth) + ';')
+        elif kind == 'if':
+            self._add_line(indent, 'if (' + self._gen_expr(1) + ' > ' +
+                           self._gen_expr(1) + ') {')
+            self._add_line(indent + 1, self._random.choice(self._locals) +
+                           ' = ' + self._gen_expr(self._shape.depth) + ';')
+            self._add_line(indent, '} else {')
+            self._add_line(indent + 1, self._random.choice(self._locals) +
+                           ' = ' + self._gen_expr(self._shape.depth) + ';')
+            self._add_line(indent, '}')
+        else:
+            counter = self._new_local()
+            self._add_line(indent, 'int ' + counter + ' = 0;')
+            self._add_line(indent, 'while (' + counter + ' < ' +
+                           str(self._random.randint(1, 10)) + ') {')
+            self._add_line(indent + 1, counter + ' = ' + counter + ' + 1;')
+            self._add_line(indent, '}')
+
+    def _gen_decl(self, indent):
+        expr = self._gen_expr(self._shape.depth)
+        self._add_line(indent, 'int ' + self._new_local() + ' = ' + expr + ';')
+
+    def _gen_lib_call(self, indent):
+        """Generate a call to a static library method."""
+        expr = self._gen_expr(self._shape.depth)
+        self._add_line(indent, 'int ' + self._new_local() + ' = Math.abs(' +
+                       expr + ');')
+
+    def _gen_expr(self, depth):
+        """Generate an arithmetic expression nested depth brackets deep.  Only
+        the left operand is nested, so its size grows linearly with depth.
+        """
+        if depth <= 0:
+            return self._gen_operand()
+        operator = self._random.choice(['+', '-', '*'])
+        return ('(' + self._gen_expr(depth - 1) + ' ' + operator + ' ' +
+                self._gen_operand() + ')')
+
+    def _gen_operand(self):
+        """Generate a local variable or literal."""
+        if self._locals and self._random.random() < 0.5:
+            return self._random.choice(self._locals)
+        return str(self._random.randint(0, 100))
+
+    def _new_local(self):
+        """Get the name of a new local variable."""
+        name = 'v' + str(len(self._locals))
+        self._locals.append(name)
+        return name
+
+    def _add_line(self, indent, line):
+        self._lines.append('    ' * indent + line)
@@ -0,0 +1,94 @@
+"""This module runs the runtime benchmarks, which measure how fast the code
+generated by the compiler runs.  Each kernel in the corpus is compiled for
+each of its sizes, and run alongside its hand written Java baseline in a
+single JVM by RuntimeBench, which warms each one up before measuring it.
+Needs java and javac.
+"""
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from benchmarks.kernels import KERNELS
+from code_generation.code_generator import CodeGenerator
+
+JAVA_DIR = os.path.join(os.path.dirname(__file__), 'java')
+
+def run_runtime_benchmarks(names = None, warmup_ms = 1000, measure_ms = 2000):
+    """Run the kernels with the given names, or all of them, and return the
+    results of the JaML and Java versions of each kernel for each size,
+    indexed by the kernel's name and size.
+    """
+    kernels = [kernel for kernel in KERNELS
+               if not names or kernel.name in names]
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        _compile_java(tmp_dir)
+        code_gen = CodeGenerator()
+        runs = []
+        for kernel in kernels:
+            for size in kernel.sizes:
+                for class_name, source in kernel.get_sources(size).items():
+                    out_file = open(os.path.join(tmp_dir,
+                                                 class_name + '.jml'), 'w')
+                    out_file.write(source)
+                    out_file.close()
+                class_name = kernel.get_class_name(size)
+                code_gen.compile_(os.path.join(tmp_dir, class_name + '.jml'),
+                                  tmp_dir)
+                runs.append((kernel, size, class_name))
+        args = [str(warmup_ms), str(measure_ms)]
+        for kernel, size, class_name in runs:
+            args += [class_name, str(size), kernel.java_class, str(size)]
+        output = subprocess.Popen(['java', '-cp', tmp_dir, 'RuntimeBench'] +
+                                  args, stdout = subprocess.PIPE).communicate()
+        # RuntimeBench prints a line for each class, in the order given
+        lines = output[0].splitlines()
+        results = dict()
+        for idx, (kernel, size, class_name) in enumerate(runs):
+            results[kernel.name + str(size)] = {
+                'kernel': kernel.name, 'size': size,
+                'jaml': _parse_line(lines[2 * idx]),
+                'java': _parse_line(lines[2 * idx + 1])}
+        return results
+    finally:
+        shutil.rmtree(tmp_dir)
+
+def format_runtime_results(results):
+    """Get a human readable table of runtime results, comparing the
+    throughput of each kernel with its Java baseline.
+    """
+    lines = ['%-20s %12s %12s %9s %14s %14s' %
+             ('Kernel', 'JaML runs/s', 'Java runs/s', 'Java/JaML',
+              'JaML MB/s', 'Java MB/s')]
+    for name in sorted(results):
+        jaml = results[name]['jaml']
+        java = results[name]['java']
+        lines.append('%-20s %12.1f %12.1f %9.2f %14.1f %14.1f' %
+                     (name, jaml['throughput'], java['throughput'],
+                      java['throughput'] / jaml['throughput'],
+                      jaml['alloc_rate'] / 1e6, java['alloc_rate'] / 1e6))
+    return '\n'.join(lines)
+
+def write_runtime_results(results, path):
+    """Write runtime results to a JSON file."""
+    out_file = open(path, 'w')
+    json.dump(results, out_file, indent = 1, sort_keys = True)
+    out_file.close()
+
+def _compile_java(out_dir):
+    """Compile RuntimeBench and the Java baselines into out_dir."""
+    sources = [os.path.join(JAVA_DIR, name) for name in os.listdir(JAVA_DIR)
+               if name.endswith('.java')]
+    if subprocess.call(['javac', '-d', out_dir] + sources) != 0:
+        raise OSError('The Java baselines could not be compiled.')
+
+def _parse_line(line):
+    """Get the measurements of a kernel from the line RuntimeBench printed
+    for it.
+    """
+    runs, time, bytes_ = [int(field) for field in line.split()[1:]]
+    seconds = time / 1e9
+    return {'runs': runs, 'seconds': seconds, 'throughput': runs / seconds,
+            'bytes_per_run': bytes_ / float(runs),
+            'alloc_rate': bytes_ / seconds}
@@ -0,0 +1,94 @@
+"""This module contains the Assembler, which runs Jasmin on the generated
+assembly files while the compiler carries on generating the rest of the
+classes.  Starting the JVM takes far longer than assembling a class, so rather
+than running Jasmin once per class, each Jasmin process is given every file
+which is waiting when it starts.
+"""
+import subprocess
+from semantic_analysis.exceptions import JamlException
+from utilities.profiler import profiler
+
+class AssemblyError(JamlException):
+    """Raised when Jasmin fails to assemble some of the files given to it.
+    paths holds the files which were given to the processes which failed.
+    """
+    def __init__(self, paths):
+        JamlException.__init__(self, 'Jasmin failed to assemble: ' +
+                               ', '.join(paths))
+        self.paths = paths
+
+class Assembler(object):
+    """Assembles Jasmin files into class files in bin_root, running up to
+    max_processes Jasmin processes at once.  Files are assembled in the order
+    they are added, but the class files do not depend on which process
+    assembles them.
+    """
+    def __init__(self, jasmin_file, bin_root, max_processes = 1):
+        self._cmd = ['java', '-jar', jasmin_file, '-d', bin_root]
+        self._max_processes = max(max_processes, 1)
+        # The files waiting for a Jasmin process
+        self._pending = []
+        # The Jasmin processes which are running, with the files given to
+        # each one
+        self._processes = []
+        # The files given to Jasmin processes which failed
+        self._failed = []
+
+    def add(self, path):
+        """Add a Jasmin file to be assembled, starting a Jasmin process for it
+        straight away if there is one free.  This never waits for Jasmin.
+        """
+        self._pending.append(path)
+        self._poll()
+        if len(self._processes) < self._max_processes:
+            self._start()
+
+    def finish(self):
+        """Wait until every file added has been assembled.  If any Jasmin
+        process failed, an AssemblyError is raised once they have all
+        finished.
+        """
+        while self._pending or self._processes:
+            if self._processes:
+                process, batch = self._processes.pop(0)
+                process.wait()
+                self._check(process, batch)
+            self._poll()
+            while (self._pending and
+                   len(self._processes) < self._max_processes):
+                self._start()
+        if self._failed:
+            failed = self._failed
+            self._failed = []
+            raise AssemblyError(failed)
+
+    def _poll(self):
+        """Forget the Jasmin processes which have finished, once their
+        results have been checked.
+        """
+        running = []
+        for process, batch in self._processes:
+            if process.poll() is None:
+                running.append((process, batch))
+            else:
+                self._check(process, batch)
+        self._processes = running
+
+    def _check(self, process, batch):
+        """Record the files given to a finished Jasmin process if it
+        failed.
+        """
+        if process.returncode != 0:
+            self._failed.extend(batch)
+
+    def _start(self):
+        """Start a Jasmin process for all the files which are waiting.  When
+        several processes may run at once, the waiting files are shared
+        between them.
+        """
+        free = self._max_processes - len(self._processes)
+        size = max(len(self._pending) // free, 1)
+        batch = self._pending[:size]
+        self._pending = self._pending[size:]
+        self._processes.append((subprocess.Popen(self._cmd + batch), batch))
+        profiler.count('jvm processes')
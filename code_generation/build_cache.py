@@ -0,0 +1,168 @@
+"""This module contains the BuildCache, which lets the compiler skip classes
+whose output is already up to date.  A manifest is kept in the output
+directory recording, for each class, the hash of its source file, the
+signature hashes of the classes it depends upon, and the source hashes of the
+classes whose methods were inlined into it.  A class only needs to be compiled
+again if one of these has changed, or its class file is missing.
+"""
+import json
+import os
+from semantic_analysis.signatures import (hash_signature, hash_hierarchy,
+                                          hash_file, get_dependencies)
+
+MANIFEST_NAME = 'jaml_build_cache.json'
+
+# Increase this whenever a change to the compiler changes its output, so
+# classes compiled by an older version are compiled again
+CACHE_VERSION = 1
+
+class BuildCache(object):
+    """The manifest of the classes already compiled to an output directory.
+    options holds the code generator settings which affect its output; if
+    they differ from those in the manifest, every class is compiled again.
+    """
+    def __init__(self, asm_root, bin_root, options):
+        self._path = os.path.join(asm_root, MANIFEST_NAME)
+        self._bin_root = bin_root
+        self._options = options
+        self._entries = dict()
+        # The classes of the program currently being compiled which need to
+        # be compiled again
+        self._dirty = set()
+        # The source hashes of the classes in the current program
+        self._sources = dict()
+        # The signature hashes of the classes each class depends upon
+        self._deps = dict()
+        self._hierarchy = ''
+        self._refs = dict()
+        try:
+            manifest = json.load(open(self._path))
+        except (IOError, ValueError):
+            # There is no manifest, or it's corrupted
+            return
+        if (manifest.get('version') == CACHE_VERSION and
+                manifest.get('options') == options):
+            self._entries = manifest['classes']
+
+    def is_up_to_date(self, source):
+        """Check whether every class reachable from the main class in the
+        source file has already been compiled from its current source, in
+        which case there is no need to parse the program at all.
+        """
+        dir_ = os.path.dirname(source)
+        to_check = [os.path.basename(source).replace('.jml', '')]
+        seen = set(to_check)
+        while to_check:
+            class_name = to_check.pop()
+            entry = self._entries.get(class_name)
+            if entry is None or not self._has_output(class_name):
+                return False
+            source_hash = hash_file(os.path.join(dir_, class_name + '.jml'))
+            if source_hash != entry['source']:
+                return False
+            for ref in entry['refs']:
+                if ref not in seen:
+                    seen.add(ref)
+                    to_check.append(ref)
+        return True
+
+    def clear(self):
+        """Forget every class in the manifest, so they are all compiled
+        again.
+        """
+        self._entries = dict()
+
+    def update(self, source, asts, t_env):
+        """Work out which classes of the type checked program need to be
+        compiled again, by comparing their current inputs with the manifest.
+        """
+        class_names = [ast.children[0].value for ast in asts]
+        self._dirty.update(self.find_dirty(source, class_names, asts.refs,
+                                           t_env))
+
+    def find_dirty(self, source, class_names, refs, t_env):
+        """Get the names of the given classes of the program which need to be
+        compiled again, given the references between classes and the top
+        environment they have been scanned into.  The inputs of each class
+        are recorded the first time it is given, so classes can be checked
+        before the whole program has been parsed.
+        """
+        dir_ = os.path.dirname(source)
+        self._refs = refs
+        if not self._options.get('lazy'):
+            self._hierarchy = hash_hierarchy(t_env)
+        # Classes loaded from signature files have no ASTs, but can still be
+        # depended upon
+        signatures = dict((name, hash_signature(symbol)) for name, symbol in
+                          t_env.classes.items() + t_env.interfaces.items())
+        new = [name for name in class_names if name not in self._sources]
+        for class_name in new:
+            path = os.path.join(dir_, class_name + '.jml')
+            self._sources[class_name] = hash_file(path)
+        for class_name in new:
+            # The types of the members of every class it depends upon can
+            # appear in the code generated for a class
+            self._deps[class_name] = dict(
+                (dep, signatures[dep])
+                for dep in get_dependencies(refs, class_name))
+        return [name for name in class_names if self._is_dirty(name)]
+
+    def get_refs(self, class_name):
+        """Get the names of the classes a class referred to when it was
+        last compiled.
+        """
+        entry = self._entries.get(class_name)
+        if entry is None:
+            return []
+        return entry['refs']
+
+    def is_dirty(self, class_name):
+        """Check whether a class needs to be compiled again."""
+        return class_name in self._dirty
+
+    def record(self, class_name, inlined):
+        """Record that a class has been compiled from its current inputs.
+        inlined is the names of the classes whose methods were inlined into
+        it.
+        """
+        self._entries[class_name] = {
+            'source': self._sources[class_name],
+            'refs': self._refs.get(class_name, []),
+            'deps': self._deps[class_name],
+            'inlined': dict((name, self._sources[name]) for name in inlined),
+            'hierarchy': self._hierarchy}
+
+    def forget(self, class_name):
+        """Forget a class which was recorded, but whose output could not be
+        written, so it is compiled again.
+        """
+        self._entries.pop(class_name, None)
+
+    def save(self):
+        """Write the manifest to the output directory."""
+        manifest = {'version': CACHE_VERSION, 'options': self._options,
+                    'classes': self._entries}
+        out_file = open(self._path, 'w')
+        json.dump(manifest, out_file, indent = 1, sort_keys = True)
+        out_file.close()
+
+    def _is_dirty(self, class_name):
+        """Compare the inputs of a class with those recorded in the
+        manifest.
+        """
+        entry = self._entries.get(class_name)
+        if entry is None or not self._has_output(class_name):
+            return True
+        if (entry['source'] != self._sources[class_name] or
+                entry['deps'] != self._deps[class_name] or
+                entry['hierarchy'] != self._hierarchy):
+            return True
+        for name, source_hash in entry['inlined'].iteritems():
+            if self._sources.get(name) != source_hash:
+                return True
+        return False
+
+    def _has_output(self, class_name):
+        """Check the class file of a class exists."""
+        return os.path.exists(os.path.join(self._bin_root,
+                                           class_name + '.class'))
@@ -1,8 +1,56 @@
 """The test class for the module code_geenerator.py."""
+import json
 import os
+import shutil
 import subprocess
+import tempfile
+import threading
 import unittest
 from code_generation.code_generator import CodeGenerator
+from code_generation.ir import JasminWriter
+from code_generation.build_cache import BuildCache, MANIFEST_NAME
+from code_generation.assembler import Assembler, AssemblyError
+from semantic_analysis.semantic_analyser import TypeChecker
+from semantic_analysis.signatures import write_signature, hash_file
+from utilities.profiler import profiler
+from benchmarks.program_generator import ProgramGenerator, ProgramShape
+
+class FakeProcess(object):
+    """Stands in for a process started by subprocess.Popen.  It only
+    finishes when it is waited for, and then fails if it was told to.
+    """
+    def __init__(self, fails = False, output = ''):
+        self.returncode = None
+        self._fails = fails
+        self._output = output
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self):
+        self.returncode = 0
+        if self._fails:
+            self.returncode = 1
+        return self.returncode
+
+    def communicate(self):
+        self.wait()
+        return self._output, None
+
+class FakeJasmin(object):
+    """Stands in for subprocess.Popen when running Jasmin.  It records the
+    files given to each process, which fails if it is given one of the
+    failing files.
+    """
+    def __init__(self, failing = ()):
+        self.batches = []
+        self._failing = failing
+
+    def __call__(self, cmd):
+        # The files follow java -jar jasmin.jar -d bin_root
+        batch = cmd[5:]
+        self.batches.append(batch)
+        return FakeProcess(any(path in self._failing for path in batch))
 
 class TestCodeGenerator(unittest.TestCase):
     """Test class where tests to be run are the methods."""
@@ -406,6 +454,367 @@ class TestCodeGenerator(unittest.TestCase):
              self._wrap_print('args[0]') + '}}')
         self._check_output(p, 'X', 'arg', args = ['arg'])
 
+    def test_basic_blocks(self):
+        """Test a loop is split into basic blocks with a back edge."""
+        p = self._wrap_stmts('int x = 0; while (x < 3) { x = x + 1; }')
+        class_ir = self._code_gen.generate(p)[0]
+        main = [m for m in class_ir.methods if 'main' in m.header][0]
+        blocks = main.basic_blocks()
+        for block in blocks:
+            # Only the final instruction of a block can be a jump
+            for inst in block.instructions[:-1]:
+                self.assertFalse(inst.is_branch or inst.is_terminator)
+        # The body of the loop must jump back to the loop condition
+        back_edges = [b for b in blocks for s in b.successors
+                      if blocks.index(s) <= blocks.index(b)]
+        self.assertEqual(len(back_edges), 1)
+
+    def test_local_var_reuse(self):
+        """Test variables in disjoint scopes share storage locations."""
+        p = self._wrap_stmts('{ int a = 1; } { double b = 2.0; }' +
+                             'for (int i = 0; i < 3; i = i + 1) ' +
+                             '{ int x = i; }' +
+                             'for (int j = 0; j < 3; j = j + 1) ' +
+                             '{ int y = j; }')
+        class_ir = self._code_gen.generate(p)[0]
+        main = [m for m in class_ir.methods if 'main' in m.header][0]
+        # args, then at most two slots at once
+        self.assertEqual(main.limit_locals, 3)
+
+    def test_inline_stack_limit(self):
+        """Test the stack limit of a method covers the operands of a call
+        which has been inlined on top of those already on the stack.
+        """
+        p = self._wrap_deep_inline('')
+        class_ir = self._code_gen.generate(p)[0]
+        main = [m for m in class_ir.methods if 'main' in m.header][0]
+        self.assertEqual(main.limit_stack, 13)
+        no_inline_ir = CodeGenerator(inline_budget = 0).generate(p)[0]
+        main = [m for m in no_inline_ir.methods if 'main' in m.header][0]
+        self.assertEqual(main.limit_stack, 6)
+
+    def test_inline_deep_stack(self):
+        """Test a call inlined on top of a deep stack is given a stack limit
+        which covers it, and runs.
+        """
+        class_ir = self._code_gen.generate(self._wrap_deep_inline(''))[0]
+        main = [m for m in class_ir.methods if 'main' in m.header][0]
+        self.assertEqual(main.max_stack(), 13)
+        self.assertTrue('.limit stack 13' in JasminWriter().write(class_ir))
+        self._check_output(self._wrap_deep_inline(self._wrap_print('y')),
+                           'X', '51')
+
+    def test_devirtualize(self):
+        """Test calls which can only reach one implementation are invoked
+        directly.
+        """
+        path = os.path.join(self._file_dir, 'test_devirtualize.jml')
+        # Disable inlining, otherwise the calls would be inlined
+        class_irs = CodeGenerator(inline_budget = 0).generate(path)
+        code = dict()
+        for class_ir in class_irs:
+            for method in class_ir.methods:
+                code[class_ir.name, method.header.split('(')[0]] = \
+                    [str(item) for item in method.items]
+        main = code['test_devirtualize', 'public static main']
+        self.assertTrue('checkcast test_devirtualize3' in main)
+        self.assertTrue('invokevirtual test_devirtualize3/y()I' in main)
+        self.assertTrue('invokespecial test_devirtualize3/z()I' in
+                        code['test_devirtualize3', 'public y'])
+
+    def test_inline(self):
+        """Test a call to a small private method is replaced by its body,
+        unless inlining is disabled.
+        """
+        p = ('class X { int f; private int get() { return f; }' +
+             'static void main(String[] args) {' +
+             'X inst = new X(); int y = inst.get(); }}')
+        no_inline_gen = CodeGenerator(inline_budget = 0)
+        for code_gen, is_inlined in [(self._code_gen, True),
+                                     (no_inline_gen, False)]:
+            class_ir = code_gen.generate(p)[0]
+            main = [m for m in class_ir.methods if 'main' in m.header][0]
+            code = [str(item) for item in main.items]
+            self.assertEqual('getfield X/f I' in code, is_inlined)
+            self.assertEqual('invokespecial X/get()I' in code, not is_inlined)
+
+    def test_tail_call(self):
+        """Test recursive calls in tail position are compiled into jumps."""
+        p = ('class X { private int f() { return f(); }' +
+             'private void g() { int x = f(); g(); }' +
+             'static void main(String[] args) { X inst = new X(); }}')
+        class_ir = self._code_gen.generate(p)[0]
+        for method in class_ir.methods:
+            code = [str(item) for item in method.items]
+            if method.header.startswith('private f'):
+                self.assertTrue('invokespecial X/f()I' not in code)
+                self.assertTrue(code[-2].startswith('goto MethodStart'))
+            elif method.header.startswith('private g'):
+                # The call to f is not a tail call
+                self.assertTrue('invokespecial X/f()I' in code)
+                self.assertTrue(code[-2].startswith('goto MethodStart'))
+        self.assertEqual(sorted(self._code_gen.converted_tail_calls),
+                         [('X', 'f'), ('X', 'g')])
+
+    def test_build_cache(self):
+        """Test only the classes whose inputs have changed are generated
+        again when the build cache is used.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            for i in ['', '2', '3']:
+                shutil.copy(os.path.join(self._file_dir,
+                                         'test_devirtualize' + i + '.jml'),
+                            tmp_dir)
+            path = os.path.join(tmp_dir, 'test_devirtualize.jml')
+            changed = os.path.join(tmp_dir, 'test_devirtualize3.jml')
+            built = self._generate_cached(path, tmp_dir)
+            self.assertEqual(sorted(built), ['test_devirtualize',
+                                             'test_devirtualize2',
+                                             'test_devirtualize3'])
+            self.assertTrue(BuildCache(tmp_dir, tmp_dir,
+                                       {}).is_up_to_date(path))
+            self.assertEqual(self._generate_cached(path, tmp_dir), [])
+            # Changing a method body leaves the signature unchanged
+            source = open(changed).read()
+            open(changed, 'w').write(source.replace('10', '11'))
+            self.assertEqual(self._generate_cached(path, tmp_dir),
+                             ['test_devirtualize3'])
+            # Adding a field changes it, test_devirtualize refers to the class
+            source = open(changed).read()
+            open(changed, 'w').write(source.replace('{', '{ int w;', 1))
+            self.assertEqual(sorted(self._generate_cached(path, tmp_dir)),
+                             ['test_devirtualize', 'test_devirtualize3'])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_build_cache_assembly_failure(self):
+        """Test classes Jasmin fails to assemble are not recorded as up to
+        date, even though their old class files are still there.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            for i in ['', '2', '3']:
+                shutil.copy(os.path.join(self._file_dir,
+                                         'test_devirtualize' + i + '.jml'),
+                            tmp_dir)
+                open(os.path.join(tmp_dir, 'test_devirtualize' + i +
+                                  '.class'), 'w').close()
+            path = os.path.join(tmp_dir, 'test_devirtualize.jml')
+            code_gen = CodeGenerator(use_cache = True)
+            jasmin = FakeJasmin([os.path.join(tmp_dir,
+                                              'test_devirtualize3.j')])
+            popen = subprocess.Popen
+            subprocess.Popen = jasmin
+            try:
+                self.assertRaises(AssemblyError, code_gen.compile_, path,
+                                  tmp_dir)
+            finally:
+                subprocess.Popen = popen
+            cache = BuildCache(tmp_dir, tmp_dir, code_gen._get_options())
+            self.assertFalse(cache.is_up_to_date(path))
+            # The first class is assembled on its own, the rest together
+            self.assertEqual(len(jasmin.batches), 2)
+            manifest = json.load(open(os.path.join(tmp_dir, MANIFEST_NAME)))
+            self.assertEqual(jasmin.batches[0],
+                             [os.path.join(tmp_dir, 'test_devirtualize.j')])
+            self.assertEqual(manifest['classes'].keys(),
+                             ['test_devirtualize'])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_separate_compilation(self):
+        """Test classes with up to date signature files are not parsed, and
+        calls to them are compiled from their signatures.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(self._file_dir, 'test_devirtualize.jml')
+            asts, t_env = TypeChecker().analyse(path)
+            for name in ['test_devirtualize2', 'test_devirtualize3']:
+                write_signature(tmp_dir, t_env.get_class_or_interface_s(name),
+                                hash_file(os.path.join(self._file_dir,
+                                                       name + '.jml')),
+                                asts.refs[name])
+            class_irs = self._code_gen.generate(path, sig_dir = tmp_dir)
+            self.assertEqual([class_ir.name for class_ir in class_irs],
+                             ['test_devirtualize'])
+            main = [str(item) for item in class_irs[0].methods[-1].items]
+            # The implementations of the interface are not known
+            self.assertTrue('invokeinterface test_devirtualize2/y()I 1' in
+                            main)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_concurrent_compiles(self):
+        """Test one code generator can compile several programs at once from
+        different threads, and gives the same code as when they are compiled
+        one at a time.
+        """
+        programs = ['class X { int f; private int get() { return f; }' +
+                    'static void main(String[] args) {' +
+                    'X inst = new X(); int y = inst.get(); }}',
+                    'class Y { private int f() { return f(); }' +
+                    'static void main(String[] args) { int x = 1;' +
+                    'while (x < 10) { x = x + 1; } }}',
+                    os.path.join(self._file_dir, 'test_devirtualize.jml')]
+        self._check_concurrent(self._code_gen, programs)
+
+    def test_concurrent_parallel_compiles(self):
+        """Test compiles run at once from different threads each give their
+        own program to their worker processes.
+        """
+        programs = [os.path.join(self._file_dir, 'test_devirtualize.jml'),
+                    os.path.join(self._file_dir, 'test_devirtualize3.jml')]
+        self._check_concurrent(CodeGenerator(jobs = 2), programs)
+
+    def test_parallel_compile(self):
+        """Test type checking and generating the classes in worker processes
+        gives the same code as doing them one at a time.
+        """
+        path = os.path.join(self._file_dir, 'test_devirtualize3.jml')
+        expected = self._generate_text(self._code_gen, path)
+        text = self._generate_text(CodeGenerator(jobs = 3), path)
+        self.assertEqual(text, expected)
+
+    def test_assembler_batches(self):
+        """Test files added while every Jasmin process is busy are given to
+        the next process started.
+        """
+        jasmin = self._run_assembler(FakeJasmin())
+        self.assertEqual(jasmin.batches, [['a.j'], ['b.j'],
+                                          ['c.j', 'd.j', 'e.j']])
+
+    def test_assembler_failure(self):
+        """Test a failed Jasmin process is reported once every file has been
+        assembled, along with the files it was given.
+        """
+        jasmin = FakeJasmin(['c.j'])
+        try:
+            self._run_assembler(jasmin)
+            self.fail('AssemblyError not raised')
+        except AssemblyError as error:
+            self.assertEqual(error.paths, ['c.j', 'd.j', 'e.j'])
+        self.assertEqual(len(jasmin.batches), 3)
+
+    def test_profiler(self):
+        """Test the profiler records the phases of a compile, and counts the
+        work done in them.
+        """
+        path = os.path.join(self._file_dir, 'test_devirtualize3.jml')
+        profiler.reset()
+        profiler.enabled = True
+        try:
+            self._code_gen.generate(path)
+        finally:
+            profiler.enabled = False
+        data = profiler.to_dict()
+        profiler.reset()
+        self.assertEqual([phase['name'] for phase in data['phases']],
+                         ['scan', 'parse', 'class scan', 'type check',
+                          'codegen'])
+        for phase in data['phases']:
+            self.assertTrue(phase['memory_growth_kb'] >= 0)
+        for name in ['tokens', 'earley sets', 'earley items', 'ast nodes',
+                     'visits']:
+            self.assertTrue(data['counts'][name] > 0)
+
+    def test_profiler_parallel(self):
+        """Test the work done in worker processes is counted, the same as
+        when it is done in the compiling process.
+        """
+        shape = ProgramShape(classes = 4, methods = 2, statements = 15,
+                             depth = 4)
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = ProgramGenerator(shape, 1).write(tmp_dir)
+            counts = []
+            for jobs in [1, 2]:
+                profiler.reset()
+                profiler.enabled = True
+                try:
+                    CodeGenerator(jobs = jobs).generate(path)
+                finally:
+                    profiler.enabled = False
+                counts.append(profiler.to_dict()['counts'])
+                profiler.reset()
+            self.assertTrue(counts[0]['visits'] > 0)
+            self.assertEqual(counts[1], counts[0])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_benchmark_program(self):
+        """Test the synthetic programs generated for the benchmarks compile,
+        and the same seed gives the same program.
+        """
+        shape = ProgramShape(classes = 3, methods = 2, statements = 15,
+                             depth = 4)
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = ProgramGenerator(shape, 1).write(tmp_dir)
+            class_irs = self._code_gen.generate(path)
+            self.assertEqual(sorted(class_ir.name for class_ir in class_irs),
+                             ['Bench0', 'Bench1', 'Bench2'])
+            self.assertEqual(open(path).read(),
+                             ProgramGenerator(shape, 1).generate_class(
+                                 'Bench0', ['Bench1', 'Bench2']))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def _check_concurrent(self, code_gen, programs):
+        """Check compiling the programs in several threads at once gives
+        the same code as compiling them one at a time.
+        """
+        expected = [self._generate_text(code_gen, program)
+                    for program in programs]
+        results = []
+        def compile_all():
+            for program in programs:
+                results.append((program,
+                                self._generate_text(code_gen, program)))
+        threads = [threading.Thread(target = compile_all) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 4 * len(programs))
+        for program, text in results:
+            self.assertEqual(text, expected[programs.index(program)])
+
+    def _run_assembler(self, jasmin):
+        """Assemble five files with two Jasmin processes, running jasmin in
+        place of subprocess.Popen.  Returns jasmin.
+        """
+        popen = subprocess.Popen
+        subprocess.Popen = jasmin
+        try:
+            assembler = Assembler('jasmin.jar', 'bin', 2)
+            for path in ['a.j', 'b.j', 'c.j', 'd.j', 'e.j']:
+                assembler.add(path)
+            assembler.finish()
+        finally:
+            subprocess.Popen = popen
+        return jasmin
+
+    def _generate_text(self, code_gen, program):
+        """Get the Jasmin code of each class in a program."""
+        writer = JasminWriter()
+        return [writer.write(class_ir)
+                for class_ir in code_gen.generate(program)]
+
+    def _generate_cached(self, path, out_dir):
+        """Generate the classes which the build cache in out_dir says are out
+        of date, and pretend they have been assembled.  Returns their names.
+        """
+        cache = BuildCache(out_dir, out_dir, {})
+        code_gen = CodeGenerator(inline_budget = 0)
+        class_names = [class_ir.name
+                       for class_ir in code_gen.generate(path, cache)]
+        cache.save()
+        for class_name in class_names:
+            open(os.path.join(out_dir, class_name + '.class'), 'w').close()
+        return class_names
+
     def _wrap_stmts(self, stmts):
         """Helper method used so lines of code can be tested
         without having to create a class and method for it to go in.
@@ -420,6 +829,16 @@ class TestCodeGenerator(unittest.TestCase):
                }
                """)
 
+    def _wrap_deep_inline(self, stmts):
+        """Get a program which inlines a call needing a deep stack on top
+        of a deep stack, followed by stmts.
+        """
+        return ('class X { private int g() { int a = 5; ' +
+                'return a + (a + (a + (a + (a + (a + (a + 1)))))); } ' +
+                'static void main(String[] args) { X inst = new X(); ' +
+                'int y = 1 + (2 + (3 + (4 + (5 + inst.g()))));' + stmts +
+                '}}')
+
     def _wrap_print(self, stmt):
         return ("""
                 PrintStream ps = System.out;
@@ -1,12 +1,29 @@
 """This module generates Jasmin assembly code from a type checked abstract
 syntax tree."""
+import multiprocessing
 import os
-import subprocess
 import parser_.tree_nodes as nodes
+from parser_.ast_cache import ASTCache
 from semantic_analysis.semantic_analyser import TypeChecker
+from semantic_analysis.class_hierarchy import ClassHierarchy
 from semantic_analysis.exceptions import SymbolNotFoundError, JamlException
-from utilities.utilities import (is_main, get_jvm_type, ArrayType,
-                                 get_full_type, visit)
+from code_generation.ir import (ClassIR, MethodIR, Instruction, Label,
+                                Directive, JasminWriter)
+from code_generation.build_cache import BuildCache
+from code_generation.assembler import Assembler, AssemblyError
+from code_generation.compilation_context import CompilationContext
+from semantic_analysis.signatures import write_signature, hash_file
+from utilities.profiler import profiler
+from utilities.utilities import (get_jvm_type, ArrayType, get_full_type,
+                                 visit)
+
+# The context, ASTs and inlining budget used by a worker process when classes
+# are generated in parallel.  They are only set in the workers, by
+# _init_worker, so compiles run at once in different threads each give their
+# own to their workers
+_worker_context = None
+_worker_asts = None
+_worker_inline_budget = None
 
 class FileReadError(JamlException):
     """Raised when a reference to a variable is made when it has not been
@@ -16,24 +33,40 @@ class FileReadError(JamlException):
 
 class Frame(object):
     """Used to store information regarding a method's current frame - i.e.
-    local variables."""
-    def __init__(self, params, is_static, ret_type):
+    local variables.  Storage locations are reused: once a variable goes out
+    of scope its locations are freed, and can be given to a variable declared
+    later on.
+    """
+    def __init__(self, params, is_static, ret_type, parent = None):
         """Initialise the frame once visiting a new method node. Static methods
         operate differently, because the first element on the static is not a
-        reference to "this".
+        reference to "this".  If parent is given, this is the frame of a method
+        being inlined into the parent's method, so its variables are stored in
+        locations of the parent frame which are not in use.
         """
-        # This stores all seen variables as keys, along with a reference to
+        # This stores all live variables as keys, along with a reference to
         # their storage location
         self._var = dict()
+        # The number of storage locations taken up by each live variable
+        self._size = dict()
+        # A stack holding a list of the variables declared in each open scope
+        self._scopes = []
         # Stores the method's return type
         self._ret_type = ret_type
-        # This holds the reference to next free storage location for a variable
-        # Start at 1, because 0 is a reference to "this"
-        # (in non static methods)
-        if is_static:
-            self._next_var = 0
+        self._is_inline = parent is not None
+        if parent is None:
+            # All storage locations currently in use
+            self._used = set()
+            # The highest number of storage locations in use at any point,
+            # which is the number of local variables the method needs
+            self._max_locals = 0
+            self._root = self
+            # Location 0 is a reference to "this" (in non static methods)
+            if not is_static:
+                self._alloc('this', 1)
         else:
-            self._next_var = 1
+            self._used = parent._used
+            self._root = parent._root
         try:
             for param in params.children:
                 type_node = param.children[0]
@@ -61,57 +94,134 @@ class Frame(object):
         """Creates a storage location for a new variable.  is_long is True for
         longs and doubles because they take up two storage locations.
         """
-        self._var[var] = self._next_var
         if is_long:
-            self._next_var += 2
+            self._alloc(var, 2)
         else:
-            self._next_var += 1
+            self._alloc(var, 1)
 
     def new_matrix(self, var, d1, d2):
         """Creates a new matrix local variable."""
-        self._var[var] = self._next_var
         # Work out number of elements and multiply by two because the matrix
         # elements have values of type double
-        self._next_var = self._next_var + d1 * d2 * 2
+        self._alloc(var, d1 * d2 * 2)
+
+    def bind_this(self, loc):
+        """Use a location which is already in use to refer to "this"."""
+        self._var['this'] = loc
+
+    def release(self):
+        """Free all variables of the frame."""
+        for var in self._size.keys():
+            self.free_var(var)
+
+    def free_var(self, var):
+        """Frees the storage locations of a variable which is no longer used,
+        so they can be reused by another variable.
+        """
+        loc = self._var.pop(var)
+        size = self._size.pop(var)
+        for i in range(loc, loc + size):
+            self._used.discard(i)
+
+    def enter_scope(self):
+        """Start a new scope, e.g. when entering a block."""
+        self._scopes.append([])
+
+    def exit_scope(self):
+        """End the current scope, freeing all variables declared in it."""
+        for var in self._scopes.pop():
+            # The variable may already have been freed explicitly
+            if var in self._var:
+                self.free_var(var)
+
+    def _alloc(self, var, size):
+        """Give the variable the lowest run of size free storage locations."""
+        loc = 0
+        while not self._is_free(loc, size):
+            loc += 1
+        self._reserve(loc, size)
+        self._var[var] = loc
+        self._size[var] = size
+        if len(self._scopes) != 0:
+            self._scopes[-1].append(var)
+
+    def _is_free(self, loc, size):
+        for i in range(loc, loc + size):
+            if i in self._used:
+                return False
+        return True
+
+    def _reserve(self, loc, size):
+        """Mark the storage locations as used."""
+        for i in range(loc, loc + size):
+            self._used.add(i)
+        self._root._max_locals = max(self._root._max_locals, loc + size)
 
     def _get_ret_type(self):
         return self._ret_type
 
+    def _get_max_locals(self):
+        return self._root._max_locals
+
+    def _get_this_loc(self):
+        """Get the location of the reference to "this"."""
+        return self._var.get('this', 0)
+
+    def _get_is_inline(self):
+        return self._is_inline
+
     ret_type = property(_get_ret_type)
+    max_locals = property(_get_max_locals)
+    this_loc = property(_get_this_loc)
+    is_inline = property(_get_is_inline)
 
 class CodeGenerator(object):
-    """This class contains all the methods and fields to do the code
-    generation.
+    """This class compiles programs, using a ClassGenerator to generate the
+    code of each class.  It only holds the settings it was created with; the
+    state of each compile is kept in a CompilationContext, so several compiles
+    can be run at once by the same instance.
     """
-    def __init__(self):
-        # Labels used in if, while, for and comparison statements need to be
-        # unique for that statement, appending the value stored here to the end
-        # makes it unique if it is incremented after each new statement of that
-        # type has been visited Should be accessed with _label_suffix
-        self._next_labels = {'if': 0, 'while': 0, 'for': 0, 'comp': 0,
-                             'not': 0, 'mat_rows': 0, 'mat_a_cols': 0,
-                             'mat_b_cols': 0, 'auxiliary': 0}
-        # This stores all the instructions which will be written to the output
-        self._out = ''
-        # The current frame keeps track of local variable locations for a given
-        # method
-        self._cur_frame = None
-        # Stores the name of the current class
-        self._cur_class = ''
-        # Stores method signatures for simple retrieval when the method is
-        # called.  Elements are indexed with a (class, method) tuple
-        self._method_sigs = dict()
-        # Stores field sigs
-        self._field_sigs = dict()
-
-    def compile_(self, source, dst = None):
+    def __init__(self, devirtualize = True, inline_budget = 30,
+                 use_cache = False, separate = False, jobs = 1,
+                 parser_backend = 'earley', ast_cache_dir = None,
+                 lazy = False):
+        """If devirtualize is True, the class hierarchy is used to call
+        methods which can only have one implementation directly.  Calls to
+        small methods are replaced by the method's body; inline_budget is the
+        maximum number of tree nodes which can be inlined into a call site,
+        0 disables inlining.  If use_cache is True, classes which are already
+        up to date in the output directory are not compiled again.  If
+        separate is True, referenced classes which have already been compiled
+        to the output directory are not parsed, their signature files are
+        used instead.  jobs is the number of worker processes the classes are
+        type checked and generated in, and the number of Jasmin processes
+        run at once.  parser_backend is the backend of the parser, one of
+        Parser.BACKENDS.  If ast_cache_dir is given, the parsed and type
+        checked ASTs of source files are cached in that directory, so files
+        which have not changed are not parsed or checked again.  If lazy is
+        True and the build cache is used, the classes the main class refers
+        to are only parsed for their signatures, unless they need to be
+        compiled again.
+        """
+        self._devirtualize = devirtualize
+        self._inline_budget = inline_budget
+        self._use_cache = use_cache
+        self._separate = separate
+        self._jobs = jobs
+        self._parser_backend = parser_backend
+        self._lazy = lazy
+        self._ast_cache = None
+        if ast_cache_dir is not None:
+            self._ast_cache = ASTCache(ast_cache_dir)
+        # The tail calls converted by the most recent compile
+        self._converted_tail_calls = []
+
+    def compile_(self, source, dst = None, rebuild = False):
         """This is the public method which takes the source file or string,
-        and generates the assembly code file.
+        and generates the assembly code file.  If rebuild is True, every class
+        is compiled even if the build cache says it's up to date.  Returns the
+        context of the compile, or None if everything was up to date.
         """
-        # Generate the type checked abstract syntax tree
-        asts, t_env = TypeChecker().analyse(source)
-        self._gen_field_method_sigs(t_env)
-        self._t_env = t_env
         # Get paths to directories needed
         code_gen_root = os.path.dirname(__file__)
         project_root = os.path.dirname(code_gen_root)
@@ -121,118 +231,238 @@ class CodeGenerator(object):
         else:
             asm_root = dst
             bin_root = dst
+        is_file = os.path.isfile(source)
         # If it's a file, check it has the correct extension
-        try:
-            # This will error if it isn't a file
-            open(source)
-            if source.find('.jml') == -1:
-                msg = 'Source file does not have the correct extension (.jml).'
-                raise FileReadError(msg)
-        except:
-            pass
-        # Loop through each class generating code and writing files
-        for ast in asts:
-            # Generate code
-            self._reset()
-            visit(self, ast)
-            # Write/print results
+        if is_file and source.find('.jml') == -1:
+            msg = 'Source file does not have the correct extension (.jml).'
+            raise FileReadError(msg)
+        cache = None
+        if self._use_cache and is_file:
+            cache = BuildCache(asm_root, bin_root, self._get_options())
+            if rebuild:
+                cache.clear()
+            elif cache.is_up_to_date(source):
+                return None
+        sig_dir = None
+        if self._separate:
+            sig_dir = bin_root
+        writer = JasminWriter()
+        jasmin_file = os.path.join(project_root, 'jasmin', 'jasmin.jar')
+        assembler = Assembler(jasmin_file, bin_root, self._jobs)
+        def write_class(class_ir):
+            """Write the assembly file of a class as soon as it has been
+            generated, and run Jasmin on it while the next class is generated.
+            """
             # Get the file name by appending .j to class name
-            name = ast.children[0].value
-            output_f_name = name + '.j'
+            output_f_name = class_ir.name + '.j'
             out_path = os.path.join(asm_root, output_f_name)
             # Create the output file and write output to it
-            out_file = open(out_path, 'w')
-            out_file.write(self._out)
-            out_file.close()
-            # Run Jasmin
-            jasmin_file = os.path.join(project_root, 'jasmin', 'jasmin.jar')
-            subprocess.call(['java', '-jar', jasmin_file, '-d', bin_root,
-                             out_path])
-        self._reset()
-
-    def _gen_field_method_sigs(self, t_env):
-        """Generate assembly style method signatures for all methods and fields
-        using the information held in the top environment from the semantic
-        analyser.
-        """
-        for class_s in t_env.classes.values() + t_env.interfaces.values():
-            self._gen_method_sigs(class_s, t_env)
+            profiler.start('assembly')
             try:
-                self._gen_cons_sig(class_s, t_env)
-                self._gen_field_sigs(class_s, t_env)
-            except:
-                # Not in interfaces
-                pass
-
-    def _gen_cons_sig(self, class_s, t_env):
-        """Generate the signature for the constructor."""
+                out_file = open(out_path, 'w')
+                out_file.write(writer.write(class_ir))
+                out_file.close()
+                assembler.add(out_path)
+            finally:
+                profiler.stop()
+        # Generate the IR for each class, writing and assembling each one
+        context = self._generate(source, is_file, cache, sig_dir,
+                                 write_class)
+        profiler.start('assembly')
         try:
-            cons = class_s.constructor
-            signature = class_s.name + '/'
-            if cons is not None and len(cons.params) > 0:
-                signature += '<init>'
-                signature += self._gen_method_descriptor(cons, True)
-            else:
-                # No explicit constructor
-                signature += '<init>()V'
-            # Store the constructor's signature
-            self._method_sigs[(class_s.name, '<init>')] = signature
-        except AttributeError:
-            # It was an interface (no constructor)
-            pass
-
-    def _gen_field_sigs(self, class_s, t_env):
-        """Generate field signatures for a class."""
-        for field in class_s.fields:
-            name = field.name
-            signature = (class_s.name + '/' + name + ' ' +
-                     get_jvm_type(field))
-            # Store the signature
-            self._field_sigs[(class_s.name, name)] = signature
-
-    def _gen_method_sigs(self, class_s, t_env):
-        """Generate method and a constructor signatures for a class."""
-        for method in class_s.methods:
-            name = method.name
-            signature = class_s.name + '/'
-            # Check for the main method
-            if is_main(method):
-                signature += 'main([Ljava/lang/String;)V'
+            assembler.finish()
+        except AssemblyError as error:
+            if cache is not None:
+                # The classes Jasmin failed on may have been left with the
+                # class files of an older version, so they must not be
+                # recorded as up to date
+                for path in error.paths:
+                    cache.forget(os.path.basename(path)[:-len('.j')])
+                cache.save()
+            raise
+        finally:
+            profiler.stop()
+        if is_file:
+            for class_ir in context.class_irs:
+                # Write the signature file so other classes can be compiled
+                # against this one separately
+                src_path = os.path.join(os.path.dirname(source),
+                                        class_ir.name + '.jml')
+                t_env = context.t_env
+                symbol = t_env.get_class_or_interface_s(class_ir.name)
+                write_signature(bin_root, symbol, hash_file(src_path),
+                                context.asts.refs.get(class_ir.name, []))
+        if cache is not None:
+            cache.save()
+        return context
+
+    def generate(self, source, cache = None, sig_dir = None):
+        """Type check the source file or string, and build the IR of each
+        class in the program, without writing any output.  If a build cache is
+        given, only the classes which it says are out of date are generated,
+        and they are recorded in it.  If sig_dir is given, classes with up to
+        date signature files there are not parsed or generated.
+        """
+        return self._generate(source, os.path.isfile(source), cache,
+                              sig_dir).class_irs
+
+    def _generate(self, source, is_file, cache, sig_dir, on_class = None):
+        """Compile the program to IR, and return the context of the
+        compile.  is_file says whether source is the path of a file or the
+        program itself.  If on_class is given, it is called with the IR of each
+        class as soon as it has been generated.
+        """
+        needs_body = None
+        if self._lazy and cache is not None:
+            main_name = os.path.basename(source).replace('.jml', '')
+            def needs_body(class_names, refs, t_env):
+                """Only the bodies of the classes which are out of date are
+                needed.  The inputs of the main class are recorded before the
+                bodies of the others add to its dependencies.  The classes
+                the bodies of the others referred to when they were compiled
+                are needed, as they may be out of date too.
+                """
+                dirty = cache.find_dirty(source, [main_name] + class_names,
+                                         refs, t_env)
+                dirty = [name for name in dirty if name != main_name]
+                refed_names = [ref for name in class_names
+                               if name not in dirty
+                               for ref in cache.get_refs(name)]
+                return dirty, refed_names
+        # Generate the type checked abstract syntax tree
+        asts, t_env = TypeChecker().analyse(source, sig_dir,
+                                            self._jobs,
+                                            self._parser_backend,
+                                            self._ast_cache, needs_body,
+                                            is_file)
+        hierarchy = None
+        if self._devirtualize and sig_dir is None and needs_body is None:
+            # The subclasses of classes loaded from signature files, or only
+            # referred to from the bodies of classes not parsed in full, are
+            # not known, so the hierarchy would be incomplete
+            hierarchy = ClassHierarchy(t_env)
+        context = CompilationContext(source, asts, t_env, hierarchy)
+        if cache is not None:
+            cache.update(source, asts, t_env)
+        to_generate = [ast for ast in asts if cache is None or
+                       cache.is_dirty(ast.children[0].value)]
+        # Generate code
+        profiler.start('codegen')
+        try:
+            if self._jobs > 1 and len(to_generate) > 1:
+                self._generate_parallel(context, to_generate, cache, on_class)
             else:
-                signature += name
-                signature += self._gen_method_descriptor(method, False)
-            # Store the signature
-            self._method_sigs[(class_s.name, name)] = signature
-
-    def _gen_method_descriptor(self, method_s, is_cons):
-        """This method returns a jasmin style string which represents the
-        parameter types and return types for a method.
+                for ast in to_generate:
+                    result = _generate_class(context, self._inline_budget,
+                                             ast)
+                    self._add_class(context, result, cache, on_class)
+        finally:
+            profiler.stop()
+        self._converted_tail_calls = context.converted_tail_calls
+        return context
+
+    def _add_class(self, context, result, cache, on_class):
+        """Add a generated class to the context of the compile."""
+        class_ir, inlined, tail_calls = result
+        context.class_irs.append(class_ir)
+        context.converted_tail_calls.extend(tail_calls)
+        if cache is not None:
+            cache.record(class_ir.name, inlined)
+        if on_class is not None:
+            on_class(class_ir)
+
+    def _generate_parallel(self, context, asts, cache, on_class):
+        """Generate the classes in worker processes.  Generating a class only
+        reads the context, so each class can be generated on its own.  The
+        classes are added in the order of the ASTs as they become ready, so
+        the output does not depend on which class was generated first.
         """
-        ret_type = ''
-        if is_cons:
-            ret_type = 'V'
-        else:
-            ret_type = get_jvm_type(method_s)
-        method_spec = ''
-        if len(method_s.params) == 0:
-            # If there are no parameters
-            method_spec = '()' + ret_type
-        else:
-            # It has params, so add them to the method_spec
-            method_spec = '('
-            for param in method_s.params:
-                method_spec += get_jvm_type(param)
-            method_spec += ')' + ret_type
-        return method_spec
-
-    def _reset(self):
-        """Reset the fields to their default values for further
-        compilation.
+        pool = multiprocessing.Pool(min(self._jobs, len(asts)), _init_worker,
+                                    (context, asts, self._inline_budget,
+                                     profiler.enabled))
+        try:
+            for result, counts in pool.imap(_generate_worker_class,
+                                            range(len(asts))):
+                profiler.add_counts(counts)
+                self._add_class(context, result, cache, on_class)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _get_options(self):
+        """Get the settings which affect the generated code, these are stored
+        in the build cache.
         """
-        for key in self._next_labels.iterkeys():
-            self._next_labels[key] = 0
-        self._out = ''
+        return {'devirtualize': self._devirtualize,
+                'inline_budget': self._inline_budget,
+                'separate': self._separate, 'lazy': self._lazy}
+
+    def _get_converted_tail_calls(self):
+        return self._converted_tail_calls
+
+    def _get_ast_cache(self):
+        return self._ast_cache
+
+    converted_tail_calls = property(_get_converted_tail_calls)
+    ast_cache = property(_get_ast_cache)
+
+class ClassGenerator(object):
+    """This class contains all the methods and fields to do the code
+    generation of a single class, using the information about the whole
+    program held in the context of the compile.
+    """
+    def __init__(self, context, inline_budget = 30):
+        """Calls to small methods are replaced by the method's body;
+        inline_budget is the maximum number of tree nodes which can be inlined
+        into a call site, 0 disables inlining.
+        """
+        self._context = context
+        # Labels used in if, while, for and comparison statements need to be
+        # unique for that statement, appending the value stored here to the end
+        # makes it unique if it is incremented after each new statement of that
+        # type has been visited Should be accessed with _label_suffix
+        self._next_labels = {'if': 0, 'while': 0, 'for': 0, 'comp': 0,
+                             'not': 0, 'mat_rows': 0, 'mat_a_cols': 0,
+                             'mat_b_cols': 0, 'auxiliary': 0, 'method': 0}
+        # This stores the IR of the class currently being generated, which
+        # will be written to the output
+        self._class_ir = ClassIR()
+        # The IR of the method currently being generated
+        self._method_ir = None
+        # The current frame keeps track of local variable locations for a given
+        # method
         self._cur_frame = None
+        # Stores the name of the current class
+        self._cur_class = ''
+        # The program wide information from the context, these are only read
+        self._t_env = context.t_env
+        self._method_sigs = context.method_sigs
+        self._field_sigs = context.field_sigs
+        self._hierarchy = context.hierarchy
+        self._method_nodes = context.method_nodes
+        self._inline_budget = inline_budget
+        # The (class, method) tuples of the method being generated, and the
+        # methods currently being inlined into it
+        self._inline_stack = []
+        # The number of tree nodes currently being inlined
+        self._inline_size = 0
+        # The recursive calls in tail position in the method being generated,
+        # these are compiled into a jump to the start of the method
+        self._tail_calls = []
+        # The label at the start of the method being generated
+        self._method_start = None
+        # The names of the classes whose methods have been inlined into the
+        # class being generated
+        self._inlined_classes = set()
+        # The (class, method) tuples of the tail calls which have been
+        # compiled into a jump
+        self._converted_tail_calls = []
+
+    def generate(self, ast):
+        """Build the IR of the class or interface in the AST."""
+        self._class_ir.name = ast.children[0].value
+        visit(self, ast)
+        return self._class_ir
 
     #######################################################################
     ## Visitor methods
@@ -293,19 +523,18 @@ class CodeGenerator(object):
         an explicit one.
         """
         # Write the signature
-        self._add_ln('.method <init>()V')
-        self._add_iln('.limit stack 10')
-        self._add_iln('.limit locals 100')
+        self._begin_method('<init>()V')
+        self._cur_frame = Frame(None, False, 'void')
         # Call the super constructor
         self._gen_super_constructor()
         # Generate code for the method body
         self._add_iln('return')
-        self._add_ln('.end method')
+        self._end_method()
 
     def _gen_super_constructor(self):
         """Generates the code to invoke a call to the super class' constructor.
         """
-        self._add_iln('aload_0', ';Load the current object')
+        self._load_this(';Load the current object')
         super_ = self._t_env.get_class_s(self._cur_class).super_class
         self._add_iln('invokespecial ' + super_ + '/<init>()V')
 
@@ -354,13 +583,11 @@ class CodeGenerator(object):
         # Combine signature and spec
         class_s = self._t_env.get_class_s(self._cur_class)
         cons_s = class_s.constructor
-        signature = name + self._gen_method_descriptor(cons_s, True)
+        signature = name + self._context.get_method_descriptor(cons_s, True)
         # Write the signature
-        self._add_ln('.method ' + signature)
+        self._begin_method(signature)
         # Create a new frame for this method
         self._cur_frame = Frame(children[1], False, 'void')
-        self._add_iln('.limit stack 10')
-        self._add_iln('.limit locals 100')
         # If the constructor of the super class is no explicitly called
         # in the code, it must be generated here
         not_has_body = isinstance(node.children[2], nodes.EmptyNode)
@@ -375,7 +602,7 @@ class CodeGenerator(object):
             # There is no return statement at the end of the method,
             # so one must be added
             self._add_iln('return')
-        self._add_ln('.end method')
+        self._end_method()
 
     def _visit_method_dcl_node(self, node):
         self._gen_method_def(node)
@@ -399,30 +626,38 @@ class CodeGenerator(object):
         if children[0].value == 'main':
             # Added public and static to main so that the JVM recognises this
             # as the main method
-            self._add_ln('.method public static main([Ljava/lang/String;)V')
+            self._begin_method('public static main([Ljava/lang/String;)V')
         else:
             name = children[0].value
             # Build up the spec (parameter types and return type)
             class_s = self._t_env.get_class_s(self._cur_class)
             method_s = class_s.get_method(name)
-            spec = self._gen_method_descriptor(method_s, False)
+            spec = self._context.get_method_descriptor(method_s, False)
             # Combine signature and spec
             signature = name + spec
             # Add modifiers
-            full_sig = '.method '
+            full_sig = ''
             if 'private' not in node.modifiers:
                 full_sig += 'public '
             for modifier in node.modifiers:
                 full_sig += modifier + ' '
             # Write the signature
-            self._add_ln(full_sig + signature)
+            self._begin_method(full_sig + signature)
         # Create a new frame for this method
         is_static = 'static' in node.modifiers
         self._cur_frame = Frame(param_node, is_static, node.type_)
-        self._add_iln('.limit stack 10')
-        self._add_iln('.limit locals 100')
+        # A method must not be inlined into itself
+        self._inline_stack = [(self._cur_class, children[0].value)]
+        # Find the recursive calls which can be turned into jumps
+        self._tail_calls = []
+        self._find_tail_calls(body_node, True, node)
+        if len(self._tail_calls) != 0:
+            self._method_start = 'MethodStart' + self._label_suffix('method')
+            self._add_label(self._method_start,
+                            ';Recursive tail calls jump back to here')
         # Generate code for the method body
         visit(self, body_node)
+        self._tail_calls = []
         # If the method is not empty, check it has a return statement
         # at the end, if not, manually add one
         body_stmts = body_node.children
@@ -432,22 +667,132 @@ class CodeGenerator(object):
             # There is no return statement at the end of the method,
             # so one must be added
             self._add_iln('return')
-        self._add_ln('.end method')
+        self._end_method()
+
+    def _find_tail_calls(self, node, is_tail, method_node):
+        """Search the statement for recursive calls to the method which are in
+        tail position.  These are calls which are returned, or calls in void
+        methods which are the final statement to be executed.
+        """
+        if isinstance(node, nodes.ReturnNode):
+            if self._is_self_call(node.children[0], method_node):
+                self._tail_calls.append(node.children[0])
+        elif isinstance(node, nodes.BlockNode):
+            stmts = node.children
+            for i, stmt in enumerate(stmts):
+                stmt_is_tail = is_tail and i == len(stmts) - 1
+                if (i + 1 < len(stmts) and
+                        isinstance(stmts[i + 1], nodes.ReturnVoidNode)):
+                    stmt_is_tail = True
+                self._find_tail_calls(stmt, stmt_is_tail, method_node)
+        elif isinstance(node, nodes.IfNode):
+            for child in node.children[1:]:
+                self._find_tail_calls(child, is_tail, method_node)
+        elif (isinstance(node, nodes.WhileNode) or
+                isinstance(node, nodes.ForNode)):
+            # Nothing in a loop is the final statement, but it may return
+            self._find_tail_calls(node.children[-1], False, method_node)
+        elif (is_tail and method_node.type_ == 'void' and
+                self._is_self_call(node, method_node)):
+            self._tail_calls.append(node)
+
+    def _is_self_call(self, node, method_node):
+        """Check if the node is a call of the method being defined by
+        method_node, which will always invoke that same method.
+        """
+        name = method_node.children[0].value
+        modifiers = method_node.modifiers
+        if isinstance(node, nodes.MethodCallNode):
+            # It's called on "this", so it must not be overridden
+            return (node.children[0].value == name and
+                    ('private' in modifiers or 'final' in modifiers or
+                     not self._is_overridable(self._cur_class, name)))
+        if isinstance(node, nodes.MethodCallLongNode):
+            # Only static methods can be called through the class name
+            return (len(node.children) == 3 and 'static' in modifiers and
+                    node.children[0].value == self._cur_class and
+                    node.children[1].value == name)
+        return False
+
+    def _is_tail_call(self, node):
+        """Check if the call node should be compiled into a jump."""
+        if self._cur_frame.is_inline:
+            # The call is in a method being inlined
+            return False
+        for call in self._tail_calls:
+            if call is node:
+                return True
+        return False
+
+    def _gen_tail_call(self, node, method_name, args_list):
+        """Generate a recursive call in tail position by assigning the
+        arguments to the parameters, and jumping to the start of the method.
+        """
+        class_s = self._t_env.get_class_s(self._cur_class)
+        method_s = class_s.get_method(method_name)
+        # All arguments must be evaluated before any parameter is assigned
+        try:
+            self._gen_args_list_node(args_list.children, method_s.params)
+        except AttributeError:
+            # No args
+            pass
+        for param in reversed(method_s.params):
+            loc = str(self._cur_frame.get_var(param.name))
+            self._add_iln(self._prefix(param.type_) + 'store ' + loc,
+                          ';Assign the argument to parameter ' + loc + ' (' +
+                          param.name + ')')
+        self._add_iln('goto ' + self._method_start,
+                      ';Jump to the start of the method instead of calling it')
+        self._converted_tail_calls.append((self._cur_class, method_name))
 
     def _visit_block_node(self, node):
-        """If it's a block, simply visit each child."""
-        for child in node.children:
-            visit(self, child)
+        """If it's a block, visit each child.  Variables declared in the block
+        go out of scope at the end of it, so their storage locations can be
+        reused.
+        """
+        self._cur_frame.enter_scope()
+        stmts = node.children
+        for i, stmt in enumerate(stmts):
+            visit(self, stmt)
+            if isinstance(stmt, nodes.ForNode):
+                # The loop variable is still in scope after the loop, but if
+                # it is not referenced again it can be freed
+                var_name = self._get_dcl_var_name(stmt.children[0])
+                if not self._is_referenced(var_name, stmts[i + 1:]):
+                    self._cur_frame.free_var(var_name)
+        self._cur_frame.exit_scope()
+
+    def _get_dcl_var_name(self, node):
+        """Get the name of the variable declared by a var_dcl or
+        var_dcl_assign node.
+        """
+        id_node = node.children[1]
+        if isinstance(node, nodes.VarDclAssignNode):
+            id_node = id_node.children[0]
+        try:
+            # Do for arrays
+            return id_node.children[0].value
+        except AttributeError:
+            return id_node.value
+
+    def _is_referenced(self, var_name, stmts):
+        """Check if an identifier with the name var_name appears anywhere in
+        the list of statements.
+        """
+        to_search = list(stmts)
+        while len(to_search) != 0:
+            node = to_search.pop()
+            if not node.is_leaf:
+                to_search.extend(node.children)
+            elif node.value == var_name:
+                return True
+        return False
 
     def _visit_var_dcl_node(self, node):
         """If it's a variable declaration, create a new variable in the
         frame.
         """
-        var_name = node.children[1].value
-        try:
-            # Do for arrays
-            var_name = node.children[1].children[0].value
-        except AttributeError: pass
+        var_name = self._get_dcl_var_name(node)
         is_long = self._is_long(node.children[0].value)
         self._cur_frame.new_var(var_name, is_long)
 
@@ -456,11 +801,7 @@ class CodeGenerator(object):
         statement.
         """
         assign_node = node.children[1]
-        var_name = assign_node.children[0].value
-        try:
-            # Do for arrays
-            var_name = assign_node.children[0].children[0].value
-        except AttributeError: pass
+        var_name = self._get_dcl_var_name(node)
         is_long = self._is_long(node.children[1].type_)
         self._cur_frame.new_var(var_name, is_long)
         visit(self, assign_node)
@@ -485,12 +826,12 @@ class CodeGenerator(object):
                       ';Jump to IfFalse if if-stmt evaluates to false')
         visit(self, children[1])
         self._add_iln('goto IfEnd' + next_if)
-        self._add_ln('IfFalse' + next_if + ':',
+        self._add_label('IfFalse' + next_if,
                      ';Continue from here if if_stmt was false')
         # If these is an else statement, generate the code for that
         if len(children) == 3:
             visit(self, children[2])
-        self._add_ln('IfEnd' + next_if + ':', ';End the if statement')
+        self._add_label('IfEnd' + next_if, ';End the if statement')
 
     def _visit_while_node(self, node):
         """These following statements work in much the same way as the if
@@ -498,7 +839,7 @@ class CodeGenerator(object):
         """
         children = node.children
         next_while = self._label_suffix('while')
-        self._add_ln('WhileStart' + next_while + ':',
+        self._add_label('WhileStart' + next_while,
                      ';Create an initial label to return to for loop effect')
         visit(self, children[0])
         self._add_iln('ifeq WhileEnd' + next_while,
@@ -507,14 +848,14 @@ class CodeGenerator(object):
         visit(self, children[1])
         self._add_iln('goto WhileStart' + next_while,
                       ';Jump back to WhileStart to create the loop effect')
-        self._add_ln('WhileEnd' + next_while + ':',
+        self._add_label('WhileEnd' + next_while,
                      ';Exit point for he loop')
 
     def _visit_for_node(self, node):
         children = node.children
         next_for = self._label_suffix('for')
         visit(self, children[0])
-        self._add_ln('ForStart' + next_for + ':',
+        self._add_label('ForStart' + next_for,
                      ';Create an initial label to return to for loop effect')
         visit(self, children[1])
         self._add_iln('ifeq ForEnd' + next_for,
@@ -524,19 +865,23 @@ class CodeGenerator(object):
         visit(self, children[2])
         self._add_iln('goto ForStart' + next_for,
                       ';Jump back to ForStart to create the loop effect')
-        self._add_ln('ForEnd' + next_for + ':', ';Exit point for the loop')
+        self._add_label('ForEnd' + next_for, ';Exit point for the loop')
 
     def _visit_return_node(self, node):
         ret_expr = node.children[0]
         visit(self, ret_expr)
+        if self._is_tail_call(ret_expr):
+            # It has become a jump, so there is nothing to return
+            return
         # Add a convert operator is needed
         method_type = self._cur_frame.ret_type
         self._add_convert_op(method_type, ret_expr)
-        self._add_iln(self._prefix(method_type) + 'return',
-                      ';Return from method')
+        if not self._cur_frame.is_inline:
+            self._add_iln(self._prefix(method_type) + 'return',
+                          ';Return from method')
 
     def _visit_super_constructor_call_node(self, node):
-        self._add_iln('aload_0', ';Load the current object')
+        self._load_this(';Load the current object')
         super_ = self._t_env.get_class_s(self._cur_class).super_class
         # Get the arguments onto the stack
         try:
@@ -572,8 +917,7 @@ class CodeGenerator(object):
         # If it's a field, ref to the current object must be
         # loaded before the value to assign
         if (self._cur_class, var_name) in self._field_sigs.keys():
-            self._add_iln('aload_0',
-                          ';Load the current object to assign to field')
+            self._load_this(';Load the current object to assign to field')
         visit(self, children[1])
         # Add conversion op if needed
         self._add_convert_op(children[0], children[1])
@@ -820,11 +1164,11 @@ class CodeGenerator(object):
                       ';Comparison was false, so load binary constant 0')
         self._add_iln('goto CompEnd' + next_comp,
                       ';Jump to the end of the comparison')
-        self._add_ln('CompTrue' + next_comp + ':',
+        self._add_label('CompTrue' + next_comp,
                      ';End up here if the comparison was true')
         self._add_iln('ldc 1',
                       ';Comparison was true, so load binary constant 1')
-        self._add_ln('CompEnd' + next_comp + ':',
+        self._add_label('CompEnd' + next_comp,
                      ';Exit point for comparison if it is false')
 
     def _visit_add_node(self, node):
@@ -852,6 +1196,9 @@ class CodeGenerator(object):
         the rows.
         """
         # Note: the left hand matrix is referred to as a, and the right as b
+        # The auxiliary variables are only needed during the operation, so
+        # put them in their own scope
+        self._cur_frame.enter_scope()
         # Create and store lengths of the dimensions
         # First visit child to gen code to load the array
         visit(self, node.children[0])
@@ -906,7 +1253,7 @@ class CodeGenerator(object):
         next_mat_rows = self._label_suffix('mat_rows')
         next_mat_cols_b = self._label_suffix('mat_b_cols')
         # Start outer loop
-        self._add_ln('MatRowStart' + next_mat_rows + ':',
+        self._add_label('MatRowStart' + next_mat_rows,
                      ';Start of loop through rows')
         self._add_iln('iload ' + idx1_loc, ';Load index')
         self._add_iln('iload ' + row_len_loc1, ';Get row length')
@@ -922,10 +1269,11 @@ class CodeGenerator(object):
         self._add_iln('iinc ' + idx1_loc + ' 1', ';Increment the index')
         self._add_iln('goto MatRowStart' + next_mat_rows,
                       ';Return to start of inner loop')
-        self._add_ln('MatRowEnd' + next_mat_rows + ':',
+        self._add_label('MatRowEnd' + next_mat_rows,
                      ';End of the inner loop')
         self._add_iln('aload ' + result_mat_loc,
                       ';Leave the result matrix on the stack')
+        self._cur_frame.exit_scope()
 
     def _gen_check_matrix_mult_dimensions(self, col_len_loc1, row_len_loc2):
         """Generate code to check matrices dimensions are compatible for
@@ -945,7 +1293,7 @@ class CodeGenerator(object):
                       '<init>(Ljava/lang/String;)V',
                       ";Invoke the exception's constructor")
         self._add_iln('athrow', ';Throw the exception')
-        self._add_ln('CompTrue' + next_comp + ':',
+        self._add_label('CompTrue' + next_comp,
                      ';Exit check here if no exception thrown')
 
     def _gen_check_matrix_add_dimensions(self, row_len_loc1, col_len_loc1,
@@ -966,7 +1314,7 @@ class CodeGenerator(object):
         self._add_iln('iload ' + col_len_loc2, ";Load second array's cols")
         self._add_iln('if_icmpeq CompTrue' + next_comp2,
                       ';Check dimensions match')
-        self._add_ln('CompTrue' + next_comp1 + ':', ';First check failed')
+        self._add_label('CompTrue' + next_comp1, ';First check failed')
         self._add_iln('new java/lang/ArithmeticException',
                       ';Create a new exception')
         self._add_iln('dup', ';Dup in order to call constructor, and throw')
@@ -976,7 +1324,7 @@ class CodeGenerator(object):
                       '<init>(Ljava/lang/String;)V',
                       ";Invoke the exception's constructor")
         self._add_iln('athrow', ';Throw the exception')
-        self._add_ln('CompTrue' + next_comp2 + ':',
+        self._add_label('CompTrue' + next_comp2,
                      ';Exit check here if no exception thrown')
 
     def _gen_matrix_addition(self, node, col_len_loc, result_mat_loc,
@@ -986,7 +1334,7 @@ class CodeGenerator(object):
         idx2_loc = str(self._get_auxillary_var_loc())
         self._add_iln('istore ' + idx2_loc, ';Set loop index to 0')
         # Start inner loop
-        self._add_ln('MatColStart' + next_mat_cols + ':',
+        self._add_label('MatColStart' + next_mat_cols,
                      ';Start of loop through rows')
         self._add_iln('iload ' + idx2_loc, ';Load index')
         self._add_iln('iload ' + col_len_loc, ';Get row len')
@@ -1020,7 +1368,7 @@ class CodeGenerator(object):
         self._add_iln('iinc ' + idx2_loc + ' 1', ';Increment the index')
         self._add_iln('goto MatColStart' + next_mat_cols,
                       ';Return to start of inner loop')
-        self._add_ln('MatColEnd' + next_mat_cols + ':',
+        self._add_label('MatColEnd' + next_mat_cols,
                      ';End of the inner loop')
 
     def _get_auxillary_var_loc(self):
@@ -1047,7 +1395,7 @@ class CodeGenerator(object):
         idx2_loc = str(self._get_auxillary_var_loc())
         self._add_iln('istore ' + idx2_loc, ';Set loop index to 0')
         # Start loop through matrix b columns
-        self._add_ln('MatBColStart' + next_mat_b_cols + ':',
+        self._add_label('MatBColStart' + next_mat_b_cols,
                      ';Start of loop through rows')
         self._add_iln('iload ' + idx2_loc, ';Load index')
         self._add_iln('iload ' + col_len_loc2, ';Get row len')
@@ -1058,7 +1406,7 @@ class CodeGenerator(object):
         idx3_loc = str(self._get_auxillary_var_loc())
         self._add_iln('istore ' + idx3_loc, ';Set loop index to 0')
         # Start (innermost) loop through matrix a columns
-        self._add_ln('MatAColStart' + next_mat_a_cols + ':',
+        self._add_label('MatAColStart' + next_mat_a_cols,
                      ';Start of loop through rows')
         self._add_iln('iload ' + idx3_loc, ';Load index')
         self._add_iln('iload ' + col_len_loc1, ';Get row len')
@@ -1097,13 +1445,13 @@ class CodeGenerator(object):
         self._add_iln('iinc ' + idx3_loc + ' 1', ';Increment the index')
         self._add_iln('goto MatAColStart' + next_mat_a_cols,
                       ';Return to start of inner loop')
-        self._add_ln('MatAColEnd' + next_mat_a_cols + ':',
+        self._add_label('MatAColEnd' + next_mat_a_cols,
                      ';End of the inner loop')
         # End matrix b column loop
         self._add_iln('iinc ' + idx2_loc + ' 1', ';Increment the index')
         self._add_iln('goto MatBColStart' + next_mat_b_cols,
                       ';Return to start of middle loop')
-        self._add_ln('MatBColEnd' + next_mat_b_cols + ':',
+        self._add_label('MatBColEnd' + next_mat_b_cols,
                      ';End of the middle loop')
 
     def _gen_arith(self, node):
@@ -1226,9 +1574,9 @@ class CodeGenerator(object):
                       ';If its 0, go to the code to change it to 1')
         self._add_iln('iconst_0', ';It was 1, so change to 0')
         self._add_iln('goto NotEnd' + next_not, ';Exit the not code')
-        self._add_ln('IsFalse' + next_not + ':', ';Start here to change to 1')
+        self._add_label('IsFalse' + next_not, ';Start here to change to 1')
         self._add_iln('iconst_1', ';Change to 1')
-        self._add_ln('NotEnd' + next_not + ':', ';Exit the not code')
+        self._add_label('NotEnd' + next_not, ';Exit the not code')
 
     def _visit_pos_node(self, node):
         """Simply apply the neg operator to the top of the stack."""
@@ -1289,8 +1637,8 @@ class CodeGenerator(object):
             except KeyError:
                 # It's a field; ref to the current object must be loaded before
                 # the value to assign
-                self._add_iln('aload_0', ';Load the current object to ' +
-                              'assign to field')
+                self._load_this(';Load the current object to assign to ' +
+                                'field')
                 self._gen_load_variable(children[0])
                 self._add_iln('ldc ' + op + '1', ';Push 1 or -1 on the stack')
                 self._add_iln(self._prefix(children[0]) + 'add',
@@ -1331,14 +1679,23 @@ class CodeGenerator(object):
         """Generate code to call a method in the current class, or a
         superclass.
         """
-        self._add_iln('aload_0 ', ';Load the local variable in location 0, ' +
-                      'which is a reference to the current object')
+        if self._is_tail_call(node):
+            self._gen_tail_call(node, node.children[0].value, node.children[1])
+            return
         class_s = self._t_env.get_class_s(self._cur_class)
         method_name = node.children[0].value
         # Search for the method
+        method_s = None
         try:
             class_s, method_s = self._find_method_s(class_s, method_name)
-        except SymbolNotFoundError:
+        except SymbolNotFoundError: pass
+        if (method_s is not None and
+                self._can_inline(self._cur_class, class_s, method_s)):
+            self._gen_inline_call(class_s, method_s, node.children[1], False)
+            return
+        self._load_this(';Load the local variable in location 0, which is ' +
+                        'a reference to the current object')
+        if method_s is None:
             # Must be in a library class
             method_s = self._find_lib_method_s(self._cur_class, method_name,
                                                node.children[1])
@@ -1357,6 +1714,10 @@ class CodeGenerator(object):
             op = 'invokevirtual'
             if 'private' in method_s.modifiers:
                 op = 'invokespecial'
+            elif self._is_direct_call(self._cur_class, method_name):
+                # No subclass overrides the method, so it can be called
+                # without a virtual lookup
+                op = 'invokespecial'
             self._add_iln(op + ' ' + method_sig)
         except KeyError:
             # Do for lib methods
@@ -1370,6 +1731,9 @@ class CodeGenerator(object):
         class_name = children[0].value
         method_name = children[1].value
         args_list = children[-1]
+        if self._is_tail_call(node):
+            self._gen_tail_call(node, method_name, args_list)
+            return
         # Load the object, if it's not static
         is_static = True
         if children[0].value not in self._t_env.types:
@@ -1385,6 +1749,13 @@ class CodeGenerator(object):
             get_class = self._t_env.get_class_or_interface_s
             class_s = get_class(class_name)
             class_s, method_s = self._find_method_s(class_s, method_name)
+            if not is_static and class_s.name in self._t_env.interfaces:
+                class_s, method_s = self._devirtualize_interface_call(class_s,
+                                                                      method_s)
+            if self._can_inline(class_name, class_s, method_s):
+                self._gen_inline_call(class_s, method_s, args_list,
+                                      not is_static)
+                return
             # Get the results from what the arguments are on the
             # top of the stack
             try:
@@ -1404,6 +1775,11 @@ class CodeGenerator(object):
             op = 'invokestatic'
         elif method_s is not None and 'private' in method_s.modifiers:
             op = 'invokespecial'
+        elif (class_s is not None and
+                self._is_direct_call(class_name, method_name)):
+            # The JVM only allows methods to be called directly on objects of
+            # the current class
+            op = 'invokespecial'
         # Invoke it as either a class or interface or library class
         if class_s is not None and class_s.name in self._t_env.classes:
             method_sig = self._method_sigs[(class_s.name, method_s.name)]
@@ -1429,10 +1805,152 @@ class CodeGenerator(object):
                 sig = method_s.sig
                 self._add_iln(op + ' ' + sig)
 
+    def _is_direct_call(self, class_name, method_name):
+        """Check if a method called on an object of the given class can be
+        invoked without a virtual lookup.  The JVM only allows this for
+        objects of the class being generated.
+        """
+        return (class_name == self._class_ir.name and
+                not self._is_overridable(class_name, method_name))
+
+    def _is_overridable(self, class_name, method_name):
+        """Check if a method called on an object of the given class could
+        have more than one implementation.
+        """
+        if self._hierarchy is None:
+            return True
+        return self._hierarchy.is_overridden(class_name, method_name)
+
+    def _can_inline(self, class_name, class_s, method_s):
+        """Check if a call to a method, on an object of class class_name, can
+        be replaced by the body of the method.  Only small, non recursive
+        methods with a single implementation are inlined.
+        """
+        key = (class_s.name, method_s.name)
+        if (self._inline_budget <= 0 or key not in self._method_nodes or
+                key in self._inline_stack):
+            return False
+        modifiers = method_s.modifiers
+        if ('private' not in modifiers and 'static' not in modifiers and
+                'final' not in modifiers and
+                self._is_overridable(class_name, method_s.name)):
+            return False
+        if (class_s.name != self._class_ir.name and
+                self._has_private_members(class_s)):
+            # The body can't be moved out of its class if it could refer to
+            # private members
+            return False
+        body_node = self._get_method_parts(self._method_nodes[key])[1]
+        size = self._get_inline_size(body_node)
+        return (size is not None and
+                self._inline_size + size <= self._inline_budget)
+
+    def _has_private_members(self, class_s):
+        for member in class_s.fields + class_s.methods:
+            if 'private' in member.modifiers:
+                return True
+        return False
+
+    def _get_inline_size(self, body_node):
+        """Get the number of nodes in the body of a method, or None if the
+        body can't be inlined.  A return statement must be the final
+        statement, and there must be no references to the super class.
+        """
+        last_stmt = None
+        if not isinstance(body_node, nodes.EmptyNode):
+            last_stmt = body_node.children[-1]
+        size = 0
+        to_visit = [body_node]
+        while len(to_visit) != 0:
+            node = to_visit.pop()
+            size += 1
+            if (isinstance(node, nodes.MethodCallSuperNode) or
+                    isinstance(node, nodes.FieldRefSuperNode) or
+                    isinstance(node, nodes.SuperConstructorCallNode)):
+                return None
+            if ((isinstance(node, nodes.ReturnNode) or
+                    isinstance(node, nodes.ReturnVoidNode)) and
+                    node is not last_stmt):
+                return None
+            if not node.is_leaf:
+                to_visit.extend(node.children)
+        return size
+
+    def _get_method_parts(self, node):
+        """Get the parameter and body nodes of a method definition node."""
+        children = node.children
+        if len(children) == 5:
+            # The method returns an array
+            return children[3], children[4]
+        return children[2], children[3]
+
+    def _gen_inline_call(self, class_s, method_s, args_list, has_receiver):
+        """Generate the body of a method in place of a call to it.  If
+        has_receiver is True, the object the method is called on is on the
+        top of the stack, otherwise the method is static or called on "this".
+        The arguments are evaluated in order and stored in new locations,
+        which the method's variables are mapped to.
+        """
+        key = (class_s.name, method_s.name)
+        param_node, body_node = self._get_method_parts(self._method_nodes[key])
+        # Get the results from what the arguments are on the top of the stack
+        try:
+            self._gen_args_list_node(args_list.children, method_s.params)
+        except AttributeError:
+            # No args
+            pass
+        frame = Frame(param_node, True, method_s.type_, self._cur_frame)
+        for param in reversed(method_s.params):
+            loc = str(frame.get_var(param.name))
+            self._add_iln(self._prefix(param.type_) + 'store ' + loc,
+                          ';Store argument in ' + loc + ' (' + param.name +
+                          ')')
+        if has_receiver:
+            # Calling a method on null must still throw an exception
+            self._add_iln('dup', ';Duplicate the object to check for null')
+            self._add_iln('invokevirtual java/lang/Object/getClass()' +
+                          'Ljava/lang/Class;', ';Throws if the object is null')
+            self._add_iln('pop')
+            frame.new_var('this')
+            loc = str(frame.this_loc)
+            self._add_iln('astore ' + loc, ';Store the object in ' + loc)
+        elif 'static' not in method_s.modifiers:
+            frame.bind_this(self._cur_frame.this_loc)
+        # Generate the body with the method's class and frame
+        size = self._get_inline_size(body_node)
+        cur_class = self._cur_class
+        cur_frame = self._cur_frame
+        self._cur_class = class_s.name
+        self._cur_frame = frame
+        self._inline_stack.append(key)
+        self._inline_size += size
+        self._inlined_classes.add(class_s.name)
+        visit(self, body_node)
+        self._inline_size -= size
+        self._inline_stack.pop()
+        self._cur_class = cur_class
+        self._cur_frame = cur_frame
+        frame.release()
+
+    def _devirtualize_interface_call(self, interface_s, method_s):
+        """If only one implementation of an interface method exists in the
+        program, cast the object on the top of the stack to the class holding
+        it so the method can be invoked virtually rather than through the
+        interface.  Returns the class and method symbols to invoke.
+        """
+        if self._hierarchy is None:
+            return interface_s, method_s
+        get_impl = self._hierarchy.get_single_implementation
+        class_s = get_impl(interface_s.name, method_s.name)
+        if class_s is None:
+            return interface_s, method_s
+        self._add_iln('checkcast ' + class_s.name, ';Only ' + class_s.name +
+                      ' implements the method, so call it directly')
+        return class_s, class_s.get_method(method_s.name)
+
     def _visit_method_call_super_node(self, node):
         """Generate code for a call to a method in a super class."""
-        self._add_iln('aload_0 ', ';Load the local variable in locatiom 0, ' +
-                      'which is a reference to the current object')
+        self._load_this(';Load the reference to the current object')
         # Get the class and method symbols of the method
         class_s = self._t_env.get_class_or_interface_s(self._cur_class)
         cur_class_s = class_s
@@ -1657,8 +2175,7 @@ class CodeGenerator(object):
                           'stored in ' + var + ' (' + node.value + ')')
         except KeyError:
             # It must be a field
-            self._add_iln('aload_0',
-                          ';Load "this" in order to access the field')
+            self._load_this(';Load "this" in order to access the field')
             # Find the field (could be in superclass)
             fname = node.value
             cname = self._cur_class
@@ -1688,8 +2205,9 @@ class CodeGenerator(object):
             else:
                 self._add_iln('iconst_0', ';Load constant boolean value 0')
 
-    def _gen_return_void(self, node):
-        self._add_iln('return', ';Return from the void method')
+    def _visit_return_void_node(self, node):
+        if not self._cur_frame.is_inline:
+            self._add_iln('return', ';Return from the void method')
 
     def _visit_interface_node(self, node):
         children = node.children
@@ -1723,10 +2241,10 @@ class CodeGenerator(object):
         interface_s = self._t_env.get_interface_s(self._cur_class)
         method_s = interface_s.get_method(name)
         signature = name
-        signature += self._gen_method_descriptor(method_s, False)
+        signature += self._context.get_method_descriptor(method_s, False)
         # Write the signature
-        self._add_ln('.method public abstract ' + signature)
-        self._add_ln('.end method')
+        self._begin_method('public abstract ' + signature, False)
+        self._end_method()
 
     def _prefix(self, node):
         """Get's the correct instruction prefix given the type of the
@@ -1788,40 +2306,83 @@ class CodeGenerator(object):
             return True
         return False
 
+    def _load_this(self, comment):
+        """Load the reference to the current object.  Inside an inlined method
+        this may not be in location 0.
+        """
+        loc = self._cur_frame.this_loc
+        if loc == 0:
+            self._add_iln('aload_0', comment)
+        else:
+            self._add_iln('aload ' + str(loc), comment)
+
     def _label_suffix(self, key):
         """Gets the current label suffix, and automatically increments."""
         val = self._next_labels[key]
         self._next_labels[key] += 1
         return str(val)
 
+    def _begin_method(self, header, has_code = True):
+        """Start generating the code of a new method.  The header is the
+        method's modifiers and signature.
+        """
+        self._method_ir = MethodIR(header, has_code)
+
+    def _end_method(self):
+        """Add the method currently being generated to the class."""
+        if self._method_ir.has_code:
+            # Inlined calls use the stack on top of the caller's operands, so
+            # the depth it reaches is only known once the code is complete
+            self._method_ir.limit_stack = self._method_ir.max_stack()
+            self._method_ir.limit_locals = self._cur_frame.max_locals
+        self._class_ir.add_method(self._method_ir)
+        self._method_ir = None
+
     def _add_iln(self, line, comment = None):
-        """Adds and indented line to the output."""
-        if comment is None:
-            self._out += '\t' + line + '\n'
-        else:
-            self._out += ('\t' + line + self._get_tab_len(line) + comment +
-                          '\n')
+        """Adds an instruction to the current method."""
+        self._method_ir.add(Instruction.from_text(line, comment))
+
+    def _add_label(self, name, comment = None):
+        """Adds a label to the current method."""
+        self._method_ir.add(Label(name, comment))
 
     def _add_ln(self, line, comment = None):
-        """Adds a regular line to the output."""
-        if comment is None:
-            self._out += line + '\n'
-        else:
-            self._out += (line + self._get_tab_len(line) + '\t' + comment +
-                          '\n')
+        """Adds a class level directive to the output."""
+        self._class_ir.add_directive(Directive(line, comment))
 
-    def _get_tab_len(self, line):
-        """Get the amount of tabs needed to indent the comment part 20
-        characters.
-        """
-        length = len(line)
-        if length < 8:
-            return '\t\t\t\t'
-        elif length < 15:
-            return '\t\t\t'
-        elif length < 22:
-            return '\t\t'
-        elif length < 32:
-            return '\t'
-        else: # It's 32 or greater - just make it a space
-            return ' '
\ No newline at end of file
+    def _get_inlined_classes(self):
+        return self._inlined_classes
+
+    def _get_converted_tail_calls(self):
+        return self._converted_tail_calls
+
+    inlined_classes = property(_get_inlined_classes)
+    converted_tail_calls = property(_get_converted_tail_calls)
+
+def _generate_class(context, inline_budget, ast):
+    """Build the IR of a class, and return it with the names of the classes
+    inlined into it, and the tail calls which were compiled into jumps.
+    """
+    class_gen = ClassGenerator(context, inline_budget)
+    class_ir = class_gen.generate(ast)
+    return (class_ir, class_gen.inlined_classes,
+            class_gen.converted_tail_calls)
+
+def _init_worker(context, asts, inline_budget, profiling):
+    """Set the state of the compile in a new worker process.  If profiling
+    is True, the work done in the worker is counted.
+    """
+    global _worker_context, _worker_asts, _worker_inline_budget
+    _worker_context = context
+    _worker_asts = asts
+    _worker_inline_budget = inline_budget
+    profiler.reset()
+    profiler.enabled = profiling
+
+def _generate_worker_class(idx):
+    """Generate one class in a worker process, and return the result along
+    with the counts of the work done.
+    """
+    result = _generate_class(_worker_context, _worker_inline_budget,
+                             _worker_asts[idx])
+    return result, profiler.take_counts()
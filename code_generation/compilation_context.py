@@ -0,0 +1,165 @@
+"""This module contains the CompilationContext, which holds the state of a
+single compile of a program: its type checked ASTs, the top environment, and
+the information the code generator derives from them for the whole program.
+Keeping this state out of the CodeGenerator lets one generator run several
+compiles at once.
+"""
+import parser_.tree_nodes as nodes
+from utilities.utilities import is_main, get_jvm_type
+
+class CompilationContext(object):
+    """The state of the compile of one program.  hierarchy is the class
+    hierarchy used for devirtualization, or None if it's disabled.
+    """
+    def __init__(self, source, asts, t_env, hierarchy = None):
+        self._source = source
+        self._asts = asts
+        self._t_env = t_env
+        self._hierarchy = hierarchy
+        # Stores method signatures for simple retrieval when the method is
+        # called.  Elements are indexed with a (class, method) tuple
+        self._method_sigs = dict()
+        # Stores field sigs
+        self._field_sigs = dict()
+        # Stores the method definition nodes of all methods, indexed with a
+        # (class, method) tuple
+        self._method_nodes = dict()
+        # Stores a (class, method) tuple for each tail call which has been
+        # compiled into a jump
+        self._converted_tail_calls = []
+        # The IR of each class which has been generated
+        self._class_irs = []
+        self._gen_field_method_sigs(t_env)
+        self._find_method_nodes(asts)
+
+    def get_method_descriptor(self, method_s, is_cons):
+        """This method returns a jasmin style string which represents the
+        parameter types and return types for a method.
+        """
+        ret_type = ''
+        if is_cons:
+            ret_type = 'V'
+        else:
+            ret_type = get_jvm_type(method_s)
+        method_spec = ''
+        if len(method_s.params) == 0:
+            # If there are no parameters
+            method_spec = '()' + ret_type
+        else:
+            # It has params, so add them to the method_spec
+            method_spec = '('
+            for param in method_s.params:
+                method_spec += get_jvm_type(param)
+            method_spec += ')' + ret_type
+        return method_spec
+
+    def _find_method_nodes(self, asts):
+        """Store the definition node of each method in the program, so their
+        bodies can be inlined.  Classes loaded from signature files have none,
+        so their methods are never inlined.
+        """
+        for ast in asts:
+            if not isinstance(ast, nodes.ClassNode):
+                continue
+            class_name = ast.children[0].value
+            try:
+                members = ast.children[3].children
+            except AttributeError:
+                # The class body is empty
+                continue
+            for child in members:
+                if (isinstance(child, nodes.MethodDclNode) or
+                        isinstance(child, nodes.MethodDclArrayNode)):
+                    name = child.children[0].value
+                    self._method_nodes[class_name, name] = child
+
+    def _gen_field_method_sigs(self, t_env):
+        """Generate assembly style method signatures for all methods and fields
+        using the information held in the top environment from the semantic
+        analyser.
+        """
+        for class_s in t_env.classes.values() + t_env.interfaces.values():
+            self._gen_method_sigs(class_s, t_env)
+            try:
+                self._gen_cons_sig(class_s, t_env)
+                self._gen_field_sigs(class_s, t_env)
+            except:
+                # Not in interfaces
+                pass
+
+    def _gen_cons_sig(self, class_s, t_env):
+        """Generate the signature for the constructor."""
+        try:
+            cons = class_s.constructor
+            signature = class_s.name + '/'
+            if cons is not None and len(cons.params) > 0:
+                signature += '<init>'
+                signature += self.get_method_descriptor(cons, True)
+            else:
+                # No explicit constructor
+                signature += '<init>()V'
+            # Store the constructor's signature
+            self._method_sigs[(class_s.name, '<init>')] = signature
+        except AttributeError:
+            # It was an interface (no constructor)
+            pass
+
+    def _gen_field_sigs(self, class_s, t_env):
+        """Generate field signatures for a class."""
+        for field in class_s.fields:
+            name = field.name
+            signature = (class_s.name + '/' + name + ' ' +
+                     get_jvm_type(field))
+            # Store the signature
+            self._field_sigs[(class_s.name, name)] = signature
+
+    def _gen_method_sigs(self, class_s, t_env):
+        """Generate method and a constructor signatures for a class."""
+        for method in class_s.methods:
+            name = method.name
+            signature = class_s.name + '/'
+            # Check for the main method
+            if is_main(method):
+                signature += 'main([Ljava/lang/String;)V'
+            else:
+                signature += name
+                signature += self.get_method_descriptor(method, False)
+            # Store the signature
+            self._method_sigs[(class_s.name, name)] = signature
+
+    def _get_source(self):
+        return self._source
+
+    def _get_asts(self):
+        return self._asts
+
+    def _get_t_env(self):
+        return self._t_env
+
+    def _get_hierarchy(self):
+        return self._hierarchy
+
+    def _get_method_sigs(self):
+        return self._method_sigs
+
+    def _get_field_sigs(self):
+        return self._field_sigs
+
+    def _get_method_nodes(self):
+        return self._method_nodes
+
+    def _get_converted_tail_calls(self):
+        return self._converted_tail_calls
+
+    def _get_class_irs(self):
+        return self._class_irs
+
+    source = property(_get_source)
+    asts = property(_get_asts)
+    t_env = property(_get_t_env)
+    hierarchy = property(_get_hierarchy)
+    method_sigs = property(_get_method_sigs)
+    field_sigs = property(_get_field_sigs)
+    method_nodes = property(_get_method_nodes)
+    converted_tail_calls = property(_get_converted_tail_calls)
+    class_irs = property(_get_class_irs)
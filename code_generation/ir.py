@@ -0,0 +1,427 @@
+"""This module contains the intermediate representation (IR) built by the code
+generator.  Rather than writing Jasmin text straight away, the code generator
+builds a ClassIR holding directives and methods, where each method is a list
+of instructions and labels.  A method's instructions can be split up into basic
+blocks which form its control flow graph, so that later stages can work on the
+structure of the code rather than on text.  Finally the JasminWriter
+serializes the IR to Jasmin assembly code.
+"""
+
+# Instructions which may transfer control to the label given as their operand
+BRANCH_OPS = frozenset(['ifeq', 'ifne', 'iflt', 'ifge', 'ifgt', 'ifle',
+                        'if_icmpeq', 'if_icmpne', 'if_icmplt', 'if_icmpge',
+                        'if_icmpgt', 'if_icmple', 'if_acmpeq', 'if_acmpne',
+                        'ifnull', 'ifnonnull', 'goto', 'goto_w'])
+
+# Instructions after which control never falls through to the next one
+TERMINATOR_OPS = frozenset(['goto', 'goto_w', 'return', 'ireturn', 'lreturn',
+                            'freturn', 'dreturn', 'areturn', 'athrow'])
+
+# The change each instruction makes to the depth of the operand stack, in
+# words, for the instructions whose change does not depend on their operand
+STACK_EFFECTS = dict()
+for _ops, _effect in [
+        ('aconst_null iconst_m1 iconst_0 iconst_1 iconst_2 iconst_3 iconst_4 '
+         'iconst_5 fconst_0 fconst_1 fconst_2 bipush sipush ldc ldc_w iload '
+         'iload_0 iload_1 iload_2 iload_3 fload fload_0 fload_1 fload_2 '
+         'fload_3 aload aload_0 aload_1 aload_2 aload_3 new dup dup_x1 dup_x2 '
+         'i2l i2d f2l f2d', 1),
+        ('lconst_0 lconst_1 dconst_0 dconst_1 ldc2_w lload lload_0 lload_1 '
+         'lload_2 lload_3 dload dload_0 dload_1 dload_2 dload_3 dup2 dup2_x1 '
+         'dup2_x2', 2),
+        ('nop iinc ineg fneg lneg dneg i2f f2i l2d d2l i2b i2c i2s laload '
+         'daload arraylength checkcast instanceof newarray anewarray swap '
+         'goto goto_w return', 0),
+        ('istore istore_0 istore_1 istore_2 istore_3 fstore fstore_0 '
+         'fstore_1 fstore_2 fstore_3 astore astore_0 astore_1 astore_2 '
+         'astore_3 pop iadd isub imul idiv irem ishl ishr iushr iand ior ixor '
+         'fadd fsub fmul fdiv frem lshl lshr lushr ifeq ifne iflt ifge ifgt '
+         'ifle ifnull ifnonnull ireturn freturn areturn athrow monitorenter '
+         'monitorexit iaload faload aaload baload caload saload l2i l2f d2i '
+         'd2f fcmpl fcmpg', -1),
+        ('lstore lstore_0 lstore_1 lstore_2 lstore_3 dstore dstore_0 dstore_1 '
+         'dstore_2 dstore_3 pop2 ladd lsub lmul ldiv lrem land lor lxor dadd '
+         'dsub dmul ddiv drem if_icmpeq if_icmpne if_icmplt if_icmpge '
+         'if_icmpgt if_icmple if_acmpeq if_acmpne lreturn dreturn', -2),
+        ('lcmp dcmpl dcmpg iastore fastore aastore bastore castore sastore',
+         -3),
+        ('lastore dastore', -4)]:
+    for _op in _ops.split():
+        STACK_EFFECTS[_op] = _effect
+
+class Instruction(object):
+    """A single JVM instruction made up of an opcode and an optional operand,
+    e.g. "iload" and "3".  The comment is written after the instruction in the
+    assembly code.
+    """
+    def __init__(self, op, operand = None, comment = None):
+        self._op = op
+        self._operand = operand
+        self._comment = comment
+
+    @staticmethod
+    def from_text(line, comment = None):
+        """Create an instruction from its Jasmin text, e.g. "iinc 3 1"."""
+        parts = line.split(None, 1)
+        operand = None
+        if len(parts) == 2:
+            operand = parts[1]
+        return Instruction(parts[0], operand, comment)
+
+    def __str__(self):
+        if self._operand is None:
+            return self._op
+        return self._op + ' ' + str(self._operand)
+
+    def stack_effect(self):
+        """Get the change the instruction makes to the depth of the operand
+        stack, in words.  The change made by field and method instructions is
+        worked out from the descriptor in their operand.
+        """
+        op = self._op
+        if op in STACK_EFFECTS:
+            return STACK_EFFECTS[op]
+        if op in ('getfield', 'putfield', 'getstatic', 'putstatic'):
+            # The descriptor follows the field's name, e.g. "X/x I"
+            size = _get_type_size(self._operand.split()[-1])
+            return {'getfield': size - 1, 'putfield': -size - 1,
+                    'getstatic': size, 'putstatic': -size}[op]
+        if op in ('invokevirtual', 'invokespecial', 'invokeinterface',
+                  'invokestatic'):
+            # invokeinterface is followed by its number of arguments
+            desc = self._operand.split()[0]
+            args, ret = desc[desc.index('(') + 1:].split(')')
+            effect = _get_type_size(ret) - _get_args_size(args)
+            if op != 'invokestatic':
+                # The object the method is invoked on
+                effect -= 1
+            return effect
+        if op == 'multianewarray':
+            # The dimensions are popped, and the new array pushed
+            return 1 - int(self._operand.split()[1])
+        raise ValueError('Unknown stack effect of instruction: ' + op)
+
+    def _get_op(self):
+        return self._op
+
+    def _get_operand(self):
+        return self._operand
+
+    def _set_operand(self, operand):
+        self._operand = operand
+
+    def _get_comment(self):
+        return self._comment
+
+    def _get_is_branch(self):
+        return self._op in BRANCH_OPS
+
+    def _get_is_terminator(self):
+        return self._op in TERMINATOR_OPS
+
+    op = property(_get_op)
+    operand = property(_get_operand, _set_operand)
+    comment = property(_get_comment)
+    is_branch = property(_get_is_branch)
+    is_terminator = property(_get_is_terminator)
+
+def _get_type_size(desc):
+    """Get the number of words of the operand stack a value with the given
+    type descriptor takes.
+    """
+    if desc == 'V':
+        return 0
+    elif desc in ('J', 'D'):
+        return 2
+    return 1
+
+def _get_args_size(desc):
+    """Get the number of words of the operand stack taken by the arguments
+    of a method, given the type descriptors of its arguments.
+    """
+    size = 0
+    idx = 0
+    while idx < len(desc):
+        start = idx
+        while desc[idx] == '[':
+            idx += 1
+        if desc[idx] == 'L':
+            idx = desc.index(';', idx)
+        idx += 1
+        if idx - start > 1:
+            # Arrays and objects are references
+            size += 1
+        else:
+            size += _get_type_size(desc[start])
+    return size
+
+class Label(object):
+    """A named position in a method's code which branches can jump to."""
+    def __init__(self, name, comment = None):
+        self._name = name
+        self._comment = comment
+
+    def __str__(self):
+        return self._name + ':'
+
+    def _get_name(self):
+        return self._name
+
+    def _get_comment(self):
+        return self._comment
+
+    name = property(_get_name)
+    comment = property(_get_comment)
+
+class Directive(object):
+    """A class level assembler directive, such as ".super" or ".field"."""
+    def __init__(self, text, comment = None):
+        self._text = text
+        self._comment = comment
+
+    def __str__(self):
+        return self._text
+
+    def _get_text(self):
+        return self._text
+
+    def _get_comment(self):
+        return self._comment
+
+    text = property(_get_text)
+    comment = property(_get_comment)
+
+class BasicBlock(object):
+    """A straight line sequence of instructions which can only be entered at
+    the start, and only left at the end.  The label is None for blocks which
+    are only reached by falling through from the previous block.
+    """
+    def __init__(self, label = None):
+        self._label = label
+        self._instructions = []
+        self._successors = []
+        self._predecessors = []
+
+    def add_instruction(self, instruction):
+        self._instructions.append(instruction)
+
+    def add_successor(self, block):
+        """Add an edge in the control flow graph from this block to block."""
+        if block not in self._successors:
+            self._successors.append(block)
+            block._predecessors.append(self)
+
+    def _get_label(self):
+        return self._label
+
+    def _get_instructions(self):
+        return self._instructions
+
+    def _get_successors(self):
+        return self._successors
+
+    def _get_predecessors(self):
+        return self._predecessors
+
+    def _get_last(self):
+        """Get the final instruction of the block, or None if it's empty."""
+        if self._instructions:
+            return self._instructions[-1]
+        return None
+
+    label = property(_get_label)
+    instructions = property(_get_instructions)
+    successors = property(_get_successors)
+    predecessors = property(_get_predecessors)
+    last = property(_get_last)
+
+class MethodIR(object):
+    """The code of a single method.  The header is everything following the
+    ".method" directive, e.g. "public static main([Ljava/lang/String;)V".
+    Abstract methods have no code, and therefore no limits.
+    """
+    def __init__(self, header, has_code = True):
+        self._header = header
+        self._items = []
+        self._has_code = has_code
+        self._limit_stack = 10
+        self._limit_locals = 100
+
+    def add(self, item):
+        """Append an instruction or label to the method's code."""
+        self._items.append(item)
+
+    def basic_blocks(self):
+        """Split the method's code into basic blocks, and link them together
+        to form the control flow graph.  The first block is the entry block.
+        """
+        blocks = []
+        block_of_label = dict()
+        cur = None
+        for item in self._items:
+            if isinstance(item, Label):
+                # A label always starts a new block, unless the current block
+                # is still empty, in which case it just gets the label
+                if cur is None or cur.instructions or cur.label is not None:
+                    cur = BasicBlock(item)
+                    blocks.append(cur)
+                else:
+                    cur._label = item
+                block_of_label[item.name] = cur
+            else:
+                if cur is None:
+                    cur = BasicBlock()
+                    blocks.append(cur)
+                cur.add_instruction(item)
+                if item.is_branch or item.is_terminator:
+                    # The instruction after a jump starts a new block
+                    cur = None
+        # Add the edges
+        for idx, block in enumerate(blocks):
+            last = block.last
+            if last is not None and last.is_branch:
+                block.add_successor(block_of_label[last.operand])
+            if ((last is None or not last.is_terminator) and
+                    idx + 1 < len(blocks)):
+                # Control falls through to the next block
+                block.add_successor(blocks[idx + 1])
+        return blocks
+
+    def max_stack(self):
+        """Work out the greatest depth the operand stack reaches in the
+        method, in words, by following the control flow graph from the entry
+        block.  The depth on entry to each block is the same along every path
+        to it, as the JVM requires.
+        """
+        blocks = self.basic_blocks()
+        if not blocks:
+            return 0
+        entry_depths = {blocks[0]: 0}
+        to_visit = [blocks[0]]
+        max_depth = 0
+        while to_visit:
+            block = to_visit.pop()
+            depth = entry_depths[block]
+            for instruction in block.instructions:
+                depth += instruction.stack_effect()
+                max_depth = max(max_depth, depth)
+            for successor in block.successors:
+                if successor not in entry_depths:
+                    entry_depths[successor] = depth
+                    to_visit.append(successor)
+        return max_depth
+
+    def _get_header(self):
+        return self._header
+
+    def _get_items(self):
+        return self._items
+
+    def _set_items(self, items):
+        self._items = items
+
+    def _get_has_code(self):
+        return self._has_code
+
+    def _get_limit_stack(self):
+        return self._limit_stack
+
+    def _set_limit_stack(self, limit):
+        self._limit_stack = limit
+
+    def _get_limit_locals(self):
+        return self._limit_locals
+
+    def _set_limit_locals(self, limit):
+        self._limit_locals = limit
+
+    header = property(_get_header)
+    items = property(_get_items, _set_items)
+    has_code = property(_get_has_code)
+    limit_stack = property(_get_limit_stack, _set_limit_stack)
+    limit_locals = property(_get_limit_locals, _set_limit_locals)
+
+class ClassIR(object):
+    """The IR for a whole class or interface: an ordered list of directives
+    and methods.
+    """
+    def __init__(self, name = ''):
+        self._name = name
+        self._members = []
+
+    def add_directive(self, directive):
+        self._members.append(directive)
+
+    def add_method(self, method):
+        self._members.append(method)
+
+    def _get_name(self):
+        return self._name
+
+    def _set_name(self, name):
+        self._name = name
+
+    def _get_members(self):
+        return self._members
+
+    def _get_methods(self):
+        return [member for member in self._members
+                if isinstance(member, MethodIR)]
+
+    name = property(_get_name, _set_name)
+    members = property(_get_members)
+    methods = property(_get_methods)
+
+class JasminWriter(object):
+    """Serializes the IR of a class to Jasmin assembly code."""
+    def write(self, class_ir):
+        """Returns the Jasmin assembly code for class_ir as a string."""
+        lines = []
+        for member in class_ir.members:
+            if isinstance(member, MethodIR):
+                self._write_method(member, lines)
+            else:
+                lines.append(self._line(member.text, member.comment))
+        return ''.join(lines)
+
+    def _write_method(self, method, lines):
+        lines.append(self._line('.method ' + method.header))
+        if method.has_code:
+            lines.append(self._indented_line('.limit stack ' +
+                                             str(method.limit_stack)))
+            lines.append(self._indented_line('.limit locals ' +
+                                             str(method.limit_locals)))
+        for item in method.items:
+            if isinstance(item, Label):
+                lines.append(self._line(str(item), item.comment))
+            else:
+                lines.append(self._indented_line(str(item), item.comment))
+        lines.append(self._line('.end method'))
+
+    def _indented_line(self, line, comment = None):
+        """Format an indented line of output."""
+        if comment is None:
+            return '\t' + line + '\n'
+        return '\t' + line + self._get_tab_len(line) + comment + '\n'
+
+    def _line(self, line, comment = None):
+        """Format a regular line of output."""
+        if comment is None:
+            return line + '\n'
+        return line + self._get_tab_len(line) + '\t' + comment + '\n'
+
+    def _get_tab_len(self, line):
+        """Get the amount of tabs needed to indent the comment part 20
+        characters.
+        """
+        length = len(line)
+        if length < 8:
+            return '\t\t\t\t'
+        elif length < 15:
+            return '\t\t\t'
+        elif length < 22:
+            return '\t\t'
+        elif length < 32:
+            return '\t'
+        else: # It's 32 or greater - just make it a space
+            return ' '
@@ -20,21 +20,21 @@
                            | class_body_dcl method_dcl
                            | class_body_dcl field_dcl
 
-        field_dcl ::= field_mods field_dcl_rest | field_dcl_rest
+        field_dcl ::= member_mods field_dcl_rest | field_dcl_rest
 
         field_dcl_rest ::= type ID ;
                            | type array_brackets ID ;
                            | type ID array_brackets ;
                            | type ID ASSIGN_OP literal ;
 
-        field_mods ::= PRIVATE | static_final_mods | PRIVATE static_final_mods
+        member_mods ::= PRIVATE | static_final_mods | PRIVATE static_final_mods
 
         static_final_mods ::= FINAL | STATIC
 
         constructor_dcl ::= ID formal_param block
 
         method_dcl ::= ABSTRACT abs_method_dcl
-                       | method_mods method_dcl_rest
+                       | member_mods method_dcl_rest
                        | method_dcl_rest
 
         method_dcl_rest ::= type ID formal_param block
@@ -42,8 +42,6 @@
 
         method_dcl_rest ::= type array_brackets ID formal_param block
 
-        method_mods ::= PRIVATE | static_final_mods | PRIVATE static_final_mods
-
         formal_param ::= ( param_list ) | ( )
 
         param_list ::= type ID | type array_brackets ID | type ID array_brackets
@@ -55,9 +53,11 @@
 
         block_stmt ::= stmt | var_dcl | block_stmt stmt | block_stmt var_dcl
 
-        var_dcl ::= type ID ; | array_brackets ID ; | type ID array_brackets ;
+        var_dcl ::= type ID ; | ID array_brackets ID ; | TYPE array_brackets ID ;
+                    | type ID array_brackets ;
                     | type ID ASSIGN_OP expr ;
-                    | type array_brackets ID ASSIGN_OP expr ;
+                    | ID array_brackets ID ASSIGN_OP expr ;
+                    | TYPE array_brackets ID ASSIGN_OP expr ;
                     | type ID array_brackets ASSIGN_OP expr ;
 
         array_brackets ::= array_brackets [ ] | [ ]
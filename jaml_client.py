@@ -0,0 +1,20 @@
+"""This module sends compile requests to a running jaml_server.  It is kept
+apart from the server, so a client need not load the compiler.
+"""
+import json
+import os
+import socket
+import tempfile
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'jaml_server.sock')
+
+def send_request(request, socket_path = DEFAULT_SOCKET):
+    """Send a request to a running server, and return its reply."""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        client.sendall(json.dumps(request) + '\n')
+        reply = client.makefile('r').readline()
+    finally:
+        client.close()
+    return json.loads(reply)
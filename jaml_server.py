@@ -0,0 +1,199 @@
+"""This runs the compiler as a long running server, which accepts compile
+requests over a local Unix socket.  Everything which does not depend on the
+program being compiled, such as the library class list, the parser's grammar
+tables and the results of library lookups, is kept between compiles, so each
+compile only pays for its own work.  jamlcomp.py's --server option is the
+client.  Files can also be watched, and compiled again whenever they, or a file
+in the same directory, change.
+
+Usage: jaml_server [options]
+
+Each request is a line holding a JSON object with the fields:
+    "source" - the path of the main .jml file to compile
+    "dst" - the output directory (optional)
+    "rebuild" - compile every class, ignoring the build cache (optional)
+    "separate" - compile against signature files (optional)
+    "jobs" - the number of processes to compile in (optional)
+    "parser" - the parser backend (optional)
+    "ast_cache" - the directory to cache ASTs in (optional)
+    "lazy" - only parse the signatures of referenced classes (optional)
+    "list_tail_calls" - list the tail calls converted to jumps (optional)
+The reply is a line holding a JSON object with the field "status", which is
+either "ok" or "error", in which case "message" holds the error message.  If
+the tail calls were asked for, "tail_calls" holds the class and method name of
+each.
+"""
+import json
+import os
+import signal
+import SocketServer
+import sys
+import threading
+import time
+from optparse import OptionParser
+from code_generation.code_generator import CodeGenerator
+from parser_.parser_ import ParseError
+from jaml_client import DEFAULT_SOCKET
+
+# Compiles run concurrently, except those writing to the same output
+# directory, which share its build cache manifest.  Maps each output directory
+# to its lock
+_dst_locks = dict()
+_dst_locks_lock = threading.Lock()
+
+# A single compiler serves every request with the same settings, since all
+# compile state is kept in the context of each compile.  Maps the settings to
+# the compiler, which is made by the first request with them
+_code_gens = dict()
+_code_gens_lock = threading.Lock()
+
+def compile_request(request):
+    """Compile the program described by a request, and return the reply."""
+    try:
+        code_gen = _get_code_gen(request)
+        dst = request.get('dst')
+        lock = _get_dst_lock(dst)
+        lock.acquire()
+        try:
+            context = code_gen.compile_(request['source'], dst,
+                                        request.get('rebuild', False))
+        finally:
+            lock.release()
+    except ParseError as error:
+        # Syntax errors are SystemExits, which must not take the server down
+        # with them
+        return {'status': 'error', 'message': str(error)}
+    except Exception as error:
+        return {'status': 'error', 'message': str(error)}
+    reply = {'status': 'ok'}
+    if request.get('list_tail_calls', False):
+        # Nothing was compiled if everything was up to date
+        reply['tail_calls'] = []
+        if context is not None:
+            reply['tail_calls'] = context.converted_tail_calls
+    return reply
+
+def _get_code_gen(request):
+    """Get the compiler with the settings given by a request."""
+    settings = (bool(request.get('separate', False)),
+                request.get('jobs', 1), request.get('parser', 'earley'),
+                request.get('ast_cache'), bool(request.get('lazy', False)))
+    _code_gens_lock.acquire()
+    try:
+        if settings not in _code_gens:
+            separate, jobs, parser, ast_cache, lazy = settings
+            _code_gens[settings] = CodeGenerator(use_cache = True,
+                                                 separate = separate,
+                                                 jobs = jobs,
+                                                 parser_backend = parser,
+                                                 ast_cache_dir = ast_cache,
+                                                 lazy = lazy)
+        return _code_gens[settings]
+    finally:
+        _code_gens_lock.release()
+
+def _get_dst_lock(dst):
+    """Get the lock of an output directory, None is the default one."""
+    if dst is not None:
+        dst = os.path.realpath(dst)
+    _dst_locks_lock.acquire()
+    try:
+        return _dst_locks.setdefault(dst, threading.Lock())
+    finally:
+        _dst_locks_lock.release()
+
+class CompileRequestHandler(SocketServer.StreamRequestHandler):
+    """Handles a connection, which may send any number of requests."""
+    def handle(self):
+        line = self.rfile.readline()
+        while line:
+            try:
+                reply = compile_request(json.loads(line))
+            except ValueError:
+                reply = {'status': 'error', 'message': 'Invalid request.'}
+            self.wfile.write(json.dumps(reply) + '\n')
+            self.wfile.flush()
+            line = self.rfile.readline()
+
+class CompileServer(SocketServer.ThreadingMixIn,
+                    SocketServer.UnixStreamServer):
+    """Accepts connections on a Unix socket, each in its own thread."""
+    daemon_threads = True
+
+class Watcher(threading.Thread):
+    """Polls the directories of the watched files, and compiles a file again
+    when any .jml file in its directory changes.  The build cache makes sure
+    only the affected classes are compiled.
+    """
+    def __init__(self, sources, dst = None, interval = 1.0):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self._sources = sources
+        self._dst = dst
+        self._interval = interval
+        # For each watched file, maps the path of each .jml file in its
+        # directory to its last modification time
+        self._mtimes = dict()
+
+    def run(self):
+        while True:
+            for source in self._sources:
+                if self._has_changed(source):
+                    reply = compile_request({'source': source,
+                                             'dst': self._dst})
+                    if reply['status'] == 'ok':
+                        print 'Compiled ' + source
+                    else:
+                        print ('Compilation error! Message: "' +
+                               reply['message'] + '"')
+            time.sleep(self._interval)
+
+    def _has_changed(self, source):
+        """Check if any .jml file in the directory of the watched file has been
+        changed since it was last checked.
+        """
+        changed = False
+        mtimes = self._mtimes.setdefault(source, dict())
+        dir_ = os.path.dirname(source)
+        for file_name in os.listdir(dir_ or '.'):
+            if not file_name.endswith('.jml'):
+                continue
+            path = os.path.join(dir_, file_name)
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                # It was deleted since listing the directory
+                continue
+            if mtimes.get(path) != mtime:
+                mtimes[path] = mtime
+                changed = True
+        return changed
+
+if __name__ == '__main__':
+    usage = 'Usage: jaml_server [options]'
+    opt_parser = OptionParser(usage)
+    opt_parser.add_option('--socket', dest = 'socket',
+                          default = DEFAULT_SOCKET,
+                          help = 'the path of the socket to listen on')
+    opt_parser.add_option('--watch', action = 'append', dest = 'watch',
+                          default = [], metavar = 'FILE',
+                          help = 'compile FILE whenever a .jml file in its ' +
+                          'directory changes, can be given more than once')
+    opt_parser.add_option('--dst', dest = 'dst', default = None,
+                          help = 'the output directory for watched files')
+    options, args = opt_parser.parse_args()
+    if options.watch:
+        Watcher(options.watch, options.dst).start()
+    if os.path.exists(options.socket):
+        # Left behind by a server which was not shut down cleanly
+        os.remove(options.socket)
+    server = CompileServer(options.socket, CompileRequestHandler)
+    # Make sure the socket is removed when the server is killed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(options.socket)
@@ -0,0 +1,137 @@
+"""The test class for the modules jaml_server.py and jaml_client.py."""
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import unittest
+import jaml_server
+from jaml_server import (CompileServer, CompileRequestHandler, Watcher,
+                         compile_request)
+from jaml_client import send_request
+
+class FakeJasminProcess(object):
+    """Stands in for a Jasmin process which assembles its files without
+    writing them.
+    """
+    returncode = 0
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self):
+        return self.returncode
+
+class TestJamlServer(unittest.TestCase):
+    """Test class where tests to be run are the methods."""
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self._tmp_dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._tmp_dir, 'X.jml')
+        self._write(self._path,
+                    'class X { private int f() { return f(); } ' +
+                    'static void main(String[] args) { X inst = new X(); } }')
+
+    def tearDown(self):
+        unittest.TestCase.tearDown(self)
+        shutil.rmtree(self._tmp_dir)
+
+    def test_compile_request(self):
+        """Test a compile request is compiled into its output directory, and
+        the tail calls are listed only when they are asked for.
+        """
+        request = {'source': self._path, 'dst': self._tmp_dir,
+                   'list_tail_calls': True}
+        reply = self._compile_faking_jasmin(request)
+        self.assertEqual(reply, {'status': 'ok', 'tail_calls': [('X', 'f')]})
+        self.assertTrue(os.path.isfile(os.path.join(self._tmp_dir, 'X.j')))
+        # Nothing is compiled once the class file is up to date
+        open(os.path.join(self._tmp_dir, 'X.class'), 'w').close()
+        self.assertEqual(self._compile_faking_jasmin(request),
+                         {'status': 'ok', 'tail_calls': []})
+        del request['list_tail_calls']
+        self.assertEqual(self._compile_faking_jasmin(request),
+                         {'status': 'ok'})
+
+    def test_compile_request_syntax_error(self):
+        """Test the parser's message is sent back for a syntax error, rather
+        than stopping the server.
+        """
+        self._write(self._path, 'class X { int x = ; }')
+        reply = compile_request({'source': self._path, 'dst': self._tmp_dir})
+        self.assertEqual(reply, {'status': 'error', 'message':
+                                 "Syntax error at or near `ASSIGN_OP' token"})
+
+    def test_code_gen_settings(self):
+        """Test requests share a compiler only if they have the same
+        settings, with the settings missing from a request taking their
+        defaults.
+        """
+        get = jaml_server._get_code_gen
+        code_gen = get({'source': 'a.jml', 'jobs': 1, 'parser': 'earley'})
+        self.assertTrue(get({'source': 'b.jml', 'rebuild': True}) is
+                        code_gen)
+        for settings in [{'separate': True}, {'jobs': 2},
+                         {'parser': 'hybrid'}, {'lazy': True},
+                         {'ast_cache': self._tmp_dir}]:
+            self.assertFalse(get(settings) is code_gen)
+            self.assertTrue(get(settings) is get(dict(settings)))
+
+    def test_dst_lock(self):
+        """Test requests share the lock of an output directory however its
+        path is written.
+        """
+        get = jaml_server._get_dst_lock
+        lock = get(self._tmp_dir)
+        self.assertTrue(get(os.path.join(self._tmp_dir, '.')) is lock)
+        self.assertFalse(get(None) is lock)
+        self.assertTrue(get(None) is get(None))
+
+    def test_round_trip(self):
+        """Test a request sent by the client is compiled by a running server,
+        and its reply sent back.
+        """
+        self._write(self._path, 'class X { int x = ; }')
+        socket_path = os.path.join(self._tmp_dir, 'jaml_server.sock')
+        server = CompileServer(socket_path, CompileRequestHandler)
+        thread = threading.Thread(target = server.serve_forever)
+        thread.start()
+        try:
+            reply = send_request({'source': self._path,
+                                  'dst': self._tmp_dir}, socket_path)
+        finally:
+            server.shutdown()
+            thread.join()
+            server.server_close()
+        self.assertEqual(reply, {'status': 'error', 'message':
+                                 "Syntax error at or near `ASSIGN_OP' token"})
+
+    def test_watcher_has_changed(self):
+        """Test a watched file counts as changed when any .jml file in its
+        directory is changed or added, but not when other files are.
+        """
+        watcher = Watcher([self._path])
+        self.assertTrue(watcher._has_changed(self._path))
+        self.assertFalse(watcher._has_changed(self._path))
+        self._write(os.path.join(self._tmp_dir, 'X.j'), '')
+        self.assertFalse(watcher._has_changed(self._path))
+        mtime = os.path.getmtime(self._path)
+        os.utime(self._path, (mtime + 1, mtime + 1))
+        self.assertTrue(watcher._has_changed(self._path))
+        self._write(os.path.join(self._tmp_dir, 'Y.jml'), 'class Y {}')
+        self.assertTrue(watcher._has_changed(self._path))
+        self.assertFalse(watcher._has_changed(self._path))
+
+    def _compile_faking_jasmin(self, request):
+        """Run compile_request on a request, with Jasmin faked."""
+        popen = subprocess.Popen
+        subprocess.Popen = lambda cmd: FakeJasminProcess()
+        try:
+            return compile_request(request)
+        finally:
+            subprocess.Popen = popen
+
+    def _write(self, path, text):
+        out_file = open(path, 'w')
+        out_file.write(text)
+        out_file.close()
@@ -1,18 +1,128 @@
 """This allows the program to be run.  It will either compile the file, or
 print error information.
 
-Usage: jamlcomp <file> [<output directory>]
+Usage: jamlcomp [options] <file> [<output directory>]
 """
-import sys
+import cProfile
+import os
+from optparse import OptionParser
 from code_generation.code_generator import CodeGenerator
+from jaml_client import send_request
+from parser_.parser_ import Parser
+from utilities.profiler import profiler
 
 if __name__ == '__main__':
+    usage = 'Usage: jamlcomp [options] <file> [<output directory>]'
+    opt_parser = OptionParser(usage)
+    opt_parser.add_option('--list-tail-calls', action = 'store_true',
+                          dest = 'list_tail_calls', default = False,
+                          help = 'list the recursive calls which were ' +
+                          'compiled into jumps')
+    opt_parser.add_option('--rebuild', action = 'store_true',
+                          dest = 'rebuild', default = False,
+                          help = 'compile every class, even those the ' +
+                          'build cache says are up to date')
+    opt_parser.add_option('--separate', action = 'store_true',
+                          dest = 'separate', default = False,
+                          help = 'compile against the signature files of ' +
+                          'classes already in the output directory, ' +
+                          'rather than their source')
+    opt_parser.add_option('-j', '--jobs', type = 'int', dest = 'jobs',
+                          default = 1,
+                          help = 'the number of processes to type check, ' +
+                          'generate and assemble the classes in')
+    opt_parser.add_option('--parser', type = 'choice', dest = 'parser',
+                          choices = Parser.BACKENDS, default = 'earley',
+                          help = 'the parser to use: earley, the general ' +
+                          'Earley parser; lalr, the faster deterministic ' +
+                          'parser; hybrid, the Earley parser with ' +
+                          'expressions parsed by precedence climbing; or ' +
+                          'check, which uses each and checks they agree ' +
+                          '[default: %default]')
+    opt_parser.add_option('--ast-cache', dest = 'ast_cache', default = None,
+                          metavar = 'DIR',
+                          help = 'cache the parsed and type checked ASTs ' +
+                          'of the source files in DIR, so unchanged files ' +
+                          'are not parsed or checked again')
+    opt_parser.add_option('--lazy', action = 'store_true', dest = 'lazy',
+                          default = False,
+                          help = 'only parse the signatures of referenced ' +
+                          'classes, unless the build cache says they must ' +
+                          'be compiled again')
+    opt_parser.add_option('--profile', action = 'store_true',
+                          dest = 'profile', default = False,
+                          help = 'print the time and memory growth of ' +
+                          'each phase of the compile, and counts of the ' +
+                          'work done')
+    opt_parser.add_option('--profile-json', dest = 'profile_json',
+                          default = 'jaml_profile.json', metavar = 'FILE',
+                          help = 'the file --profile writes its results ' +
+                          'to as JSON [default: %default]')
+    opt_parser.add_option('--cprofile', dest = 'cprofile', default = None,
+                          metavar = 'FILE',
+                          help = 'run the compile under cProfile, and dump ' +
+                          'its stats to FILE')
+    opt_parser.add_option('--server', dest = 'server', default = None,
+                          metavar = 'SOCKET',
+                          help = 'send the compile to the jaml_server ' +
+                          'listening on SOCKET, rather than compiling here')
+    options, args = opt_parser.parse_args()
+    if options.server is not None and (options.profile or
+                                       options.cprofile is not None):
+        # The server's profile would include the other compiles it is running
+        opt_parser.error('--profile and --cprofile can not be used with ' +
+                         '--server')
     try:
-        if len(sys.argv) == 2:
-            CodeGenerator().compile_(sys.argv[1])
-        elif len(sys.argv) == 3:
-            CodeGenerator().compile_(sys.argv[1], sys.argv[2])
+        if options.server is not None and len(args) in [1, 2]:
+            # The server may be running in another directory
+            request = {'source': os.path.abspath(args[0]),
+                       'rebuild': options.rebuild,
+                       'separate': options.separate,
+                       'jobs': options.jobs,
+                       'parser': options.parser,
+                       'lazy': options.lazy,
+                       'list_tail_calls': options.list_tail_calls}
+            if len(args) == 2:
+                request['dst'] = os.path.abspath(args[1])
+            if options.ast_cache is not None:
+                request['ast_cache'] = os.path.abspath(options.ast_cache)
+            reply = send_request(request, options.server)
+            if reply['status'] != 'ok':
+                print ('Compilation error! Message: "' + reply['message'] +
+                       '"')
+            else:
+                for class_name, method_name in reply.get('tail_calls', []):
+                    print ('Tail call converted to a jump: ' + class_name +
+                           '.' + method_name)
         else:
-            print 'Usage: jamlcomp <file> [<output directory>]'
+            code_gen = CodeGenerator(use_cache = True,
+                                     separate = options.separate,
+                                     jobs = options.jobs,
+                                     parser_backend = options.parser,
+                                     ast_cache_dir = options.ast_cache,
+                                     lazy = options.lazy)
+            profiler.enabled = options.profile
+            c_profile = None
+            if options.cprofile is not None:
+                c_profile = cProfile.Profile()
+                c_profile.enable()
+            try:
+                if len(args) == 1:
+                    code_gen.compile_(args[0], rebuild = options.rebuild)
+                elif len(args) == 2:
+                    code_gen.compile_(args[0], args[1], options.rebuild)
+                else:
+                    print usage
+            finally:
+                if c_profile is not None:
+                    c_profile.disable()
+                    c_profile.dump_stats(options.cprofile)
+                if options.profile:
+                    print profiler.summary()
+                    profiler.write_json(options.profile_json)
+            if options.list_tail_calls:
+                for class_name, method_name in code_gen.converted_tail_calls:
+                    print ('Tail call converted to a jump: ' + class_name +
+                           '.' + method_name)
     except Exception as error:
-        print 'Compilation error! Message: "' + str(error) + '"'
\ No newline at end of file
+        print 'Compilation error! Message: "' + str(error) + '"'
@@ -0,0 +1,245 @@
+"""This module contains the ASTCache, which stores the ASTs of JaML source
+files on disk, so that files which have not changed need not be scanned,
+parsed and type checked again.  Its entries are content addressed: a parsed
+AST is stored under a hash of the source it was parsed from, and a type
+checked AST under a hash of its source and the signatures of the classes it
+depends upon, so an entry never has to be invalidated; it is simply no longer
+looked up once its inputs change.
+
+The ASTs are stored in a compact binary form: the nodes are listed in
+pre-order as flat records, which are marshalled and compressed.  ASTs can be
+too deep to pickle recursively, so they are written and read iteratively.
+"""
+import cPickle as pickle
+import hashlib
+import marshal
+import os
+import tempfile
+import zlib
+import tree_nodes as nodes
+from utilities.utilities import ArrayType
+from utilities.profiler import profiler
+
+# Increase this whenever a change to the compiler changes the ASTs it builds,
+# or the types it tags them with, so entries made by an older version are not
+# used
+AST_CACHE_VERSION = 1
+
+# The slots of each node class holding its attributes, indexed by class
+_slots = dict()
+
+class ASTCache(object):
+    """A directory of cached ASTs.  Counts how many of the ASTs looked up
+    were found, separately for parsed and for type checked ASTs.
+    """
+    def __init__(self, cache_dir):
+        self._cache_dir = cache_dir
+        self._parse_hits = 0
+        self._parse_misses = 0
+        self._check_hits = 0
+        self._check_misses = 0
+
+    def load_parsed(self, source_hash):
+        """Get the AST parsed from the source with the given hash, or None if
+        it is not in the cache.
+        """
+        data = self._read(self._get_path('ast', [source_hash]))
+        ast = None
+        if data is not None:
+            try:
+                ast = load_ast(data)
+            except (ValueError, EOFError, TypeError, IndexError,
+                    AttributeError, zlib.error):
+                # The entry is corrupted
+                pass
+        if ast is None:
+            self._parse_misses += 1
+            profiler.count('ast cache misses')
+        else:
+            self._parse_hits += 1
+            profiler.count('ast cache hits')
+        return ast
+
+    def store_parsed(self, source_hash, ast):
+        """Store the AST parsed from the source with the given hash."""
+        try:
+            data = dump_ast(ast)
+        except ValueError:
+            return
+        self._write(self._get_path('ast', [source_hash]), data)
+
+    def load_checked(self, source_hash, dep_hashes):
+        """Get the type checked AST of the source with the given hash, and
+        the library symbols found while checking it, or None if it is not in
+        the cache.  dep_hashes maps the name of each class the AST depends
+        upon to the hash of its signature.
+        """
+        path = self._get_path('tast', self._get_check_key(source_hash,
+                                                          dep_hashes))
+        data = self._read(path)
+        entry = None
+        if data is not None:
+            try:
+                ast_data, symbols_data = marshal.loads(data)
+                entry = load_ast(ast_data), pickle.loads(symbols_data)
+            except (ValueError, EOFError, TypeError, IndexError,
+                    AttributeError, zlib.error, pickle.UnpicklingError):
+                pass
+        if entry is None:
+            self._check_misses += 1
+            profiler.count('checked ast cache misses')
+        else:
+            self._check_hits += 1
+            profiler.count('checked ast cache hits')
+        return entry
+
+    def store_checked(self, source_hash, dep_hashes, ast, lib_symbols):
+        """Store the type checked AST of the source with the given hash, and
+        the library symbols found while checking it.
+        """
+        try:
+            data = marshal.dumps((dump_ast(ast),
+                                  pickle.dumps(lib_symbols, 2)))
+        except (ValueError, pickle.PicklingError):
+            return
+        path = self._get_path('tast', self._get_check_key(source_hash,
+                                                          dep_hashes))
+        self._write(path, data)
+
+    def _get_check_key(self, source_hash, dep_hashes):
+        return [source_hash] + ['%s %s' % (name, dep_hashes[name])
+                                for name in sorted(dep_hashes)]
+
+    def _get_path(self, extension, key):
+        """Get the path of the entry with a key, a list of strings, which is
+        hashed along with the version of the cache.
+        """
+        key = '\n'.join([str(AST_CACHE_VERSION)] + key)
+        return os.path.join(self._cache_dir,
+                            hashlib.sha1(key).hexdigest() + '.' + extension)
+
+    def _read(self, path):
+        try:
+            in_file = open(path, 'rb')
+        except IOError:
+            return None
+        try:
+            return in_file.read()
+        finally:
+            in_file.close()
+
+    def _write(self, path, data):
+        """Write an entry to a temporary file, and move it into place, so an
+        entry is never read half written by another compile.
+        """
+        if not os.path.isdir(self._cache_dir):
+            os.makedirs(self._cache_dir)
+        out_fd, tmp_path = tempfile.mkstemp(dir = self._cache_dir)
+        out_file = os.fdopen(out_fd, 'wb')
+        try:
+            out_file.write(data)
+        finally:
+            out_file.close()
+        os.rename(tmp_path, path)
+
+    def _get_parse_hits(self):
+        return self._parse_hits
+
+    def _get_parse_misses(self):
+        return self._parse_misses
+
+    def _get_check_hits(self):
+        return self._check_hits
+
+    def _get_check_misses(self):
+        return self._check_misses
+
+    parse_hits = property(_get_parse_hits)
+    parse_misses = property(_get_parse_misses)
+    check_hits = property(_get_check_hits)
+    check_misses = property(_get_check_misses)
+
+def dump_ast(ast):
+    """Serialise an AST.  Each node is recorded as the index of its class in
+    a table of class names, the values of its slots, and, for interior nodes,
+    its number of children.  Raises ValueError if a node holds a value which
+    can't be stored.
+    """
+    class_codes = dict()
+    records = []
+    to_visit = [ast]
+    while to_visit:
+        node = to_visit.pop()
+        class_ = type(node)
+        records.append(class_codes.setdefault(class_.__name__,
+                                              len(class_codes)))
+        for slot in _get_slots(class_):
+            records.append(_encode_value(getattr(node, slot)))
+        if not node.is_leaf:
+            records.append(len(node.children))
+            to_visit.extend(reversed(node.children))
+    names = sorted(class_codes, key = class_codes.get)
+    return zlib.compress(marshal.dumps((names, records)))
+
+def load_ast(data):
+    """Rebuild an AST serialised by dump_ast, with its interior nodes
+    frozen.
+    """
+    names, records = marshal.loads(zlib.decompress(data))
+    classes = [getattr(nodes, name) for name in names]
+    # The interior nodes whose children are still being read, each with the
+    # children read so far and the number it has
+    parents = []
+    pos = 0
+    while True:
+        class_ = classes[records[pos]]
+        pos += 1
+        node = class_.__new__(class_)
+        for slot in _get_slots(class_):
+            setattr(node, slot, _decode_value(records[pos]))
+            pos += 1
+        if parents:
+            parents[-1][1].append(node)
+        else:
+            root = node
+        if not class_.is_leaf:
+            parents.append((node, [], records[pos]))
+            pos += 1
+        while parents and len(parents[-1][1]) == parents[-1][2]:
+            parent, children, num_children = parents.pop()
+            parent._children = tuple(children)
+        if not parents:
+            return root
+
+def _get_slots(class_):
+    """Get the slots of a node class holding its attributes, which are all
+    its slots other than its children.
+    """
+    try:
+        return _slots[class_]
+    except KeyError:
+        slots = [slot for base in reversed(class_.__mro__)
+                 for slot in base.__dict__.get('__slots__', ())
+                 if slot != '_children']
+        _slots[class_] = slots
+        return slots
+
+def _encode_value(value):
+    """Array types are stored as a tuple of their type and dimensions; no
+    other tuples are stored.
+    """
+    if isinstance(value, ArrayType):
+        return (value.type_, value.dimensions)
+    elif isinstance(value, list):
+        return [_encode_value(item) for item in value]
+    elif (value is None or
+          isinstance(value, (str, unicode, int, long, float, bool))):
+        return value
+    raise ValueError('Can not store a value of type ' + type(value).__name__)
+
+def _decode_value(value):
+    if isinstance(value, tuple):
+        return ArrayType(value[0], value[1])
+    elif isinstance(value, list):
+        return [_decode_value(item) for item in value]
+    return value
@@ -0,0 +1,349 @@
+"""This module contains a hand written precedence climbing parser for JaML
+expressions.  It builds exactly the same nodes as the expression rules of the
+grammar, so the expressions in a token stream can be parsed by it and each
+replaced by a single EXPR token holding its AST, leaving only the statements
+and declarations around them for the grammar to parse.
+
+Expressions are only replaced where the tokens before them show an expression
+must start, and the token after them is one the grammar allows to follow it.
+Anything the parser can't handle, including the few inputs where the grammar
+is ambiguous, is left for the grammar to parse.
+"""
+import tree_nodes as nodes
+from scanner import KINDS, KIND_CODES, TokenStream
+
+_ID = KIND_CODES['ID']
+_TYPE = KIND_CODES['TYPE']
+_SUPER = KIND_CODES['SUPER']
+_NEW = KIND_CODES['NEW']
+_RETURN = KIND_CODES['RETURN']
+_IF = KIND_CODES['IF']
+_WHILE = KIND_CODES['WHILE']
+_ASSIGN_OP = KIND_CODES['ASSIGN_OP']
+_NOT_OP = KIND_CODES['NOT_OP']
+_ADD_OP = KIND_CODES['ADD_OP']
+_INC_OP = KIND_CODES['INC_OP']
+_LPAREN = KIND_CODES['(']
+_RPAREN = KIND_CODES[')']
+_LBRACKET = KIND_CODES['[']
+_RBRACKET = KIND_CODES[']']
+_LBRACE = KIND_CODES['{']
+_RBRACE = KIND_CODES['}']
+_COMMA = KIND_CODES[',']
+_DOT = KIND_CODES['.']
+_SEMI = KIND_CODES[';']
+_BAR = KIND_CODES['|']
+
+# The binary operators with their precedence and the node built for them,
+# all of which are left associative.  '||' is scanned as two '|' tokens, so
+# is looked for separately
+_OR_PRECEDENCE = 1
+_BINARY_OPS = {KIND_CODES['AND_OP']: (2, nodes.CondNode),
+               KIND_CODES['EQ_OP']: (3, nodes.EqNode),
+               KIND_CODES['REL_OP']: (4, nodes.RelNode),
+               _ADD_OP: (5, nodes.AddNode),
+               KIND_CODES['MUL_OP']: (6, nodes.MulNode)}
+
+# The node built for each literal.  The grammar has no rule for FALSE_L
+_LITERALS = {KIND_CODES['STR_L']: nodes.StringLNode,
+             KIND_CODES['CHAR_L']: nodes.CharLNode,
+             KIND_CODES['INT_L']: nodes.IntLNode,
+             KIND_CODES['LONG_L']: nodes.LongLNode,
+             KIND_CODES['FLOAT_L']: nodes.FloatLNode,
+             KIND_CODES['DOUBLE_L']: nodes.DoubleLNode,
+             KIND_CODES['TRUE_L']: nodes.BooleanLNode,
+             KIND_CODES['NULL_L']: nodes.NullLNode}
+
+class _NotParsed(Exception):
+    """Raised when the tokens at a position are not an expression the
+    parser can handle.
+    """
+    pass
+
+class ExprParser(object):
+    """Parses the expressions of a token stream by precedence climbing."""
+    def __init__(self, tokens):
+        self._tokens = tokens
+        self._kinds = tokens.kinds
+        self._num_tokens = len(tokens)
+        self._pos = 0
+
+    def parse(self, start):
+        """Parse the expression starting at an index, and return its AST and
+        the index of the token after it, or None if there is no expression
+        there the parser can handle.
+        """
+        self._pos = start
+        try:
+            return self._parse_expr(), self._pos
+        except (_NotParsed, RuntimeError):
+            # RuntimeError is raised for expressions nested too deeply to
+            # parse recursively, which the grammar can still parse
+            return None
+
+    def _peek(self, ahead = 0):
+        """Get the kind code of a token after the current one, or None past
+        the end of the input.
+        """
+        pos = self._pos + ahead
+        if pos < self._num_tokens:
+            return self._kinds[pos]
+        return None
+
+    def _expect(self, kind):
+        """Move past the current token, which must be of the given kind, and
+        return its attribute.
+        """
+        if self._peek() != kind:
+            raise _NotParsed()
+        self._pos += 1
+        return self._tokens.get_attr(self._pos - 1)
+
+    def _parse_expr(self):
+        """ expr ::= cond_or_expr [ASSIGN_OP cond_or_expr] """
+        left = self._parse_binary(_OR_PRECEDENCE)
+        if self._peek() != _ASSIGN_OP:
+            return left
+        root = nodes.AssignNode(self._expect(_ASSIGN_OP))
+        root.add_children([left, self._parse_binary(_OR_PRECEDENCE)])
+        return root
+
+    def _parse_binary(self, min_precedence):
+        """Parse the operands and binary operators of an expression, so long
+        as the operators bind at least as tightly as min_precedence.
+        """
+        left = self._parse_unary()
+        while True:
+            kind = self._peek()
+            if kind == _BAR and self._peek(1) == _BAR:
+                precedence, node, attr = _OR_PRECEDENCE, nodes.CondNode, '||'
+                size = 2
+            elif kind in _BINARY_OPS:
+                precedence, node = _BINARY_OPS[kind]
+                attr = self._tokens.get_attr(self._pos)
+                size = 1
+            else:
+                return left
+            if precedence < min_precedence:
+                return left
+            self._pos += size
+            root = node(attr)
+            root.add_children([left, self._parse_binary(precedence + 1)])
+            left = root
+
+    def _parse_unary(self):
+        """ unary_expr ::= unary_prefix primary | primary [INC_OP] """
+        kind = self._peek()
+        if kind == _NOT_OP:
+            self._pos += 1
+            root = nodes.NotNode()
+        elif kind == _ADD_OP:
+            root = nodes.PosNode(self._expect(_ADD_OP))
+        elif kind == _INC_OP:
+            root = nodes.IncNode(self._expect(_INC_OP))
+        else:
+            primary = self._parse_primary()
+            if self._peek() != _INC_OP:
+                return primary
+            root = nodes.IncNode(self._expect(_INC_OP))
+            root.add_child(primary)
+            return root
+        root.add_child(self._parse_primary())
+        return root
+
+    def _parse_primary(self):
+        kind = self._peek()
+        if kind == _ID:
+            return self._parse_id()
+        elif kind in _LITERALS:
+            return _LITERALS[kind](self._expect(kind))
+        elif kind == _LPAREN:
+            self._pos += 1
+            expr = self._parse_expr()
+            self._expect(_RPAREN)
+            return expr
+        elif kind == _SUPER:
+            return self._parse_super()
+        elif kind == _NEW:
+            return self._parse_creator()
+        elif kind == _BAR:
+            self._pos += 1
+            root = nodes.MatrixInitNode()
+            root.add_children(self._parse_matrix_indices())
+            return root
+        raise _NotParsed()
+
+    def _parse_id(self):
+        """Parse an identifier, and the method call, field reference, array
+        element or matrix element it starts, if any.
+        """
+        id_ = nodes.IdNode(self._expect(_ID))
+        kind = self._peek()
+        if kind == _LPAREN:
+            root = nodes.MethodCallNode()
+            root.add_children([id_, self._parse_args()])
+        elif kind == _DOT:
+            ids = self._parse_method_call_rest()
+            if self._peek() == _LPAREN:
+                root = nodes.MethodCallLongNode()
+                root.add_child(id_)
+                root.add_children(ids)
+                root.add_child(self._parse_args())
+            elif len(ids) == 1:
+                root = nodes.FieldRefNode()
+                root.add_children([id_, ids[0]])
+            else:
+                raise _NotParsed()
+        elif kind == _LBRACKET:
+            root = nodes.ArrayElementNode()
+            root.add_child(id_)
+            root.add_children(self._parse_array_suffix())
+        elif kind == _BAR:
+            # A '|' may start a matrix element, or close a matrix the
+            # identifier is an index of, and '| |' may be an or, so which
+            # the grammar takes can depend on the tokens after the whole
+            # expression.  It is left for the grammar to parse
+            raise _NotParsed()
+        else:
+            return id_
+        return root
+
+    def _parse_super(self):
+        """Parse a method call or field reference of the superclass."""
+        self._expect(_SUPER)
+        ids = self._parse_method_call_rest()
+        if self._peek() == _LPAREN:
+            root = nodes.MethodCallSuperNode()
+            root.add_children(ids)
+            root.add_child(self._parse_args())
+        elif len(ids) == 1:
+            root = nodes.FieldRefSuperNode()
+            root.add_child(ids[0])
+        else:
+            raise _NotParsed()
+        return root
+
+    def _parse_creator(self):
+        """ creator ::= NEW type ( [args_list] ) | NEW type array_suffix """
+        self._expect(_NEW)
+        kind = self._peek()
+        if kind == _ID:
+            type_ = nodes.ClassTypeNode(self._expect(_ID))
+        else:
+            type_ = nodes.TypeNode(self._expect(_TYPE))
+        kind = self._peek()
+        if kind == _LPAREN:
+            root = nodes.ObjectCreatorNode()
+            root.add_child(type_)
+            args = self._parse_args()
+            if not isinstance(args, nodes.EmptyNode):
+                root.add_child(args)
+        elif kind == _LBRACKET:
+            root = nodes.ArrayInitNode()
+            root.add_child(type_)
+            root.add_children(self._parse_array_suffix())
+        else:
+            raise _NotParsed()
+        return root
+
+    def _parse_method_call_rest(self):
+        """ method_call_rest ::= . ID { . ID } """
+        ids = []
+        while self._peek() == _DOT:
+            self._pos += 1
+            ids.append(nodes.IdNode(self._expect(_ID)))
+        if not ids:
+            raise _NotParsed()
+        return ids
+
+    def _parse_args(self):
+        """Parse the bracketed arguments of a call, and return the args list
+        node, or an empty node if there are none.
+        """
+        self._expect(_LPAREN)
+        if self._peek() == _RPAREN:
+            self._pos += 1
+            return nodes.EmptyNode()
+        root = nodes.ArgsListNode()
+        root.add_child(self._parse_expr())
+        while self._peek() == _COMMA:
+            self._pos += 1
+            root.add_child(self._parse_expr())
+        self._expect(_RPAREN)
+        return root
+
+    def _parse_array_suffix(self):
+        """ array_suffix ::= [ expr ] { [ expr ] } """
+        indices = []
+        while self._peek() == _LBRACKET:
+            self._pos += 1
+            indices.append(self._parse_expr())
+            self._expect(_RBRACKET)
+        return indices
+
+    def _parse_matrix_indices(self):
+        """Parse the 'expr , expr |' after the opening '|' of a matrix
+        creator.
+        """
+        row = self._parse_expr()
+        self._expect(_COMMA)
+        column = self._parse_expr()
+        self._expect(_BAR)
+        return [row, column]
+
+def _get_follows(kinds, pos):
+    """Get the kinds of token which can follow an expression starting at an
+    index in a method body, or None if the tokens before it don't show an
+    expression starts there.  There are at least two tokens before it, the
+    braces opening the class and method bodies.
+    """
+    prev = kinds[pos - 1]
+    if prev in (_SEMI, _LBRACE, _RBRACE):
+        # The start of a statement, or of the condition or update of a for
+        # loop.  Declarations are left alone, as a type followed by a name
+        # is not an expression
+        return (_SEMI, _RPAREN)
+    elif prev == _RETURN:
+        return (_SEMI,)
+    elif prev == _LPAREN and kinds[pos - 2] in (_IF, _WHILE):
+        return (_RPAREN,)
+    elif prev == _ASSIGN_OP and pos >= 3 and (
+        (kinds[pos - 2] == _ID and kinds[pos - 3] in (_ID, _TYPE,
+                                                      _RBRACKET)) or
+        (kinds[pos - 2] == _RBRACKET and kinds[pos - 3] == _LBRACKET)):
+        # The initial value of a variable declaration
+        return (_SEMI,)
+    return None
+
+def replace_exprs(tokens):
+    """Get a copy of a token stream of a file, with the expressions in its
+    method bodies each replaced by an EXPR token holding its AST, and the
+    number of expressions replaced.
+    """
+    kinds = tokens.kinds
+    num_tokens = len(tokens)
+    parser = ExprParser(tokens)
+    new_tokens = TokenStream()
+    num_exprs = 0
+    # Class bodies are at depth 1, so method bodies are at depth 2 or more
+    depth = 0
+    pos = 0
+    while pos < num_tokens:
+        kind = kinds[pos]
+        follows = depth >= 2 and _get_follows(kinds, pos)
+        if follows:
+            result = parser.parse(pos)
+            if (result is not None and result[1] < num_tokens and
+                kinds[result[1]] in follows):
+                new_tokens.append('EXPR', tokens.get_offset(pos), result[0])
+                num_exprs += 1
+                pos = result[1]
+                continue
+        if kind == _LBRACE:
+            depth += 1
+        elif kind == _RBRACE:
+            depth -= 1
+        new_tokens.append(KINDS[kind], tokens.get_offset(pos),
+                          tokens.get_attr(pos))
+        pos += 1
+    return new_tokens, num_exprs
@@ -0,0 +1,303 @@
+"""This module contains a deterministic LALR(1) parser backend.  The parse
+tables are built from the rules the Earley parser collects from the p_*
+docstrings, and reductions call the same p_* action methods, so both backends
+build the same ASTs from the grammar.
+
+Where the grammar needs more than one token of lookahead, the tables have a
+conflict.  Conflicts are found when the tables are built, and are not
+resolved; input which reaches one raises ConflictReached, so it can be parsed
+by the Earley parser instead.
+"""
+
+class ConflictReached(Exception):
+    """Raised when parsing reaches a state and lookahead token which have a
+    conflict in the tables.
+    """
+    pass
+
+class GrammarConflict(object):
+    """A conflict found while building the parse tables: in a state, on a
+    lookahead token, either a shift or one of some reductions could be made.
+    """
+    def __init__(self, state, token, kind, rules):
+        self._state = state
+        self._token = token
+        self._kind = kind
+        self._rules = rules
+
+    def __str__(self):
+        rules = ['%s ::= %s' % (lhs, ' '.join(rhs))
+                 for lhs, rhs in self._rules]
+        return ('%s conflict in state %d on %s, reducing by: %s' %
+                (self._kind, self._state, self._token, '; '.join(rules)))
+
+    def _get_state(self):
+        return self._state
+
+    def _get_token(self):
+        return self._token
+
+    def _get_kind(self):
+        return self._kind
+
+    def _get_rules(self):
+        return self._rules
+
+    state = property(_get_state)
+    token = property(_get_token)
+    kind = property(_get_kind)
+    rules = property(_get_rules)
+
+class LALRTables(object):
+    """The LALR(1) action and goto tables for the grammar of a spark
+    GenericParser, built from its rules.  The tables are never changed once
+    built, so they can be shared by parsers in different threads.
+    """
+    # Stands for the end of the input in the lookahead sets and tables
+    END = None
+    # Stands for any lookahead while they are being propagated
+    _PROPAGATE = '#'
+    # The action stored where there is a conflict
+    _CONFLICT = 'conflict'
+
+    def __init__(self, parser):
+        """Build the tables for the rules of parser, which must have been
+        augmented with its start rule.
+        """
+        self._rules = []
+        self._nt_rules = dict()
+        for lhs in sorted(parser.rules):
+            for rule in parser.rules[lhs]:
+                self._nt_rules.setdefault(lhs, []).append(len(self._rules))
+                self._rules.append(rule)
+        self._start_rule = parser.rules[parser._START][0]
+        self._compute_first()
+        self._build_lr0_states()
+        self._compute_lookaheads()
+        self._build_tables()
+
+    def parse(self, parser, tokens):
+        """Parse a token stream, calling the actions of parser for each rule
+        reduced, and return the value of the start rule.  Calls
+        parser.error() on a syntax error, and raises ConflictReached if a
+        conflict is reached.
+        """
+        kinds = parser.tokenkinds(tokens)
+        typestring = parser.typestring
+        rule2func = parser.rule2func
+        actions = self._actions
+        gotos = self._gotos
+        rules = self._rules
+        num_tokens = len(tokens)
+        # The start rule's beginning of file marker is shifted first
+        states = [self._actions[0][parser._BOF]]
+        values = [None]
+        i = 0
+        kind = num_tokens and typestring(kinds[0]) or self.END
+        while True:
+            action = actions[states[-1]].get(kind)
+            if action is None:
+                if i < num_tokens:
+                    parser.error(tokens[i])
+                else:
+                    parser.error(None)
+            elif action is self._CONFLICT:
+                raise ConflictReached()
+            elif action >= 0:
+                # Shift to the state numbered by the action
+                states.append(action)
+                values.append(tokens[i])
+                i += 1
+                if i < num_tokens:
+                    kind = typestring(kinds[i])
+                else:
+                    kind = self.END
+            else:
+                # Reduce by the rule numbered by -action - 1
+                rule = rules[-action - 1]
+                size = len(rule[1])
+                if size:
+                    args = values[-size:]
+                    del values[-size:]
+                    del states[-size:]
+                else:
+                    args = []
+                value = rule2func[rule](args)
+                if rule is self._start_rule:
+                    return value
+                states.append(gotos[states[-1]][rule[0]])
+                values.append(value)
+
+    def _compute_first(self):
+        """Find the nullable nonterminals, and the FIRST set of each."""
+        self._nullable = set()
+        self._first = dict((lhs, set()) for lhs in self._nt_rules)
+        changes = True
+        while changes:
+            changes = False
+            for lhs, rhs in self._rules:
+                if lhs not in self._nullable and self._is_nullable(rhs):
+                    self._nullable.add(lhs)
+                    changes = True
+                first = self._get_first(rhs)
+                if not first <= self._first[lhs]:
+                    self._first[lhs] |= first
+                    changes = True
+
+    def _is_nullable(self, syms):
+        for sym in syms:
+            if sym not in self._nullable:
+                return False
+        return True
+
+    def _get_first(self, syms):
+        """Get the FIRST set of a string of symbols."""
+        first = set()
+        for sym in syms:
+            if sym not in self._first:
+                first.add(sym)
+                break
+            first |= self._first[sym]
+            if sym not in self._nullable:
+                break
+        return first
+
+    def _closure(self, kernel):
+        """Get the LR(0) closure of a set of (rule number, dot) items."""
+        items = list(kernel)
+        seen = set(kernel)
+        for rule_num, dot in items:
+            rhs = self._rules[rule_num][1]
+            if dot < len(rhs) and rhs[dot] in self._nt_rules:
+                for new_num in self._nt_rules[rhs[dot]]:
+                    if (new_num, 0) not in seen:
+                        seen.add((new_num, 0))
+                        items.append((new_num, 0))
+        return items
+
+    def _lr1_closure(self, kernel):
+        """Get the LR(1) closure of items with lookaheads, given as a dict
+        mapping each (rule number, dot) item to its lookahead set.
+        """
+        items = dict((item, set(lookaheads))
+                     for item, lookaheads in kernel.items())
+        to_visit = list(items)
+        while to_visit:
+            rule_num, dot = to_visit.pop()
+            rhs = self._rules[rule_num][1]
+            if dot == len(rhs) or rhs[dot] not in self._nt_rules:
+                continue
+            lookaheads = self._get_first(rhs[dot + 1:])
+            if self._is_nullable(rhs[dot + 1:]):
+                lookaheads |= items[(rule_num, dot)]
+            for new_num in self._nt_rules[rhs[dot]]:
+                new = items.setdefault((new_num, 0), set())
+                if not lookaheads <= new:
+                    new |= lookaheads
+                    to_visit.append((new_num, 0))
+        return items
+
+    def _build_lr0_states(self):
+        """Build the LR(0) states, as lists of their kernel items, and the
+        transitions between them.
+        """
+        start_num = self._rules.index(self._start_rule)
+        self._kernels = [((start_num, 0),)]
+        self._transitions = [dict()]
+        numbers = {self._kernels[0]: 0}
+        state = 0
+        while state < len(self._kernels):
+            moved = dict()
+            for rule_num, dot in self._closure(self._kernels[state]):
+                rhs = self._rules[rule_num][1]
+                if dot < len(rhs):
+                    moved.setdefault(rhs[dot], []).append((rule_num, dot + 1))
+            for sym, kernel in moved.items():
+                kernel = tuple(sorted(kernel))
+                if kernel not in numbers:
+                    numbers[kernel] = len(self._kernels)
+                    self._kernels.append(kernel)
+                    self._transitions.append(dict())
+                self._transitions[state][sym] = numbers[kernel]
+            state += 1
+
+    def _compute_lookaheads(self):
+        """Find the lookaheads of each kernel item, by working out which
+        are generated spontaneously and which propagate from other items.
+        """
+        self._lookaheads = [dict((item, set()) for item in kernel)
+                            for kernel in self._kernels]
+        self._lookaheads[0][self._kernels[0][0]].add(self.END)
+        propagates = dict()
+        for state, kernel in enumerate(self._kernels):
+            for item in kernel:
+                closure = self._lr1_closure({item: set([self._PROPAGATE])})
+                for (rule_num, dot), lookaheads in closure.items():
+                    rhs = self._rules[rule_num][1]
+                    if dot == len(rhs):
+                        continue
+                    target = (self._transitions[state][rhs[dot]],
+                              (rule_num, dot + 1))
+                    for lookahead in lookaheads:
+                        if lookahead == self._PROPAGATE:
+                            propagates.setdefault((state, item),
+                                                  []).append(target)
+                        else:
+                            self._lookaheads[target[0]][target[1]].add(
+                                lookahead)
+        changes = True
+        while changes:
+            changes = False
+            for (state, item), targets in propagates.items():
+                lookaheads = self._lookaheads[state][item]
+                for target_state, target_item in targets:
+                    target = self._lookaheads[target_state][target_item]
+                    if not lookaheads <= target:
+                        target |= lookaheads
+                        changes = True
+
+    def _build_tables(self):
+        """Build the action and goto tables, recording any conflicts.  In the
+        action table, a shift is stored as the number of the state to go to,
+        and a reduction as -1 - the rule number.
+        """
+        self._actions = []
+        self._gotos = []
+        self._conflicts = []
+        for state, transitions in enumerate(self._transitions):
+            actions = dict()
+            gotos = dict()
+            for sym, target in transitions.items():
+                if sym in self._nt_rules:
+                    gotos[sym] = target
+                else:
+                    actions[sym] = target
+            reductions = dict()
+            closure = self._lr1_closure(self._lookaheads[state])
+            for (rule_num, dot), lookaheads in closure.items():
+                if dot == len(self._rules[rule_num][1]):
+                    for lookahead in lookaheads:
+                        reductions.setdefault(lookahead, []).append(rule_num)
+            for lookahead, rule_nums in sorted(reductions.items()):
+                rules = [self._rules[rule_num] for rule_num in rule_nums]
+                if lookahead in actions:
+                    kind = 'shift/reduce'
+                elif len(rule_nums) > 1:
+                    kind = 'reduce/reduce'
+                else:
+                    actions[lookahead] = -1 - rule_nums[0]
+                    continue
+                self._conflicts.append(GrammarConflict(state, lookahead, kind,
+                                                       rules))
+                actions[lookahead] = self._CONFLICT
+            self._actions.append(actions)
+            self._gotos.append(gotos)
+
+    def _get_conflicts(self):
+        return self._conflicts
+
+    def _get_num_states(self):
+        return len(self._actions)
+
+    conflicts = property(_get_conflicts)
+    num_states = property(_get_num_states)
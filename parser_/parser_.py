@@ -1,10 +1,17 @@
 """This module contains the parser which parses the files and searches for
 other required JaML files to compile.
 """
+import hashlib
+import mmap
 import os
+import threading
+import warnings
 from spark import GenericParser
-from scanner import Scanner
+from scanner import Scanner, TokenStream, KINDS, KIND_CODES, ParseError
+from lalr import LALRTables, ConflictReached
+from expr_parser import replace_exprs
 import tree_nodes as nodes
+from utilities.profiler import profiler
 
 class ClassDoesNotExist(Exception):
     """Raised when a class is referenced from a file which does not exist in
@@ -12,61 +19,381 @@ class ClassDoesNotExist(Exception):
     """
     pass
 
+class BackendMismatch(Exception):
+    """Raised by a parser checking its backends against each other when they
+    build different ASTs from the same input.
+    """
+    pass
+
 class Parser(GenericParser):
-    def __init__(self, start = 'file'):
-        """Initialise the parser with the start production rule."""
+    # The grammar tables for each start rule.  The whole state machine is
+    # built by the first parser for a start rule, after which the tables are
+    # never changed, so they can be shared by parsers in different threads
+    _grammars = dict()
+    _grammars_lock = threading.Lock()
+    # The LALR(1) tables for each start rule, built the first time the
+    # deterministic backend is used with it
+    _lalr_tables = dict()
+    # The parsing backends which can be chosen
+    BACKENDS = ['earley', 'lalr', 'hybrid', 'check']
+
+    def __init__(self, start = 'file', backend = 'earley'):
+        """Initialise the parser with the start production rule.  backend is
+        the parser used: 'earley' is the general Earley parser; 'lalr' is the
+        deterministic LALR(1) parser, which hands input it can't parse with
+        one token of lookahead to the Earley parser; 'hybrid' parses the
+        expressions in method bodies with a precedence climbing parser, and
+        the rest of a file with the Earley parser; and 'check' parses with
+        each, raising BackendMismatch if they build different ASTs.
+        """
+        if backend not in Parser.BACKENDS:
+            raise ValueError('Unknown parser backend: ' + backend)
         GenericParser.__init__(self, start)
+        self._start = start
+        self._backend = backend
+        Parser._grammars_lock.acquire()
+        try:
+            if (backend in ('lalr', 'check') and
+                start not in Parser._lalr_tables):
+                Parser._lalr_tables[start] = self._build_lalr_tables()
+            if start not in Parser._grammars:
+                self._build_state_machine()
+                self.computeFirst()
+                Parser._grammars[start] = (self.nullable, self.newrules,
+                                           self.new2old, self.edges,
+                                           self.cores, self.states,
+                                           self.first)
+        finally:
+            Parser._grammars_lock.release()
+        (self.nullable, self.newrules, self.new2old, self.edges, self.cores,
+         self.states, self.first) = Parser._grammars[start]
+        self.ruleschanged = 0
+        # The state machine is complete, so the faster way of making Earley
+        # sets can be used
+        self.makeSet = self.makeSet_fast
+
+    def _build_state_machine(self):
+        """Build every state of the parser's state machine, rather than
+        leaving them to be built lazily while parsing.  This is the same as
+        GenericParser.__getstate__.
+        """
+        self.computeNull()
+        self.newrules = {}
+        self.new2old = {}
+        self.makeNewRules()
+        self.edges, self.cores = {}, {}
+        self.states = { 0: self.makeState0() }
+        self.makeState(0, self._BOF)
+        changes = True
+        while changes:
+            changes = False
+            for key, value in self.edges.items():
+                if value is None:
+                    state, sym = key
+                    if state in self.states:
+                        self.goto(state, sym)
+                        changes = True
+
+    def _build_lalr_tables(self):
+        """Build the LALR(1) tables for the grammar, warning of any
+        conflicts in them.
+        """
+        tables = LALRTables(self)
+        if tables.conflicts:
+            msg = ('%d conflicts in the LALR(1) tables for %s, input ' +
+                   'reaching them is parsed by the Earley parser:\n%s')
+            details = '\n'.join([str(conflict)
+                                 for conflict in tables.conflicts])
+            warnings.warn(msg % (len(tables.conflicts), self._start, details))
+        return tables
+
+    def parse(self, tokens):
+        """Parse a token stream with the chosen backend, and return the
+        result of the start rule.
+        """
+        self.num_sets = self.num_items = 0
+        if self._backend == 'earley':
+            return GenericParser.parse(self, tokens)
+        elif self._backend == 'hybrid':
+            return GenericParser.parse(self, self._replace_exprs(tokens))
+        elif self._backend == 'lalr':
+            try:
+                return Parser._lalr_tables[self._start].parse(self, tokens)
+            except ConflictReached:
+                profiler.count('lalr fallbacks')
+                return GenericParser.parse(self, tokens)
+        # Check the other backends against the Earley parser
+        ast = GenericParser.parse(self, tokens)
+        try:
+            lalr_ast = Parser._lalr_tables[self._start].parse(self, tokens)
+            if not nodes.same_ast(lalr_ast, ast):
+                msg = 'The LALR(1) and Earley parsers built different ASTs!'
+                raise BackendMismatch(msg)
+        except ConflictReached:
+            profiler.count('lalr fallbacks')
+        hybrid_ast = GenericParser.parse(self, self._replace_exprs(tokens))
+        if not nodes.same_ast(hybrid_ast, ast):
+            msg = 'The hybrid and Earley parsers built different ASTs!'
+            raise BackendMismatch(msg)
+        return ast
+
+    def error(self, token):
+        """Raise a ParseError for a syntax error at the token, which is None
+        at the end of the input.
+        """
+        if token is None:
+            raise ParseError('Syntax error at the end of the input')
+        raise ParseError("Syntax error at or near `%s' token" % token)
+
+    def _replace_exprs(self, tokens):
+        """Replace the expressions in the method bodies of a file's tokens
+        with the ASTs built for them by the precedence climbing parser.  Only
+        files have method bodies, so other tokens are left as they are.
+        """
+        if self._start != 'file':
+            return tokens
+        tokens, num_exprs = replace_exprs(tokens)
+        profiler.count('hybrid exprs', num_exprs)
+        return tokens
+
+    def tokenkinds(self, tokens):
+        """The Earley sets are made from the kind codes of the tokens, so
+        their transitions are found by looking up the kind, rather than by
+        comparing the token with each terminal.
+        """
+        return tokens.kinds
+
+    def typestring(self, code):
+        return KINDS[code]
 
-    def run_parser(self, file_, lib_classes = None):
-        """parses a jml file and returns a list of abstract syntax trees, or
-        parses a string containing JaML code.
+    def run_parser(self, file_, lib_classes = None, sig_loader = None,
+                   ast_cache = None, lazy = False):
+        """Deprecated: use parse_file or parse_source.  Parses a jml file and
+        returns a list of abstract syntax trees, or parses a string containing
+        JaML code if file_ is not the path of a file.
+        """
+        warnings.warn('run_parser is deprecated, use parse_file or '
+                      'parse_source', DeprecationWarning, stacklevel = 2)
+        if os.path.isfile(file_):
+            return self.parse_file(file_, lib_classes, sig_loader, ast_cache,
+                                   lazy)
+        return self.parse_source(file_)
+
+    def parse_file(self, path, lib_classes = None, sig_loader = None,
+                   ast_cache = None, lazy = False):
+        """Parse the main class in a jml file, and the classes it refers to
+        from the same directory, and return a list of their abstract syntax
+        trees.  If a signature loader is given, referenced classes it can
+        load the signatures of are not parsed.  If an AST cache is given,
+        files which have been parsed before are loaded from it rather than
+        parsed again.  If lazy is True, the classes referenced by the main
+        class are parsed without their method bodies, and put in the
+        signature_asts of the result rather than in the list, until their
+        bodies are loaded by load_bodies.
+        """
+        # Stores the directory of the main class
+        dir_ = os.path.dirname(path)
+        # Add the name of the main class to begin with
+        file_name = os.path.basename(path)
+        class_name = file_name.replace('.jml', '')
+        if lib_classes == None:
+            lib_classes = {}
+        # this stores names of all already seen class references
+        seen = [class_name]
+        # Kept so that the bodies of classes can be loaded later
+        self._load_state = (dir_, seen, lib_classes, sig_loader, ast_cache,
+                            lazy)
+        # Stores the ASTs of parsed classes
+        parsed = nodes.ProgramASTs()
+        self._load_classes(parsed, [class_name])
+        return parsed
+
+    def parse_source(self, source):
+        """Parse a string containing JaML code, from the start symbol of the
+        parser, and return a list holding its abstract syntax tree.
         """
+        ast = self._scan_and_parse(Scanner(), source)
+        ast_wrapper = nodes.ProgramASTs()
+        ast_wrapper.append(ast)
+        return ast_wrapper
+
+    def load_bodies(self, parsed, class_names, refed_names = ()):
+        """Parse the classes with the given names in full, which parse_file
+        only parsed the signatures of, moving their ASTs from the
+        signature_asts of parsed into the list.  The classes newly referenced
+        from their bodies, and those in refed_names which have not been seen
+        yet, are loaded in the same way parse_file loaded them.  Returns the
+        signature ASTs added.
+        """
+        parsed.signature_asts[:] = [ast for ast in parsed.signature_asts
+                                    if ast.children[0].value not in
+                                    class_names]
+        num_signature_asts = len(parsed.signature_asts)
+        self._load_classes(parsed, class_names, refed_names)
+        return parsed.signature_asts[num_signature_asts:]
+
+    def _load_classes(self, parsed, class_names, refed_names = ()):
+        """Parse the named classes, and the classes they refer to which have
+        not been seen yet, adding their ASTs and references to parsed.
+        """
+        dir_, seen, lib_classes, sig_loader, ast_cache, lazy = \
+            self._load_state
         scanner = Scanner()
-        # Try and parse a file, if this fails, parse as a string
-        try:
-            # This is to see if it's a file or not
-            open(file_)
-            # Stores the directory of the main class
-            dir_ = os.path.dirname(file_)
-            # Add the name of the main class to begin with
-            file_name = os.path.basename(file_)
-            class_name = file_name.replace('.jml', '')
-            # this stores names of all already seen class references
-            seen = [class_name]
-            # Stores classes to parse
-            to_parse = [class_name]
-            # Stores the ASTs of parsed classes
-            parsed = nodes.ProgramASTs()
-            while to_parse:
-                # Append file information to the class names
-                file_name = os.path.join(dir_, to_parse[0] + '.jml')
-                # Get the raw input
-                raw = open(file_name)
-                input_ = raw.read()
-                # Scan and parse the file
-                tokens = scanner.tokenize(input_)
-                ast = self.parse(tokens)
-                # Check the class and file are named the same
-                if to_parse[0] != ast.children[0].value:
-                    msg = 'Class name and file name do not match!'
-                    raise NameError(msg)
-                to_parse.pop(0)
+        # Stores classes to parse, and whether only their signatures are
+        # needed
+        to_parse = [(class_name, False) for class_name in class_names]
+        self._queue_refs(parsed, refed_names, to_parse)
+        while to_parse:
+            class_name, signatures_only = to_parse.pop(0)
+            # Append file information to the class names
+            file_name = os.path.join(dir_, class_name + '.jml')
+            ast, source_hash = self._parse_file(scanner, file_name,
+                                                signatures_only, ast_cache)
+            # Check the class and file are named the same
+            if class_name != ast.children[0].value:
+                msg = 'Class name and file name do not match!'
+                raise NameError(msg)
+            if signatures_only:
+                parsed.signature_asts.append(ast)
+            else:
                 parsed.append(ast)
-                # Fined classes reference from the one just parsed
-                if lib_classes == None:
-                    lib_classes = {}
-                refed_classes = self._find_refed_classes
-                refed_classes = refed_classes(ast, seen, [], lib_classes, dir_)
-                seen += refed_classes
-                to_parse += refed_classes
-            return parsed
-        except IOError:
-            # Simply parse the program held in the string
-            tokens = scanner.tokenize(file_)
+            if source_hash is not None:
+                parsed.source_hashes[class_name] = source_hash
+            # Fined classes reference from the one just parsed
+            refed_classes = self._find_refed_classes
+            refed_classes = refed_classes(ast, [class_name], [],
+                                          lib_classes, dir_)
+            parsed.refs[class_name] = refed_classes
+            self._queue_refs(parsed, refed_classes, to_parse)
+
+    def _queue_refs(self, parsed, refed_classes, to_parse):
+        """Add the referenced classes which have not been seen yet to the
+        classes to parse, unless the signature loader can load them.
+        """
+        dir_, seen, lib_classes, sig_loader, ast_cache, lazy = \
+            self._load_state
+        new = [name for name in refed_classes if name not in seen]
+        seen += new
+        while new:
+            class_name = new.pop(0)
+            refs = None
+            if sig_loader is not None:
+                refs = sig_loader.load(class_name, dir_)
+            if refs is None:
+                to_parse.append((class_name, lazy))
+            else:
+                # It has already been compiled, but the classes it refers to
+                # are still needed
+                parsed.refs[class_name] = refs
+                refs = [name for name in refs if name not in seen]
+                seen += refs
+                new += refs
+
+    def _parse_file(self, scanner, file_name, signatures_only, ast_cache):
+        """Scan and parse a source file, or load its AST from the AST cache,
+        as _load_or_parse does.  The file is memory mapped and scanned in
+        place, rather than read into a string, so a large source is never
+        copied; it is closed before returning.
+        """
+        source_file = open(file_name, 'rb')
+        try:
+            try:
+                source = mmap.mmap(source_file.fileno(), 0,
+                                   access = mmap.ACCESS_READ)
+            except ValueError:
+                # An empty file can't be mapped
+                source = ''
+            try:
+                if signatures_only:
+                    return self._scan_and_parse(scanner, source, True), None
+                return self._load_or_parse(scanner, source, ast_cache)
+            finally:
+                if isinstance(source, mmap.mmap):
+                    source.close()
+        finally:
+            source_file.close()
+
+    def _load_or_parse(self, scanner, input_, ast_cache):
+        """Load the AST of the source of a class from the AST cache, if one
+        is given, or scan and parse it.  Returns the AST and the hash of the
+        source, which is None if there is no cache.
+        """
+        if ast_cache is None:
+            return self._scan_and_parse(scanner, input_), None
+        source_hash = hashlib.sha1(input_).hexdigest()
+        ast = ast_cache.load_parsed(source_hash)
+        if ast is None:
+            ast = self._scan_and_parse(scanner, input_)
+            ast_cache.store_parsed(source_hash, ast)
+        return ast, source_hash
+
+    def _scan_and_parse(self, scanner, input_, signatures_only = False):
+        """Scan and parse the source of a class, and return its AST.  If
+        signatures_only is True, the bodies of its methods and constructor
+        are left empty.
+        """
+        profiler.start('scan')
+        try:
+            tokens = scanner.tokenize(input_)
+            if signatures_only:
+                tokens = self._strip_bodies(tokens)
+                profiler.count('signature only classes')
+        finally:
+            profiler.stop()
+        # The tokens hold all that is needed of the input, and are dropped
+        # as soon as the AST has been built
+        del input_
+        profiler.start('parse')
+        try:
             ast = self.parse(tokens)
-            ast_wrapper = nodes.ProgramASTs()
-            ast_wrapper.append(ast)
-            return ast_wrapper
+        finally:
+            profiler.stop()
+        num_tokens = len(tokens)
+        del tokens
+        if isinstance(ast, nodes.TreeNode):
+            nodes.freeze_ast(ast)
+        if profiler.enabled:
+            profiler.count('tokens', num_tokens)
+            profiler.count('earley sets', self.num_sets)
+            profiler.count('earley items', self.num_items)
+            profiler.count('ast nodes', self._count_nodes(ast))
+        return ast
+
+    def _strip_bodies(self, tokens):
+        """Get a copy of the tokens of a class without the tokens inside the
+        bodies of its methods and constructor, which are at a depth of two
+        braces.
+        """
+        lbrace = KIND_CODES['{']
+        rbrace = KIND_CODES['}']
+        kinds = tokens.kinds
+        stripped = TokenStream()
+        depth = 0
+        for idx in xrange(len(kinds)):
+            kind = kinds[idx]
+            if kind == lbrace:
+                depth += 1
+                keep = depth <= 2
+            elif kind == rbrace:
+                keep = depth <= 2
+                depth -= 1
+            else:
+                keep = depth <= 1
+            if keep:
+                stripped.append(KINDS[kind], tokens.get_offset(idx),
+                                tokens.get_attr(idx))
+        return stripped
+
+    def _count_nodes(self, ast):
+        """Count the nodes in an AST."""
+        num_nodes = 0
+        to_visit = [ast]
+        while to_visit:
+            node = to_visit.pop()
+            num_nodes += 1
+            if not node.is_leaf:
+                to_visit.extend(node.children)
+        return num_nodes
 
     def _find_refed_classes(self, node, seen, new, lib_classes, cur_dir):
         """Gets the names of all referenced classes in the abstract syntax tree.
@@ -74,8 +401,7 @@ class Parser(GenericParser):
         # Uses a depth first search looking for var_dcl, object_creator and
         # extends nodes
         refed_classes = self._find_refed_classes
-        try:
-            # The try will fail if it's a leaf
+        if not node.is_leaf:
             children = node.children
             # Need to check object_creator nodes because subclasses that are
             # assigned to variables of type superclass must also be parsed.
@@ -95,7 +421,11 @@ class Parser(GenericParser):
                 # Check if the first child is a static reference to a class,
                 # if it is, add the class to parse
                 id_node = node.children[0]
-                if self._check_static_ref(id_node, cur_dir):
+                if (id_node.value not in seen and
+                        self._check_static_ref(id_node, cur_dir)):
+                    # Mark it as seen, so classes which refer to themselves
+                    # are not parsed again
+                    seen.append(id_node.value)
                     new.append(id_node.value)
                 try:
                     # Search in the arguments for methods calls
@@ -106,15 +436,14 @@ class Parser(GenericParser):
                 # Keep searching through the AST
                 for child in children:
                     new += refed_classes(child, seen, [], lib_classes, cur_dir)
-        except AttributeError:
-            if node.value not in seen:
-                is_class = isinstance(node, nodes.ClassTypeNode)
-                is_extends = isinstance(node, nodes.ExtendsNode)
-                is_implements = isinstance(node, nodes.ImplementsNode)
-                if ((is_class or is_extends or is_implements)
-                        and node.value not in lib_classes.keys()):
-                    seen.append(node.value)
-                    new.append(node.value)
+        elif node.value not in seen:
+            is_class = isinstance(node, nodes.ClassTypeNode)
+            is_extends = isinstance(node, nodes.ExtendsNode)
+            is_implements = isinstance(node, nodes.ImplementsNode)
+            if ((is_class or is_extends or is_implements)
+                    and node.value not in lib_classes.keys()):
+                seen.append(node.value)
+                new.append(node.value)
         return new
 
     def _check_static_ref(self, id_node, cur_dir):
@@ -199,7 +528,8 @@ class Parser(GenericParser):
         return [nodes.ImplementsNode(args[0].attr)]
     def p_implements_list(self, args):
         """ implements_list ::= implements_list , ID """
-        return args[0] + [nodes.ImplementsNode(args[2].attr)]
+        args[0].append(nodes.ImplementsNode(args[2].attr))
+        return args[0]
 
     def p_class_body(self, args):
         """ class_body ::= { class_body_dcl } """
@@ -224,17 +554,20 @@ class Parser(GenericParser):
         return [args[0]]
     def p_class_body_dcl_constructor(self, args):
         """ class_body_dcl ::= class_body_dcl constructor_dcl """
-        return args[0] + [args[1]]
+        args[0].append(args[1])
+        return args[0]
     def p_class_body_dcl_method(self, args):
         """ class_body_dcl ::= class_body_dcl method_dcl """
-        return args[0] + [args[1]]
+        args[0].append(args[1])
+        return args[0]
     def p_class_body_dcl_var(self, args):
         """ class_body_dcl ::= class_body_dcl field_dcl """
-        return args[0] + [args[1]]
+        args[0].append(args[1])
+        return args[0]
 
     def p_field_dcl(self, args):
         """
-        field_dcl ::= field_mods field_dcl_rest
+        field_dcl ::= member_mods field_dcl_rest
         field_dcl ::= field_dcl_rest
         """
         try:
@@ -265,12 +598,14 @@ class Parser(GenericParser):
         """ field_dcl_rest ::= type ID ASSIGN_OP literal ; """
         return self._var_dcl_assign_node('field', args)
 
-    def p_field_modifiers(self, args):
+    def p_member_modifiers(self, args):
         """
-        field_mods ::= PRIVATE
-        field_mods ::= static_final_mods
-        field_mods ::= PRIVATE static_final_mods
+        member_mods ::= PRIVATE
+        member_mods ::= static_final_mods
+        member_mods ::= PRIVATE static_final_mods
         """
+        # Fields and methods share their modifiers, so whether a member is a
+        # field or a method need not be decided until after its name
         # Return the list of modifiers, possibly with private
         try:
             return [args[0].name.lower()] + args[1]
@@ -305,7 +640,7 @@ class Parser(GenericParser):
     def p_method_dcl(self, args):
         """
         method_dcl ::= ABSTRACT abs_method_dcl
-        method_dcl ::= method_mods method_dcl_rest
+        method_dcl ::= member_mods method_dcl_rest
         method_dcl ::= method_dcl_rest
         """
         try:
@@ -344,21 +679,6 @@ class Parser(GenericParser):
         root.add_children(args[3:5])
         return root
 
-    def p_method_modifiers(self, args):
-        """
-        method_mods ::= PRIVATE
-        method_mods ::= static_final_mods
-        method_mods ::= PRIVATE static_final_mods
-        """
-        # Return the list of modifiers, possibly with private
-        try:
-            return [args[0].name.lower()] + args[1]
-        except (IndexError, AttributeError):
-            try:
-                return [args[0].name.lower()]
-            except AttributeError:
-                return args[0]
-
     def p_formal_param1(self, args):
         """ formal_param ::= ( param_list ) """
         root = nodes.ParamListNode()
@@ -391,19 +711,22 @@ class Parser(GenericParser):
         """ param_list ::= param_list , type ID """
         root = nodes.ParamDclNode()
         root.add_children([args[2], nodes.IdNode(args[3].attr)])
-        return args[0] + [root]
+        args[0].append(root)
+        return args[0]
     def p_param_list_array1(self, args):
         """ param_list ::= param_list , type array_brackets ID """
         root = nodes.ParamDclNode()
         root.add_child(args[2])
         root.add_child(nodes.create_array_dcl(args[4].attr, args[3]))
-        return args[0] + [root]
+        args[0].append(root)
+        return args[0]
     def p_param_list_array2(self, args):
         """ param_list ::= param_list , type ID array_brackets """
         root = nodes.ParamDclNode()
         root.add_child(args[2])
         root.add_child(nodes.create_array_dcl(args[3].attr, args[4]))
-        return args[0] + [root]
+        args[0].append(root)
+        return args[0]
 
     def p_block(self, args):
         """ block ::= { block_stmt } """
@@ -424,20 +747,28 @@ class Parser(GenericParser):
         return [args[0]]
     def p_block_stmt_stmt(self, args):
         """ block_stmt ::= block_stmt stmt """
-        return args[0] + [args[1]]
+        args[0].append(args[1])
+        return args[0]
     def p_block_stmt_var(self, args):
         """ block_stmt ::= block_stmt var_dcl """
-        return args[0] + [args[1]]
+        args[0].append(args[1])
+        return args[0]
 
     def p_var_dcl_simple(self, args):
         """ var_dcl ::= type ID ; """
         root = nodes.VarDclNode()
         root.add_children([args[0], nodes.IdNode(args[1].attr)])
         return root
+    # In these, the type is made here rather than by the type rule, so in a
+    # block an ID followed by [ need not be decided to be a type or an array
+    # element until after the [
     def p_var_dcl_array1(self, args):
-        """ var_dcl ::= type array_brackets ID ; """
+        """
+        var_dcl ::= ID array_brackets ID ;
+        var_dcl ::= TYPE array_brackets ID ;
+        """
         root = nodes.VarDclNode()
-        root.add_child(args[0])
+        root.add_child(self.p_type(args[:1]))
         root.add_child(nodes.create_array_dcl(args[2].attr, args[1]))
         return root
     def p_var_dcl_array2(self, args):
@@ -451,8 +782,13 @@ class Parser(GenericParser):
         """ var_dcl ::= type ID ASSIGN_OP expr ; """
         return self._var_dcl_assign_node('local', args)
     def p_var_dcl_array_init1(self, args):
-        """ var_dcl ::= type array_brackets ID ASSIGN_OP expr ; """
-        return self._var_dcl_array_init_node('local', args)
+        """
+        var_dcl ::= ID array_brackets ID ASSIGN_OP expr ;
+        var_dcl ::= TYPE array_brackets ID ASSIGN_OP expr ;
+        """
+        return self._var_dcl_array_init_node('local',
+                                             [self.p_type(args[:1])] +
+                                             args[1:])
     def p_var_dcl_array_init2(self, args):
         """ var_dcl ::= type ID array_brackets ASSIGN_OP expr ; """
         return self._var_dcl_array_init_node('local', args)
@@ -688,6 +1024,11 @@ class Parser(GenericParser):
     def p_primary_brackets(self, args):
         """ primary ::= ( expr ) """
         return args[1]
+    def p_primary_parsed(self, args):
+        """ primary ::= EXPR """
+        # An expression parsed by the hybrid backend, whose span was chosen
+        # so that this builds the same AST as parsing it would have
+        return args[0].attr
 
     def p_method_call_simple(self, args):
         """ method_call ::= ID ( ) """
@@ -739,7 +1080,8 @@ class Parser(GenericParser):
     def p_method_call_rest(self, args):
         """ method_call_rest ::= method_call_rest . ID """
         leaf = nodes.IdNode(args[2].attr)
-        return args[0] + [leaf]
+        args[0].append(leaf)
+        return args[0]
 
     def p_args_list(self, args):
         """ args_list ::= args """
@@ -753,7 +1095,8 @@ class Parser(GenericParser):
         return [args[0]]
     def p_args(self, args):
         """ args ::= args , expr """
-        return args[0] + [args[2]]
+        args[0].append(args[2])
+        return args[0]
 
     def p_field_ref(self, args):
         """ field_ref ::= ID . ID """
@@ -781,7 +1124,8 @@ class Parser(GenericParser):
         return [args[1]]
     def p_array_suffix2(self, args):
         """ array_suffix ::= array_suffix [ expr ]  """
-        return args[0] + [args[2]]
+        args[0].append(args[2])
+        return args[0]
 
     def p_matrix_element(self, args):
         """ matrix_element ::= ID | expr , expr | """
@@ -874,7 +1218,8 @@ class Parser(GenericParser):
         return [args[0]]
     def p_interface_body_dcl_method(self, args):
         """ interface_body_dcl ::= interface_body_dcl abs_method_dcl """
-        return args[0] + [args[1]]
+        args[0].append(args[1])
+        return args[0]
 
     def p_abs_method_dcl(self, args):
         """
@@ -1,94 +1,104 @@
 """The test class for the parser and scanner files."""
+import os
 import unittest
 from parser_.parser_ import Parser
+from parser_.scanner import Scanner
+from parser_.expr_parser import replace_exprs
+from parser_.ast_cache import dump_ast, load_ast
 import parser_.tree_nodes as nodes
+from benchmarks.kernels import KERNELS
 
 class TestParser(unittest.TestCase):
     """Test class where tests to be run are the methods. The first tests
     involve checking the scanner, and subsequent tests target the parser.
     """
+    # The parser tests which parse files use those of the semantic tests
+    _test_file_dir = os.path.join(os.path.dirname(__file__), '..', '..',
+                                  'semantic_analysis',
+                                  'semantic_analysis_test', 'test_files')
+
     # First tests are for the lexer
     def test_id_mixed_case_num(self):
         """Test mixed case IDs with numbers and an underscore."""
         # Error will be thrown if iDEntif1er_ is not recognised as an ID
-        output = Parser('primary').run_parser('iDEntif1er_')
+        output = Parser('primary').parse_source('iDEntif1er_')
         # Check it is an ID
         self.assertEqual(output[0].value, 'iDEntif1er_')
 
     def test_id_whitespace(self):
         """Whitespace should be ignored, check no error thrown."""
-        output = Parser('primary').run_parser('  iDEntif1er ')
+        output = Parser('primary').parse_source('  iDEntif1er ')
         # Check whitespace removed
         self.assertEqual(output[0].value, "iDEntif1er")
 
     def test_id_start_with_upper(self):
         """Test ID recognised when it starts with an upper case letter.
         """
-        Parser('primary').run_parser('Hi')
+        Parser('primary').parse_source('Hi')
 
     def test_id_contains_reserved_word(self):
         """ Test that ID is still recognised when it contains a reserved word.
         """
-        Parser('primary').run_parser('whiler')
+        Parser('primary').parse_source('whiler')
 
     def test_id_error_reserved_word(self):
         """Test an exception is thrown when a reserved word is used as an ID.
         """
-        self.assertRaises(SystemExit, Parser('primary').run_parser,
+        self.assertRaises(SystemExit, Parser('primary').parse_source,
                   'while')
 
     def test_id_error_start_with_num(self):
         """Test exception thrown when ID starts with a number."""
-        self.assertRaises(SystemExit, Parser('primary').run_parser, '1test')
+        self.assertRaises(SystemExit, Parser('primary').parse_source, '1test')
 
     # NOTE - Newer version of PyUnit now has assertIsInstance(), for now we
     # must make do with self.assertTrue(isinstance())
     def test_int_recognised(self):
         """Test that integer is recognised."""
-        node = Parser('literal').run_parser('1234')
+        node = Parser('literal').parse_source('1234')
         self.assertTrue(isinstance(node[0], nodes.IntLNode))
 
     def test_long_recognised(self):
         """Test that longs are recognised."""
-        node = Parser('literal').run_parser('1234L')
+        node = Parser('literal').parse_source('1234L')
         self.assertTrue(isinstance(node[0], nodes.LongLNode))
 
     def test_float_recognised(self):
         """Test that floats are recognised."""
-        node = Parser('literal').run_parser('1234f')
+        node = Parser('literal').parse_source('1234f')
         self.assertTrue(isinstance(node[0], nodes.FloatLNode))
 
     def test_double_recognised(self):
         """Test that doubles are recognised."""
-        node = Parser('literal').run_parser('12.34D')
+        node = Parser('literal').parse_source('12.34D')
         self.assertTrue(isinstance(node[0], nodes.DoubleLNode))
 
     def test_double_recognised_no_d(self):
         """Test that doubles are recognised when the literal has a decimal
         point, but no 'd' or 'D'.
         """
-        node = Parser('literal').run_parser('12.34')
+        node = Parser('literal').parse_source('12.34')
         self.assertTrue(isinstance(node[0], nodes.DoubleLNode))
 
     def test_string_recognised(self):
         """Test that strings are recognised"""
-        node = Parser('literal').run_parser('"this IS a string 123"')
+        node = Parser('literal').parse_source('"this IS a string 123"')
         self.assertTrue(isinstance(node[0], nodes.StringLNode))
 
     def test_char_recognised(self):
         """Test that chars are recognised."""
-        node = Parser('literal').run_parser("'x'")
+        node = Parser('literal').parse_source("'x'")
         self.assertTrue(isinstance(node[0], nodes.CharLNode))
 
     def test_bool_recognised(self):
         """Test that boolean literals are recognised."""
-        node = Parser('literal').run_parser('true')
+        node = Parser('literal').parse_source('true')
         # Check the node is a boolean
         self.assertTrue(isinstance(node[0], nodes.BooleanLNode))
 
     def test_nl_tab(self):
         """Test new lines and tabs are correctly ignored."""
-        Parser('block').run_parser('{x\n\r=\t\t2\n;}')
+        Parser('block').parse_source('{x\n\r=\t\t2\n;}')
 
     ##########################################################################
     ## TEST PARSER RULES
@@ -108,7 +118,7 @@ class TestParser(unittest.TestCase):
         """Test a class which extends another is correctly parsed."""
         node_ids = [nodes.ClassNode, nodes.IdNode, nodes.ExtendsNode,
                     nodes.EmptyNode, nodes.EmptyNode]
-        node = Parser().run_parser('class X extends Y {}')
+        node = Parser().parse_source('class X extends Y {}')
         self.check_ast(node, node_ids, 0)
 
     def test_class_implements(self):
@@ -116,7 +126,7 @@ class TestParser(unittest.TestCase):
         node_ids = [nodes.ClassNode, nodes.IdNode, nodes.EmptyNode,
                     nodes.ImplementsListNode, nodes.ImplementsNode,
                     nodes.EmptyNode]
-        node = Parser().run_parser('class X implements Y {}')
+        node = Parser().parse_source('class X implements Y {}')
         self.check_ast(node, node_ids, 0)
 
     def test_class_multi_implements(self):
@@ -126,7 +136,7 @@ class TestParser(unittest.TestCase):
         node_ids = [nodes.ClassNode, nodes.IdNode, nodes.EmptyNode,
                     nodes.ImplementsListNode, nodes.ImplementsNode,
                     nodes.ImplementsNode, nodes.EmptyNode]
-        node = Parser().run_parser('class X implements Y, Z {}')
+        node = Parser().parse_source('class X implements Y, Z {}')
         self.check_ast(node, node_ids, 0)
 
     def test_class_extends_implements(self):
@@ -136,12 +146,12 @@ class TestParser(unittest.TestCase):
         node_ids = [nodes.ClassNode, nodes.IdNode, nodes.ExtendsNode,
                 nodes.ImplementsListNode, nodes.ImplementsNode,
                 nodes.EmptyNode]
-        node = Parser().run_parser('class X extends Y implements Z{}')
+        node = Parser().parse_source('class X extends Y implements Z{}')
         self.check_ast(node, node_ids, 0)
 
     def test_class_modifier(self):
         """Test that a class modifier is correctly added."""
-        node = Parser().run_parser('abstract class X {}')
+        node = Parser().parse_source('abstract class X {}')
         self.assertEqual(node[0].modifiers, ['abstract'])
 
     def test_interface(self):
@@ -150,12 +160,12 @@ class TestParser(unittest.TestCase):
                     nodes.InterfaceBodyNode, nodes.AbsMethodDclNode,
                     nodes.IdNode, nodes.ClassTypeNode, nodes.ParamListNode,
                     nodes.ParamDclNode, nodes.ClassTypeNode, nodes.IdNode]
-        node = Parser().run_parser('interface X {Type X(Type2 y);}')
+        node = Parser().parse_source('interface X {Type X(Type2 y);}')
         self.check_ast(node, node_ids, 0)
 
     def test_field_modifier(self):
         """Test that field modifiers are correctly added."""
-        node = Parser().run_parser('class X { private static final int x;}')
+        node = Parser().parse_source('class X { private static final int x;}')
         self.assertEqual(node[0].children[3].children[0].modifiers,
                          ['private', 'static', 'final'])
 
@@ -165,7 +175,7 @@ class TestParser(unittest.TestCase):
                     nodes.EmptyNode, nodes.ClassBodyNode,
                     nodes.FieldDclAssignNode, nodes.TypeNode,
                     nodes.AssignNode, nodes.IdNode, nodes.IntLNode]
-        node = Parser().run_parser('class X { static final int x = 5;}')
+        node = Parser().parse_source('class X { static final int x = 5;}')
         self.check_ast(node, node_ids, 0)
 
     def test_constructor(self):
@@ -175,7 +185,7 @@ class TestParser(unittest.TestCase):
                     nodes.ConstructorDclNode, nodes.IdNode,
                     nodes.ParamListNode, nodes.ParamDclNode,
                     nodes.TypeNode, nodes.IdNode, nodes.EmptyNode]
-        node = Parser().run_parser('class X {X(int y){}}')
+        node = Parser().parse_source('class X {X(int y){}}')
         self.check_ast(node, node_ids, 0)
 
     def test_method_array(self):
@@ -185,7 +195,7 @@ class TestParser(unittest.TestCase):
                     nodes.ParamDclNode, nodes.TypeNode, nodes.IdNode,
                     nodes.ParamDclNode, nodes.TypeNode, nodes.IdNode,
                     nodes.EmptyNode]
-        node = Parser('method_dcl').run_parser('byte[][] X(int x, char z){}')
+        node = Parser('method_dcl').parse_source('byte[][] X(int x, char z){}')
         self.check_ast(node, node_ids, 0)
 
     def test_method_param_array(self):
@@ -196,25 +206,26 @@ class TestParser(unittest.TestCase):
                     nodes.ParamListNode, nodes.ParamDclNode, nodes.TypeNode,
                     nodes.ArrayDclNode, nodes.ArrayIdNode,
                     nodes.DimensionsNode, nodes.EmptyNode]
-        node = Parser('method_dcl').run_parser('byte X(int x[][][]) {}')
+        node = Parser('method_dcl').parse_source('byte X(int x[][][]) {}')
         self.check_ast(node, node_ids, 0)
 
     def test_abstract_method(self):
         """Test an abstract method in a class."""
-        node = Parser().run_parser('abstract class X { abstract int x();}')[0]
+        p = 'abstract class X { abstract int x();}'
+        node = Parser().parse_source(p)[0]
         self.assertTrue(isinstance(node.children[3].children[0],
                                    nodes.AbsMethodDclNode))
 
     def test_method_modifier(self):
         """Test that field modifiers are correctly added."""
-        node = Parser().run_parser('class X { final static int x(){}}')[0]
+        node = Parser().parse_source('class X { final static int x(){}}')[0]
         self.assertEqual(node.children[3].children[0].modifiers,
                          ['final', 'static'])
 
     def test_empty_block_stmt(self):
         """Test an empty block statement parses."""
         node_ids = [nodes.EmptyNode]
-        node = Parser('block').run_parser('{}')
+        node = Parser('block').parse_source('{}')
         # Check there are no children of the block
         self.check_ast(node, node_ids, 0)
 
@@ -227,7 +238,7 @@ class TestParser(unittest.TestCase):
         node_ids = [nodes.BlockNode, nodes.VarDclNode, nodes.TypeNode,
                     nodes.IdNode]
         # Parse the Java code
-        node = Parser('block').run_parser('{int x;}')
+        node = Parser('block').parse_source('{int x;}')
         # Check the AST against the list of node_ids
         self.check_ast(node, node_ids, 0)
 
@@ -235,7 +246,7 @@ class TestParser(unittest.TestCase):
         """Test the variable declaration statement with assignment."""
         node_ids = [nodes.BlockNode, nodes.VarDclAssignNode,  nodes.TypeNode,
                     nodes.AssignNode, nodes.IdNode, nodes.IntLNode]
-        node = Parser('block').run_parser('{int x = 10;}')
+        node = Parser('block').parse_source('{int x = 10;}')
         self.check_ast(node, node_ids, 0)
 
     def test_array_dcl(self):
@@ -243,7 +254,7 @@ class TestParser(unittest.TestCase):
         node_ids = [nodes.BlockNode, nodes.VarDclNode, nodes.TypeNode,
                     nodes.ArrayDclNode, nodes.ArrayIdNode,
                     nodes.DimensionsNode]
-        node = Parser('block').run_parser('{int x[];}')
+        node = Parser('block').parse_source('{int x[];}')
         self.check_ast(node, node_ids, 0)
 
     def test_array_init(self):
@@ -253,7 +264,7 @@ class TestParser(unittest.TestCase):
                     nodes.DimensionsNode, nodes.ArrayInitNode, nodes.TypeNode,
                     nodes.IntLNode, nodes.AddNode, nodes.IntLNode,
                     nodes.IntLNode]
-        node = Parser('block').run_parser('{boolean x[][] = ' +
+        node = Parser('block').parse_source('{boolean x[][] = ' +
                                           'new boolean[5][10-1];}')
         self.check_ast(node, node_ids, 0)
 
@@ -263,20 +274,20 @@ class TestParser(unittest.TestCase):
                     nodes.AssignNode, nodes.IdNode, nodes.MatrixInitNode,
                     nodes.IntLNode, nodes.AddNode, nodes.IntLNode,
                     nodes.IntLNode]
-        node = Parser('block').run_parser('{matrix x = |5, 10-1|;}')
+        node = Parser('block').parse_source('{matrix x = |5, 10-1|;}')
         self.check_ast(node, node_ids, 0)
 
     def test_stmt_empty(self):
         """Test the case where there is an empy line of code."""
         node_ids = [nodes.BlockNode, nodes.EmptyNode]
-        node = Parser('block').run_parser('{;}')
+        node = Parser('block').parse_source('{;}')
         self.check_ast(node, node_ids, 0)
 
     def test_stmt_expr(self):
         """Test for the case where there is just one, simple, expression."""
         node_ids = [nodes.BlockNode, nodes.AssignNode, nodes.IdNode,
                     nodes.IdNode]
-        node = Parser('block').run_parser('{x = y;}')
+        node = Parser('block').parse_source('{x = y;}')
         self.check_ast(node, node_ids, 0)
 
     def test_if_stmt(self):
@@ -284,7 +295,7 @@ class TestParser(unittest.TestCase):
         node_ids = [nodes.IfNode, nodes.RelNode, nodes.IdNode, nodes.IdNode,
                     nodes.BlockNode, nodes.AddNode, nodes.IdNode,
                     nodes.IntLNode]
-        node = Parser('if_stmt').run_parser('if (x > y) {x - 1;}')
+        node = Parser('if_stmt').parse_source('if (x > y) {x - 1;}')
         self.check_ast(node, node_ids, 0)
 
     def test_if_else_stmt(self):
@@ -293,7 +304,7 @@ class TestParser(unittest.TestCase):
                     nodes.IdNode, nodes.BlockNode, nodes.AddNode, nodes.IdNode,
                     nodes.IntLNode, nodes.BlockNode,nodes.AddNode,
                     nodes.IdNode, nodes.IdNode]
-        node = Parser('block').run_parser('{if (x > y) {x - 1;} ' +
+        node = Parser('block').parse_source('{if (x > y) {x - 1;} ' +
                                           'else {x - y;}}')
         self.check_ast(node, node_ids, 0)
 
@@ -305,7 +316,7 @@ class TestParser(unittest.TestCase):
                     nodes.IntLNode, nodes.BlockNode, nodes.AssignNode,
                     nodes.IdNode, nodes.IntLNode, nodes.BlockNode,
                     nodes.AddNode, nodes.IdNode, nodes.IntLNode]
-        node = Parser('block').run_parser('{if (x > y) {x - 1;} ' +
+        node = Parser('block').parse_source('{if (x > y) {x - 1;} ' +
                                           'else if (y == 3){y = 3;} ' +
                                           'else{y + 2;}}')
         self.check_ast(node, node_ids, 0)
@@ -316,7 +327,7 @@ class TestParser(unittest.TestCase):
         node_ids = [nodes.WhileNode, nodes.EqNode, nodes.IdNode,
                     nodes.IntLNode, nodes.BlockNode, nodes.AddNode,
                     nodes.IdNode, nodes.IntLNode]
-        node = Parser('while_stmt').run_parser('while(x==1){x+10;}')
+        node = Parser('while_stmt').parse_source('while(x==1){x+10;}')
         self.check_ast(node, node_ids, 0)
 
     def test_for_stmt(self):
@@ -326,7 +337,7 @@ class TestParser(unittest.TestCase):
                     nodes.RelNode, nodes.IdNode, nodes.IntLNode, nodes.IncNode,
                     nodes.IdNode, nodes.BlockNode, nodes.AddNode, nodes.IdNode,
                     nodes.IntLNode]
-        node = Parser('for_stmt').run_parser('for (int x = 1; ' +
+        node = Parser('for_stmt').parse_source('for (int x = 1; ' +
                                              'x < 2; x++){y + 1;}')
         self.check_ast(node, node_ids, 0)
 
@@ -334,14 +345,14 @@ class TestParser(unittest.TestCase):
         """Test a simple assigment expression."""
         node_ids = [nodes.BlockNode, nodes.AssignNode, nodes.IdNode,
                     nodes.IdNode]
-        node = Parser('block').run_parser('{x = y;}')
+        node = Parser('block').parse_source('{x = y;}')
         self.check_ast(node, node_ids, 0)
 
     def test_array_assign(self):
         """Test an array initialisation."""
         node_ids = [nodes.BlockNode, nodes.AssignNode, nodes.IdNode,
                     nodes.ArrayInitNode, nodes.TypeNode, nodes.IntLNode]
-        node = Parser('block').run_parser('{x = new float[5];}')
+        node = Parser('block').parse_source('{x = new float[5];}')
         self.check_ast(node, node_ids, 0)
 
     def test_array_element_assign(self):
@@ -349,14 +360,14 @@ class TestParser(unittest.TestCase):
         node_ids = [nodes.BlockNode, nodes.AssignNode,  nodes.ArrayElementNode,
                     nodes.IdNode, nodes.IntLNode, nodes.IntLNode,
                      nodes.BooleanLNode]
-        node = Parser('block').run_parser('{x[4][5] = true;}')
+        node = Parser('block').parse_source('{x[4][5] = true;}')
         self.check_ast(node, node_ids, 0)
 
     def test_matrix_assign(self):
         """Test an matrix initialisation."""
         node_ids = [nodes.BlockNode, nodes.AssignNode, nodes.IdNode,
                     nodes.MatrixInitNode, nodes.IntLNode, nodes.IntLNode]
-        node = Parser('block').run_parser('{x = |5, 5|;}')
+        node = Parser('block').parse_source('{x = |5, 5|;}')
         self.check_ast(node, node_ids, 0)
 
     def test_matrix_element_assign(self):
@@ -364,38 +375,38 @@ class TestParser(unittest.TestCase):
         node_ids = [nodes.BlockNode, nodes.AssignNode, nodes.MatrixElementNode,
                     nodes.IdNode, nodes.IntLNode, nodes.IntLNode,
                     nodes.IntLNode]
-        node = Parser('block').run_parser('{x|1 , 5| = 5;}')
+        node = Parser('block').parse_source('{x|1 , 5| = 5;}')
         self.check_ast(node, node_ids, 0)
 
     def test_cond_expr(self):
         """Test a simple conditional expression."""
         node_ids = [nodes.BlockNode, nodes.CondNode, nodes.IdNode,
                     nodes.IdNode]
-        node = Parser('block').run_parser('{x || y;}')
+        node = Parser('block').parse_source('{x || y;}')
         self.check_ast(node, node_ids, 0)
 
     def test_eq_expr(self):
         """Test a simple equality expression."""
         node_ids = [nodes.BlockNode, nodes.EqNode, nodes.IdNode, nodes.IdNode]
-        node = Parser('block').run_parser('{x != y;}')
+        node = Parser('block').parse_source('{x != y;}')
         self.check_ast(node, node_ids, 0)
 
     def test_rel_expr(self):
         """Test a simple relation expression."""
         node_ids = [nodes.BlockNode, nodes.RelNode, nodes.IdNode, nodes.IdNode]
-        node = Parser('block').run_parser('{x >= y;}')
+        node = Parser('block').parse_source('{x >= y;}')
         self.check_ast(node, node_ids, 0)
 
     def test_add_expr(self):
         """Test a simple additive expression."""
         node_ids = [nodes.BlockNode, nodes.AddNode, nodes.IdNode, nodes.IdNode]
-        node = Parser('block').run_parser('{x + y;}')
+        node = Parser('block').parse_source('{x + y;}')
         self.check_ast(node, node_ids, 0)
 
     def test_mul_expr(self):
         """Test a simple multiplicative expression."""
         node_ids = [nodes.BlockNode, nodes.MulNode, nodes.IdNode, nodes.IdNode]
-        node = Parser('block').run_parser('{x / y;}')
+        node = Parser('block').parse_source('{x / y;}')
         self.check_ast(node, node_ids, 0)
 
     def test_unary_expr(self):
@@ -404,14 +415,14 @@ class TestParser(unittest.TestCase):
         """
         node_ids = [nodes.BlockNode, nodes.AddNode, nodes.PosNode,
                     nodes.IntLNode, nodes.IntLNode]
-        node = Parser('block').run_parser('{-1 + 2;}')
+        node = Parser('block').parse_source('{-1 + 2;}')
         self.check_ast(node, node_ids, 0)
 
     def test_unary_expr_prefix(self):
         """Test the unary expression where a minus sign prefixes the literal.
         """
         node_ids = [nodes.BlockNode, nodes.PosNode, nodes.IntLNode]
-        node = Parser('block').run_parser('{-1;}')
+        node = Parser('block').parse_source('{-1;}')
         self.check_ast(node, node_ids, 0)
 
     def test_unary_expr_inc_prefix(self):
@@ -419,7 +430,7 @@ class TestParser(unittest.TestCase):
         literal.
         """
         node_ids = [nodes.BlockNode, nodes.IncNode, nodes.IntLNode]
-        node = Parser('block').run_parser('{++1;}')
+        node = Parser('block').parse_source('{++1;}')
         self.check_ast(node, node_ids, 0)
 
     def test_unary_expr_dec_suffix(self):
@@ -427,7 +438,7 @@ class TestParser(unittest.TestCase):
         unary expression.
         """
         node_ids = [nodes.BlockNode, nodes.IncNode, nodes.IntLNode]
-        node = Parser('block').run_parser('{1--;}')
+        node = Parser('block').parse_source('{1--;}')
         self.check_ast(node, node_ids, 0)
 
     def test_paran(self):
@@ -437,36 +448,199 @@ class TestParser(unittest.TestCase):
         node_ids = [nodes.BlockNode, nodes.MulNode, nodes.MulNode,
                     nodes.IdNode, nodes.AddNode, nodes.IdNode, nodes.IdNode,
                     nodes.AddNode, nodes.IdNode, nodes.IdNode]
-        node = Parser('block').run_parser('{x * (y + z) * (y - x);}')
+        node = Parser('block').parse_source('{x * (y + z) * (y - x);}')
         self.check_ast(node, node_ids, 0)
 
     def test_method_call_long(self):
         """Test a call to a method in another class parses."""
         node_ids = [nodes.BlockNode, nodes.MethodCallLongNode, nodes.IdNode,
                     nodes.IdNode, nodes.EmptyNode]
-        node = Parser('block').run_parser('{x.y();}')
+        node = Parser('block').parse_source('{x.y();}')
         self.check_ast(node, node_ids, 0)
 
     def test_method_call_super(self):
         """Test a call to a method in the super class."""
         node_ids = [nodes.BlockNode, nodes.MethodCallSuperNode, nodes.IdNode,
                     nodes.ArgsListNode, nodes.IdNode]
-        node = Parser('block').run_parser('{super.y(x);}')
+        node = Parser('block').parse_source('{super.y(x);}')
         self.check_ast(node, node_ids, 0)
 
     def test_field_ref(self):
         """Test a reference to a field in another class."""
         node_ids = [nodes.BlockNode, nodes.FieldRefNode, nodes.IdNode,
                     nodes.IdNode]
-        node = Parser('block').run_parser('{x.y;}')
+        node = Parser('block').parse_source('{x.y;}')
         self.check_ast(node, node_ids, 0)
 
     def test_field_ref_super(self):
         """Test a reference to a field in the super class."""
         node_ids = [nodes.BlockNode, nodes.FieldRefSuperNode, nodes.IdNode]
-        node = Parser('block').run_parser('{super.y;}')
+        node = Parser('block').parse_source('{super.y;}')
         self.check_ast(node, node_ids, 0)
 
+    def test_benchmark_kernels(self):
+        """Test each class of the runtime benchmark kernels parses."""
+        for kernel in KERNELS:
+            sources = kernel.get_sources(kernel.sizes[0])
+            for class_name, source in sources.items():
+                asts = Parser('file').parse_source(source)
+                self.assertEqual(asts[0].children[0].value, class_name)
+
+    def test_compact_nodes(self):
+        """Test the nodes of a parsed AST have no attribute dictionaries, and
+        their children are frozen into tuples.
+        """
+        to_visit = list(Parser('block').parse_source('{x.y(z + 1);}'))
+        while to_visit:
+            node = to_visit.pop()
+            self.assertFalse(hasattr(node, '__dict__'))
+            if not node.is_leaf:
+                self.assertTrue(isinstance(node.children, tuple))
+                to_visit.extend(node.children)
+
+    def test_token_stream(self):
+        """Test the scanner records the kind and offset of each token, and
+        shares the strings of identifiers with the same name.
+        """
+        tokens = Scanner().tokenize('ab = ab;')
+        self.assertEqual([token.name for token in tokens],
+                         ['ID', 'ASSIGN_OP', 'ID', ';'])
+        self.assertEqual([tokens.get_offset(i) for i in range(len(tokens))],
+                         [0, 3, 5, 7])
+        self.assertTrue(tokens[0].attr is tokens[2].attr)
+
+    def test_links_released(self):
+        """Test the parser does not keep the links between Earley items
+        once the AST has been built.
+        """
+        parser = Parser('block')
+        parser.parse_source('{x = y + z;}')
+        self.assertEqual(parser.links, {})
+
+    def test_long_block(self):
+        """Test a block of 10,000 statements parses without exceeding the
+        recursion limit.
+        """
+        node = Parser('block').parse_source('{' + 'x = 1;' * 10000 + '}')
+        self.assertEqual(len(node[0].children), 10000)
+
+    def test_deep_expr(self):
+        """Test an expression nested 1,000 deep parses without exceeding the
+        recursion limit.
+        """
+        source = '{x = ' + '(y + ' * 1000 + 'y' + ')' * 1000 + ';}'
+        node = Parser('block').parse_source(source)[0].children[0]
+        depth = 0
+        while not node.is_leaf:
+            node = node.children[-1]
+            depth += 1
+        # The assignment, then an addition for each level
+        self.assertEqual(depth, 1001)
+
+    def test_lookahead_filter(self):
+        """Test filtering Earley items by the next token builds the same
+        AST from fewer items.
+        """
+        source = '{x = y * (z + 1); y = x.f(z, 2); return y;}'
+        parser = Parser('block')
+        filtered = parser.parse_source(source)
+        num_items = parser.num_items
+        parser.first = None
+        unfiltered = parser.parse_source(source)
+        self.assertTrue(num_items < parser.num_items)
+        to_visit = [(filtered[0], unfiltered[0])]
+        while to_visit:
+            node, other = to_visit.pop()
+            self.assertEqual(type(node), type(other))
+            self.assertEqual(node.value, other.value)
+            if not node.is_leaf:
+                to_visit.extend(zip(node.children, other.children))
+
+    def test_lalr_backend(self):
+        """Test the LALR(1) parser builds the same AST as the Earley parser,
+        including for members with modifiers and arrays of a class type.
+        """
+        source = ('class A { private static int x; static A[] f(int[] y) ' +
+                  '{ A[] z = new A[2]; y[0] = x * (y[1] + 1); return z; } }')
+        lalr_ast = Parser('file', 'lalr').parse_source(source)
+        earley_ast = Parser('file').parse_source(source)
+        self.assertTrue(nodes.same_ast(lalr_ast, earley_ast))
+        # Also raises an error if they differ
+        Parser('file', 'check').parse_source(source)
+
+    def test_lalr_fallback(self):
+        """Test input reaching a conflict in the LALR(1) tables is parsed by
+        the Earley parser instead.
+        """
+        source = '{matrix A = |2, 2|; A|0, 1| = 1;}'
+        lalr_ast = Parser('block', 'lalr').parse_source(source)
+        earley_ast = Parser('block').parse_source(source)
+        self.assertTrue(nodes.same_ast(lalr_ast, earley_ast))
+
+    def test_hybrid_backend(self):
+        """Test the expressions parsed by precedence climbing build the same
+        AST as when the whole file is parsed by the Earley parser.
+        """
+        source = ('class A { int f(int[] a, matrix M) { int x = -a[0] * ' +
+                  '(a[1] + 2) / 3; M|x, 1| = x++ - A.g(x, !true) / 2; ' +
+                  'if (x < 2 && x != 1 || M|0, 0| >= 0) { return ' +
+                  'super.f(new int[x][2], |2, 3|); } return x; } }')
+        # Every expression is parsed by precedence climbing, except those
+        # with matrix elements, which are left for the grammar
+        tokens, num_exprs = replace_exprs(Scanner().tokenize(source))
+        self.assertEqual(num_exprs, 3)
+        hybrid_ast = Parser('file', 'hybrid').parse_source(source)
+        earley_ast = Parser('file').parse_source(source)
+        self.assertTrue(nodes.same_ast(hybrid_ast, earley_ast))
+        Parser('file', 'check').parse_source(source)
+        # '||' after an identifier may open a matrix element instead
+        source = ('class A { int g(matrix M, int x, int a) { ' +
+                  'return f(M||x, x| || a, x|); } }')
+        tokens, num_exprs = replace_exprs(Scanner().tokenize(source))
+        self.assertEqual(num_exprs, 0)
+        hybrid_ast = Parser('file', 'hybrid').parse_source(source)
+        earley_ast = Parser('file').parse_source(source)
+        self.assertTrue(nodes.same_ast(hybrid_ast, earley_ast))
+        Parser('file', 'check').parse_source(source)
+
+    def test_dump_ast(self):
+        """Test an AST too deep to pickle is serialised and loaded again
+        with the same nodes.
+        """
+        source = '{x = ' + '(y + ' * 1000 + 'y' + ')' * 1000 + ';}'
+        ast = Parser('block').parse_source(source)[0]
+        self.assertTrue(nodes.same_ast(load_ast(dump_ast(ast)), ast))
+
+    def test_parse_file(self):
+        """Test a file, which is memory mapped, is parsed to the same AST as
+        its source.
+        """
+        path = os.path.join(self._test_file_dir, 'test_extends_pass.jml')
+        in_file = open(path)
+        source = in_file.read()
+        in_file.close()
+        file_ast = Parser('file').parse_file(path)[0]
+        source_ast = Parser('file').parse_source(source)[0]
+        self.assertTrue(nodes.same_ast(file_ast, source_ast))
+
+    def test_lazy_loading(self):
+        """Test referenced classes are only parsed for their signatures when
+        loading lazily, until their bodies are loaded.
+        """
+        path = os.path.join(self._test_file_dir,
+                            'test_method_call_external_pass.jml')
+        parser = Parser('file')
+        asts = parser.parse_file(path, lazy = True)
+        self.assertEqual(len(asts), 1)
+        self.assertEqual(len(asts.signature_asts), 1)
+        method = asts.signature_asts[0].children[3].children[0]
+        self.assertTrue(isinstance(method.children[3], nodes.EmptyNode))
+        name = 'test_method_call_external_pass2'
+        self.assertEqual(parser.load_bodies(asts, [name]), [])
+        self.assertEqual(asts.signature_asts, [])
+        self.assertTrue(nodes.same_ast(list(asts),
+                                       list(Parser('file').parse_file(path))))
+
     def check_ast(self, nodel, node_types, index):
         """Checks the ast against the node ids provided.
         node is the current root of the tree.
@@ -2,10 +2,31 @@
 represent the lexical tokens as.
 """
 import re
+from array import array
 from spark import GenericScanner
 
+# The kinds of token, indexed by the codes they are stored as.  EXPR is
+# never scanned; it stands for an expression already parsed into its AST
+KINDS = ['IF', 'ELSE', 'WHILE', 'FOR', 'NEW', 'RETURN', 'CLASS', 'VOID',
+         'EXTENDS', 'INTERFACE', 'IMPLEMENTS', 'ABSTRACT', 'FINAL', 'STATIC',
+         'PRIVATE', 'SUPER', 'TYPE', 'ID', 'STR_L', 'CHAR_L', 'FLOAT_L',
+         'DOUBLE_L', 'LONG_L', 'INT_L', 'NULL_L', 'TRUE_L', 'FALSE_L',
+         'ASSIGN_OP', 'NOT_OP', 'EQ_OP', 'AND_OP', 'REL_OP', 'INC_OP',
+         'ADD_OP', 'MUL_OP', '(', ')', '[', ']', '{', '}', ',', '.', ';', '|',
+         'EXPR']
+KIND_CODES = dict((kind, code) for code, kind in enumerate(KINDS))
+
+class ParseError(SystemExit):
+    """Raised on a lexical or syntax error in a program, with a message
+    saying where it is.  It is a SystemExit, so a compile run from the
+    command line still stops at it.
+    """
+    pass
+
 class Token(object):
     """A class to represent the tokens the scanner identifies."""
+    __slots__ = ('_name', '_attr')
+
     def __init__(self, name, attr=None):
         """Initialise the name of the token i.e. what lexical token it
         actually corresponds to, and the attribute if any.  For literals and
@@ -38,6 +59,46 @@ class Token(object):
     name = property(_get_name, _set_name)
     attr = property(_get_attr, _set_attr)
 
+class TokenStream(object):
+    """The tokens of a source file, stored compactly as parallel arrays of
+    kind codes and source offsets.  The attributes of the tokens which have
+    them are held in a side table indexed by position.  A Token is only
+    created when one is indexed, so the parser can recognise the input from
+    the kind codes alone.
+    """
+    __slots__ = ('_kinds', '_offsets', '_attrs')
+
+    def __init__(self):
+        self._kinds = array('B')
+        self._offsets = array('l')
+        self._attrs = dict()
+
+    def append(self, kind, offset, attr=None):
+        """Add a token of a kind, found at an offset in the source."""
+        if attr is not None:
+            self._attrs[len(self._kinds)] = attr
+        self._kinds.append(KIND_CODES[kind])
+        self._offsets.append(offset)
+
+    def get_offset(self, index):
+        """Get the offset in the source of the token at an index."""
+        return self._offsets[index]
+
+    def get_attr(self, index):
+        """Get the attribute of the token at an index, if it has one."""
+        return self._attrs.get(index)
+
+    def __len__(self):
+        return len(self._kinds)
+
+    def __getitem__(self, index):
+        return Token(KINDS[self._kinds[index]], self.get_attr(index))
+
+    def _get_kinds(self):
+        return self._kinds
+
+    kinds = property(_get_kinds)
+
 class Scanner(GenericScanner):
     """The scanner is the lexical analyser component which uses regular
     expressions to group the input into tokens.
@@ -46,9 +107,29 @@ class Scanner(GenericScanner):
         GenericScanner.__init__(self)
 
     def tokenize(self, input_):
-        self.rv = []
+        """Scan the input, which can be a string or any buffer, such as a
+        memory mapped file, into a token stream.  The tokens are matched in
+        the input in place and added to the stream as they are found, so the
+        input is never copied.
+        """
+        self.rv = TokenStream()
         GenericScanner.tokenize(self, input_)
-        return self.rv
+        tokens = self.rv
+        # Don't keep the tokens or the input alive once scanned
+        self.rv = self.string = None
+        return tokens
+
+    def error(self, s, pos):
+        raise ParseError('Lexical error at position %s' % pos)
+
+    def t_default(self, s):
+        r'( . | \n )+'
+        # Matches the rest of the input when no token does
+        self.error(s, self.pos - len(s))
+
+    def _add_token(self, s, kind, attr=None):
+        # The position has already been moved past the matched text
+        self.rv.append(kind, self.pos - len(s), attr)
 
     def _convert_rel_op(self, op_str):
         if op_str == '<' or op_str == '>':
@@ -64,54 +145,44 @@ class Scanner(GenericScanner):
 
     def t_if(self, s):
         r'if'
-        t = Token('IF')
-        self.rv.append(t)
+        self._add_token(s, 'IF')
 
     def t_else(self, s):
         r'else'
-        t = Token('ELSE')
-        self.rv.append(t)
+        self._add_token(s, 'ELSE')
 
     def t_while(self, s):
         r'while'
-        t = Token('WHILE')
-        self.rv.append(t)
+        self._add_token(s, 'WHILE')
 
     def t_for(self, s):
         r'for'
-        t = Token('FOR')
-        self.rv.append(t)
+        self._add_token(s, 'FOR')
 
     def t_new(self, s):
         r'new'
-        t = Token('NEW')
-        self.rv.append(t)
+        self._add_token(s, 'NEW')
 
     def t_return(self, s):
         r'return'
-        t = Token('RETURN')
-        self.rv.append(t)
+        self._add_token(s, 'RETURN')
 
     def t_class(self, s):
         r'class'
-        t = Token('CLASS')
-        self.rv.append(t)
+        self._add_token(s, 'CLASS')
 
     def t_void(self, s):
         r'void'
-        t = Token('VOID')
-        self.rv.append(t)
+        self._add_token(s, 'VOID')
 
     def t_str_l(self, s):
         r'"([^"]*)"'
-        t = Token('STR_L', eval(s))
-        self.rv.append(t)
+        self._add_token(s, 'STR_L', eval(s))
 
     def t_char_l(self, s):
         r"'.'"
         # eval() will evaluate a string, so removes the ''
-        t = Token('CHAR_L', ord(eval(s)))
-        self.rv.append(t)
+        self._add_token(s, 'CHAR_L', ord(eval(s)))
 
     def t_double_float_l(self, s):
         # Doubles and floats must be in one rule because otherwise the regex
@@ -121,72 +192,72 @@ class Scanner(GenericScanner):
         # First check for a float
         if s.find('f') != -1 or s.find('F') != -1:
             attr = re.sub('f|F', '', s)
-            t = Token('FLOAT_L', float(attr))
+            kind, attr = 'FLOAT_L', float(attr)
         else:
             attr = re.sub('d|D', '', s)
-            t = Token('DOUBLE_L', float(attr))
-        self.rv.append(t)
+            kind, attr = 'DOUBLE_L', float(attr)
+        self._add_token(s, kind, attr)
 
     def t_long_l(self, s):
         r'\b\d+(l|L)\b'
         attr = re.sub('l|L', '', s)
-        t = Token('LONG_L', long(attr))
-        self.rv.append(t)
+        self._add_token(s, 'LONG_L', long(attr))
 
     def t_int_l(self, s):
         r'\b\d+\b'
-        t = Token('INT_L', int(s))
-        self.rv.append(t)
+        self._add_token(s, 'INT_L', int(s))
 
     def t_text(self, s):
         r'\b[a-zA-Z_][a-zA-Z0-9_]*\b'
         # check for reserved words
         if s in ['char', 'byte', 'short', 'int', 'long', 'float',
              'double', 'boolean', 'matrix']:
-            t = Token('TYPE', s)
+            kind, attr = 'TYPE', intern(s)
         elif s == 'null':
-            t = Token('NULL_L', None)
+            kind, attr = 'NULL_L', None
         elif s == 'true':
-            t = Token('TRUE_L', True)
+            kind, attr = 'TRUE_L', True
         elif s == 'false':
-            t = Token('FALSE_L', False)
+            kind, attr = 'FALSE_L', False
         elif s == 'if':
-            t = Token('IF')
+            kind, attr = 'IF', None
         elif s == 'else':
-            t = Token('ELSE')
+            kind, attr = 'ELSE', None
         elif s == 'while':
-            t = Token('WHILE')
+            kind, attr = 'WHILE', None
         elif s == 'for':
-            t = Token('FOR')
+            kind, attr = 'FOR', None
         elif s == 'new':
-            t = Token('NEW')
+            kind, attr = 'NEW', None
         elif s == 'return':
-            t = Token('RETURN')
+            kind, attr = 'RETURN', None
         elif s == 'class':
-            t = Token('CLASS')
+            kind, attr = 'CLASS', None
         elif s == 'extends':
-            t = Token('EXTENDS')
+            kind, attr = 'EXTENDS', None
         elif s == 'interface':
-            t = Token('INTERFACE')
+            kind, attr = 'INTERFACE', None
         elif s == 'implements':
-            t = Token('IMPLEMENTS')
+            kind, attr = 'IMPLEMENTS', None
         elif s == 'abstract':
-            t = Token('ABSTRACT')
+            kind, attr = 'ABSTRACT', None
         elif s == 'final':
-            t = Token('FINAL')
+            kind, attr = 'FINAL', None
         elif s == 'static':
-            t = Token('STATIC')
+            kind, attr = 'STATIC', None
         elif s == 'private':
-            t = Token('PRIVATE')
+            kind, attr = 'PRIVATE', None
         elif s == 'super':
-            t = Token('SUPER')
+            kind, attr = 'SUPER', None
 #        elif s == 'this':
-#            t = Token('THIS')
+#            kind, attr = 'THIS', None
         elif s == 'void':
-            t = Token('VOID')
+            kind, attr = 'VOID', None
         else:
-            t = Token('ID', s)
-        self.rv.append(t)
+            # The same names are used many times, so they are interned to
+            # be shared by the tokens, nodes and symbols holding them
+            kind, attr = 'ID', intern(s)
+        self._add_token(s, kind, attr)
 
     ###########################################################################
     # These have to be grouped together because the regex engine is greedy,
@@ -198,44 +269,39 @@ class Scanner(GenericScanner):
     def t_assign_eq_not_op(self, s):
         r'==|!=|=|!'
         if s == '=':
-            t = Token('ASSIGN_OP')
+            kind, attr = 'ASSIGN_OP', None
         elif s == '!':
-            t = Token('NOT_OP')
+            kind, attr = 'NOT_OP', None
         else:
-            t = Token('EQ_OP', s)
-        self.rv.append(t)
+            kind, attr = 'EQ_OP', s
+        self._add_token(s, kind, attr)
 
     def t_and_op(self, s):
         r'&&'
-        t = Token('AND_OP')
-        self.rv.append(t)
+        self._add_token(s, 'AND_OP')
 
     def t_rel_op(self, s):
         r'(<|>)(\s*=)?'
-        t = Token('REL_OP', self._convert_rel_op(s))
-        self.rv.append(t)
+        self._add_token(s, 'REL_OP', self._convert_rel_op(s))
 
     # These must be grouped into one method for the same reasons as outlined
     # for the t_assign_eq_not_op method
     def t_add_op(self, s):
         r'\+\+|--|\+|-'
         if s in ['++', '--']:
-            t = Token('INC_OP', s)
+            kind, attr = 'INC_OP', s
         else:
-            t = Token('ADD_OP', s)
-        self.rv.append(t)
+            kind, attr = 'ADD_OP', s
+        self._add_token(s, kind, attr)
 
     def t_mul_op(self, s):
         r'\*|/'
-        t = Token('MUL_OP', s)
-        self.rv.append(t)
+        self._add_token(s, 'MUL_OP', s)
 
     def t_brackets(self, s):
         r'\(|\)|\[|\]|\{|\}'
-        t = Token(s)
-        self.rv.append(t)
+        self._add_token(s, s)
 
     def t_punct(self, s):
         r',|\.|;|\||\|'
-        t = Token(s)
-        self.rv.append(t)
\ No newline at end of file
+        self._add_token(s, s)
\ No newline at end of file
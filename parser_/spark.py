@@ -118,6 +118,7 @@ class GenericParser:
 		self.collectRules()
 		self.augment(start)
 		self.ruleschanged = 1
+		self.first = None
 
 	_NULLABLE = '\e_'
 	_START = 'START'
@@ -170,6 +171,7 @@ class GenericParser:
 		self.augment(start)
 		D['rule2func'] = self.rule2func
 		D['makeSet'] = self.makeSet_fast
+		D.setdefault('first', None)
 		self.__dict__ = D
 
 	#
@@ -304,6 +306,88 @@ class GenericParser:
 	def typestring(self, token):
 		return None
 
+	def computeFirst(self):
+		#
+		#  The terminals an item of each state can go on with, None
+		#  standing for the end of the input.  For a state of
+		#  predictions, this is the FIRST set of every rule it
+		#  predicts.  A kernel state adds the terminals it shifts,
+		#  and the FOLLOW set of each rule it completes.
+		#  makeSet_fast only adds an item to an Earley set when the
+		#  token there is in its state's set.  Needs the whole state
+		#  machine to have been built, and typestring() to be
+		#  defined.
+		#
+		first, follow = {}, {}
+		for lhs in self.newrules.keys():
+			first[lhs], follow[lhs] = {}, {}
+		follow[self._START][None] = 1
+		changes = 1
+		while changes:
+			changes = 0
+			for rulelist in self.newrules.values():
+				for lhs, rhs in rulelist:
+					syms = []
+					for sym in rhs:
+						if not self.isnullable(sym):
+							syms.append(sym)
+					#
+					#  Nullable symbols only derive the empty
+					#  string, so the others are all that can
+					#  start or follow anything.
+					#
+					for j in range(len(syms)):
+						sym = syms[j]
+						if j == 0:
+							changes = self.addFirst(
+								first[lhs], sym,
+								first) or changes
+						if not follow.has_key(sym):
+							continue
+						if j+1 < len(syms):
+							changes = self.addFirst(
+								follow[sym],
+								syms[j+1],
+								first) or changes
+						else:
+							changes = self.addAll(
+								follow[sym],
+								follow[lhs]) or changes
+
+		self.first = {}
+		for (stateno, sym), nk in self.edges.items():
+			if sym is None:
+				self.first[nk] = frozenset(self.states[nk].T)
+		for stateno, state in self.states.items():
+			if self.first.has_key(stateno):
+				continue
+			expect = state.T[:]
+			nk = self.edges.get((stateno, None), None)
+			if nk is not None:
+				expect.extend(self.states[nk].T)
+			for lhs, rhs in state.complete:
+				expect.extend(follow[lhs].keys())
+			self.first[stateno] = frozenset(expect)
+
+	def addFirst(self, set, sym, first):
+		if first.has_key(sym):
+			return self.addAll(set, first[sym])
+		if set.has_key(sym):
+			return 0
+		set[sym] = 1
+		return 1
+
+	def addAll(self, set, other):
+		changed = 0
+		for sym in other.keys():
+			if not set.has_key(sym):
+				set[sym] = 1
+				changed = 1
+		return changed
+
+	def tokenkinds(self, tokens):
+		return tokens
+
 	def error(self, token):
 		print "Syntax error at or near `%s' token" % token
 		raise SystemExit
@@ -322,27 +406,44 @@ class GenericParser:
 			self.states = { 0: self.makeState0() }
 			self.makeState(0, self._BOF)
 
+		kinds = self.tokenkinds(tokens)
 		for i in xrange(len(tokens)):
 			sets.append([])
 
 			if sets[i] == []:
 				break				
-			self.makeSet(tokens[i], sets, i)
+			if i+1 < len(tokens):
+				self.makeSet(kinds[i], sets, i, kinds[i+1])
+			else:
+				self.makeSet(kinds[i], sets, i)
 		else:
 			sets.append([])
 			self.makeSet(None, sets, len(tokens))
 
+		# The size of the recognition, for profiling
+		self.num_sets = len(sets)
+		self.num_items = sum(map(len, sets))
+
 		#_dump(tokens, sets, self.states)
 
 		finalitem = (self.finalState(tokens), 0)
 		if finalitem not in sets[-2]:
+			self.links = {}
 			if len(tokens) > 0:
 				self.error(tokens[i-1])
 			else:
 				self.error(None)
 
-		return self.buildTree(self._START, finalitem,
-				      tokens, len(sets)-2)
+		#
+		#  Only the links are needed to build the tree, so the sets
+		#  are dropped first, and the links once it has been built.
+		#
+		k = len(sets)-2
+		del sets
+		try:
+			return self.buildTree(self._START, finalitem, tokens, k)
+		finally:
+			self.links = {}
 
 	def isnullable(self, sym):
 		#
@@ -473,12 +574,22 @@ class GenericParser:
 				set.append(item)
 		else:
 			key = (item, i)
+			link = (predecessor, causal)
+			#
+			#  Most items have a single link, which is stored on
+			#  its own; a list is only made for those with more.
+			#
 			if item not in set:
-				self.links[key] = []
+				self.links[key] = link
 				set.append(item)
-			self.links[key].append((predecessor, causal))
+			else:
+				links = self.links[key]
+				if type(links) is list:
+					links.append(link)
+				else:
+					self.links[key] = [links, link]
 
-	def makeSet(self, token, sets, i):
+	def makeSet(self, token, sets, i, lookahead=None):
 		cur, next = sets[i], sets[i+1]
 
 		ttype = token is not None and self.typestring(token) or None
@@ -515,34 +626,51 @@ class GenericParser:
 						if nk is not None:
 							self.add(cur, (nk, i))
 
-	def makeSet_fast(self, token, sets, i):
+	def makeSet_fast(self, token, sets, i, lookahead=None):
 		#
 		#  Call *only* when the entire state machine has been built!
 		#  It relies on self.edges being filled in completely, and
 		#  then duplicates and inlines code to boost speed at the
 		#  cost of extreme ugliness.
 		#
+		#  If computeFirst() has been called, items are skipped
+		#  unless they can go on with the token of the set they
+		#  would be added to; the lookahead is None at the end of
+		#  the input.
+		#
 		cur, next = sets[i], sets[i+1]
 		ttype = token is not None and self.typestring(token) or None
+		first = self.first
+		if first is not None:
+			ltype = lookahead is not None and \
+				self.typestring(lookahead) or None
 
 		for item in cur:
 			ptr = (item, i)
 			state, parent = item
 			if ttype is not None:
 				k = self.edges.get((state, ttype), None)
-				if k is not None:
+				if k is not None and (first is None or
+						      ltype in first[k]):
 					#self.add(next, (k, parent), i+1, ptr)
 					#INLINED --v
 					new = (k, parent)
 					key = (new, i+1)
 					if new not in next:
-						self.links[key] = []
+						self.links[key] = (ptr, None)
 						next.append(new)
-					self.links[key].append((ptr, None))
+					else:
+						links = self.links[key]
+						if type(links) is list:
+							links.append((ptr, None))
+						else:
+							self.links[key] = [links,
+									   (ptr, None)]
 					#INLINED --^
 					#nk = self.goto(k, None)
 					nk = self.edges.get((k, None), None)
-					if nk is not None:
+					if nk is not None and (first is None or
+							       ltype in first[nk]):
 						#self.add(next, (nk, i+1))
 						#INLINED --v
 						new = (nk, i+1)
@@ -568,7 +696,8 @@ class GenericParser:
 					pstate, pparent = pitem
 					#k = self.goto(pstate, lhs)
 					k = self.edges.get((pstate, lhs), None)
-					if k is not None:
+					if k is not None and (first is None or
+							      ttype in first[k]):
 						why = (item, i, rule)
 						pptr = (pitem, parent)
 						#self.add(cur, (k, pparent),
@@ -577,13 +706,20 @@ class GenericParser:
 						new = (k, pparent)
 						key = (new, i)
 						if new not in cur:
-							self.links[key] = []
+							self.links[key] = (pptr, why)
 							cur.append(new)
-						self.links[key].append((pptr, why))
+						else:
+							links = self.links[key]
+							if type(links) is list:
+								links.append((pptr, why))
+							else:
+								self.links[key] = [links,
+										   (pptr, why)]
 						#INLINED --^
 						#nk = self.goto(k, None)
 						nk = self.edges.get((k, None), None)
-						if nk is not None:
+						if nk is not None and (first is None or
+								       ttype in first[nk]):
 							#self.add(cur, (nk, i))
 							#INLINED --v
 							new = (nk, i)
@@ -592,13 +728,19 @@ class GenericParser:
 							#INLINED --^
 
 	def predecessor(self, key, causal):
-		for p, c in self.links[key]:
+		links = self.links[key]
+		if type(links) is not list:
+			assert links[1] == causal
+			return links[0]
+		for p, c in links:
 			if c == causal:
 				return p
 		assert 0
 
 	def causal(self, key):
 		links = self.links[key]
+		if type(links) is not list:
+			return links[1]
 		if len(links) == 1:
 			return links[0][1]
 		choices = []
@@ -609,7 +751,15 @@ class GenericParser:
 			rule2cause[rule] = c
 		return rule2cause[self.ambiguity(choices)]
 
-	def deriveEpsilon(self, nt):
+	#
+	#  deriveEpsilon and buildTree use an explicit stack of frames
+	#  rather than recursing, so that very long or deeply nested
+	#  input doesn't exceed the recursion limit.  A frame is a list
+	#  of the rule, its attributes, and the index of the next
+	#  attribute to fill in, from the right; buildTree's frames also
+	#  hold the item and position reached.
+	#
+	def epsilonFrame(self, nt):
 		if len(self.newrules[nt]) > 1:
 			rule = self.ambiguity(self.newrules[nt])
 		else:
@@ -617,13 +767,26 @@ class GenericParser:
 		#print rule
 
 		rhs = rule[1]
-		attr = [None] * len(rhs)
+		return [rule, [None] * len(rhs), len(rhs)-1]
 
-		for i in range(len(rhs)-1, -1, -1):
-			attr[i] = self.deriveEpsilon(rhs[i])
-		return self.rule2func[self.new2old[rule]](attr)
+	def deriveEpsilon(self, nt):
+		stack = [self.epsilonFrame(nt)]
+		while 1:
+			frame = stack[-1]
+			rule, attr, i = frame
+			if i >= 0:
+				stack.append(self.epsilonFrame(rule[1][i]))
+				continue
 
-	def buildTree(self, nt, item, tokens, k):
+			value = self.rule2func[self.new2old[rule]](attr)
+			stack.pop()
+			if not stack:
+				return value
+			parent = stack[-1]
+			parent[1][parent[2]] = value
+			parent[2] = parent[2] - 1
+
+	def treeFrame(self, nt, item, k):
 		state, parent = item
 
 		choices = []
@@ -636,25 +799,45 @@ class GenericParser:
 		#print rule
 
 		rhs = rule[1]
-		attr = [None] * len(rhs)
+		return [rule, [None] * len(rhs), len(rhs)-1, item, k]
 
-		for i in range(len(rhs)-1, -1, -1):
-			sym = rhs[i]
-			if not self.newrules.has_key(sym):
-				if sym != self._BOF:
-					attr[i] = tokens[k-1]
+	def buildTree(self, nt, item, tokens, k):
+		stack = [self.treeFrame(nt, item, k)]
+		while 1:
+			frame = stack[-1]
+			rule, attr, i, item, k = frame
+			rhs = rule[1]
+			while i >= 0:
+				sym = rhs[i]
+				if not self.newrules.has_key(sym):
+					if sym != self._BOF:
+						attr[i] = tokens[k-1]
+						key = (item, k)
+						item, k = self.predecessor(key, None)
+				#elif self.isnullable(sym):
+				elif self._NULLABLE == sym[0:len(self._NULLABLE)]:
+					attr[i] = self.deriveEpsilon(sym)
+				else:
+					#
+					#  Build the subtree first, resuming this
+					#  frame from before it afterwards.
+					#
 					key = (item, k)
-					item, k = self.predecessor(key, None)
-			#elif self.isnullable(sym):
-			elif self._NULLABLE == sym[0:len(self._NULLABLE)]:
-				attr[i] = self.deriveEpsilon(sym)
+					why = self.causal(key)
+					pitem, pk = self.predecessor(key, why)
+					frame[2:] = [i, pitem, pk]
+					stack.append(self.treeFrame(sym, why[0],
+								    why[1]))
+					break
+				i = i - 1
 			else:
-				key = (item, k)
-				why = self.causal(key)
-				attr[i] = self.buildTree(sym, why[0],
-							 tokens, why[1])
-				item, k = self.predecessor(key, why)
-		return self.rule2func[self.new2old[rule]](attr)
+				value = self.rule2func[self.new2old[rule]](attr)
+				stack.pop()
+				if not stack:
+					return value
+				parent = stack[-1]
+				parent[1][parent[2]] = value
+				parent[2] = parent[2] - 1
 
 	def ambiguity(self, rules):
 		#
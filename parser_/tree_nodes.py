@@ -6,6 +6,15 @@ class ProgramASTs(list):
     """An outer class to hold all the ASTs making up a program."""
     def __init__(self):
         """Initialises the current indent to 0."""
+        # Maps the name of each class to the names of the JaML classes it
+        # refers to
+        self._refs = dict()
+        # Maps the name of each class parsed from a file to the hash of its
+        # source, if the ASTs are cached
+        self._source_hashes = dict()
+        # The ASTs of the classes parsed without their method bodies, which
+        # are only used for their signatures
+        self._signature_asts = []
 
     def __str__(self):
         """Prints out the ASTs in a nice way."""
@@ -30,18 +39,34 @@ class ProgramASTs(list):
         val_str = 'VALUE: ' + str(node.value)
         type_str = 'TYPE: ' + str(node._type)
         out +=  node_str + ' | ' + val_str + ' | ' + type_str + '\r\n'
-        try:
+        if not node.is_leaf:
             # Increase the indentation and print the child nodes
             indent += 1
             for child in node.children:
                 out += self._print_ast(child, indent)
-        except AttributeError:
-            # It's a child node
-            pass
         return out
 
+    def _get_refs(self):
+        return self._refs
+
+    def _get_source_hashes(self):
+        return self._source_hashes
+
+    def _get_signature_asts(self):
+        return self._signature_asts
+
+    refs = property(_get_refs)
+    source_hashes = property(_get_source_hashes)
+    signature_asts = property(_get_signature_asts)
+
 class TreeNode(object):
-    """A generic tree node class which holds what node_id the node is."""
+    """A generic tree node class which holds what node_id the node is.  Nodes
+    are made in large numbers, so they have slots rather than a dict; every
+    subclass must declare its own __slots__.  is_leaf tells leaf nodes, which
+    have no children attribute, from interior nodes.
+    """
+    __slots__ = ('_value', '_type')
+
     def __init__(self, value = ''):
         """Initialise with a node_id, e.g. "int" for an integer node."""
         self._value = value
@@ -61,6 +86,9 @@ class TreeNode(object):
 
 class InteriorNode(TreeNode):
     """An interior node of the AST tree."""
+    __slots__ = ('_children',)
+    is_leaf = False
+
     def __init__(self, value = ''):
         """Initialise with a node_id."""
         super(InteriorNode, self).__init__(value)
@@ -73,6 +101,13 @@ class InteriorNode(TreeNode):
     def add_children(self, children):
         self._children += children
 
+    def freeze(self):
+        """Store the child nodes in a tuple, which takes less memory than a
+        list.  Called once the node is complete, after which no more children
+        can be added.
+        """
+        self._children = tuple(self._children)
+
     def _get_children(self):
         """Get all the child nodes."""
         return self._children
@@ -83,6 +118,8 @@ class NodeWithModifiers(InteriorNode):
     """A node with modifiers, such as static, final etc. The modifiers
     parameter is a list of these modifiers.
     """
+    __slots__ = ('_modifiers',)
+
     def __init__(self):
         """Initialise the modifiers."""
         super(NodeWithModifiers, self).__init__()
@@ -97,22 +134,32 @@ class NodeWithModifiers(InteriorNode):
     modifiers = property(_get_modifiers, _set_modifiers)
 
 class ClassNode(NodeWithModifiers):
+    __slots__ = ()
+
     def __str__(self):
         return 'Class Node'
 
 class InterfaceNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Interface Node'
 
 class ImplementsListNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Implements List Node'
 
 class ClassBodyNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Class Body Node'
 
 class InterfaceBodyNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Interface Body Node'
 
@@ -121,6 +168,8 @@ class ClassAttributeNode(NodeWithModifiers):
     implement the __lt__ method, so that they can be sorted in such a way
     that they are in the same order as mentioned above.
     """
+    __slots__ = ('_order',)
+
     def __init__(self, order):
         super(ClassAttributeNode, self).__init__()
         self._order = order
@@ -134,6 +183,8 @@ class ClassAttributeNode(NodeWithModifiers):
     order = property(_get_order)
 
 class FieldDclNode(ClassAttributeNode):
+    __slots__ = ()
+
     def __init__(self):
         """Set the order to 0 - appears first."""
         super(FieldDclNode, self).__init__(0)
@@ -142,6 +193,8 @@ class FieldDclNode(ClassAttributeNode):
         return 'Field Declaration Node'
 
 class FieldDclAssignNode(ClassAttributeNode):
+    __slots__ = ()
+
     def __init__(self):
         """Set the order to 0 - appears first."""
         super(FieldDclAssignNode, self).__init__(0)
@@ -150,6 +203,8 @@ class FieldDclAssignNode(ClassAttributeNode):
         return 'Field Declaration Node, of Array Type'
 
 class ConstructorDclNode(ClassAttributeNode):
+    __slots__ = ()
+
     def __init__(self):
         """Set the order to 1 - appears second."""
         super(ConstructorDclNode, self).__init__(1)
@@ -158,6 +213,8 @@ class ConstructorDclNode(ClassAttributeNode):
         return 'Constructor Declaration Node'
 
 class MethodDclNode(ClassAttributeNode):
+    __slots__ = ()
+
     def __init__(self):
         """Set the order to 2 - appears last."""
         super(MethodDclNode, self).__init__(2)
@@ -166,6 +223,8 @@ class MethodDclNode(ClassAttributeNode):
         return 'Method Declaration Node'
 
 class MethodDclArrayNode(ClassAttributeNode):
+    __slots__ = ()
+
     def __init__(self):
         """Set the order to 2 - appears last."""
         super(MethodDclArrayNode, self).__init__(2)
@@ -174,211 +233,316 @@ class MethodDclArrayNode(ClassAttributeNode):
         return 'Method Declaration (Returns Array) Node'
 
 class AbsMethodDclNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Abstract Method Declaration Node'
 
 class AbsMethodDclArrayNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Abstract Method Declaration (Returns Array) Node'
 
 class ParamListNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Parameters List Node'
 
 class ParamDclNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Parameter Declaration Node'
 
 class BlockNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Block Node'
 
 class VarDclNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Variable Declaration Node'
 
 class VarDclAssignNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Variable Declaration with Assignment Node'
 
 class IfNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'If Node'
 
 class WhileNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'While Node'
 
 class ForNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'For Node'
 
 class ReturnNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Return Node'
 
 class AssignNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Assignment Node'
 
 class CondNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Conditional Expression Node'
 
 class EqNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Equality Expression Node'
 
 class RelNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Relational Expression Node'
 
 class AddNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Addition/Subtraction Node'
 
 class MulNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Multiplication/Division Node'
 
 class NotNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Boolean Not Node'
 
 class PosNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Positive/Negative Node'
 
 class IncNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Increment/Decrement Node'
 
 class ArrayDclNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Array Declaration Node'
 
 class ArrayElementNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Array Element Node'
 
 class MatrixElementNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Matrix Element Node'
 
 class MethodCallNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Method Call Node'
 
 class MethodCallLongNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Method Call Long Node'
 
 class MethodCallThisNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Method Call to "this" Node'
 
 class MethodCallSuperNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Method Call to "super" Node'
 
 class SuperConstructorCallNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Call to "supers" Constructor'
 
 class FieldRefNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Reference to a field'
 
 class FieldRefSuperNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Reference to a field of the Super Class'
 
 class ArgsListNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Arguments List Node'
 
 class ObjectCreatorNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Object Creator Node'
 
 class ArrayInitNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Array Initialisation Node'
 
 class MatrixInitNode(InteriorNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Matrix Initialisation Node'
 
-class LeafNode(TreeNode): pass
-
+class LeafNode(TreeNode):
+    """A leaf node of the AST tree, which has no children."""
+    __slots__ = ()
+    is_leaf = True
 
 class ExtendsNode(LeafNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Extends Node'
 
 class ImplementsNode(LeafNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Implements Node'
 
 class IdNode(LeafNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Identifier Node'
 
 class ArrayIdNode(LeafNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Array Identifier Node'
 
 class DimensionsNode(LeafNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Array Dimensions Node'
 
 class TypeNode(LeafNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Type Node'
 
 class ClassTypeNode(LeafNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Class Type Node'
 
 class ReturnVoidNode(LeafNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Return Void Node'
 
 class EmptyNode(LeafNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Empty Node'
 
-class LiteralNode(LeafNode): pass
+class LiteralNode(LeafNode):
+    __slots__ = ()
 
 class StringLNode(LiteralNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'String Literal Node'
 
 class CharLNode(LiteralNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Char Literal Node'
 
 class IntLNode(LiteralNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Int Literal Node'
 
 class LongLNode(LiteralNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Long Literal Node'
 
 class FloatLNode(LiteralNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Float Literal Node'
 
 class DoubleLNode(LiteralNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Double Literal Node'
 
 class BooleanLNode(LiteralNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Boolean Literal Node'
 
 class NullLNode(LiteralNode):
+    __slots__ = ()
+
     def __str__(self):
         return 'Null Literal Node'
 
@@ -397,4 +561,41 @@ def create_array_dcl(name, dimensions):
     node = ArrayDclNode()
     node.add_child(ArrayIdNode(name))
     node.add_child(DimensionsNode(dimensions))
-    return node
\ No newline at end of file
+    return node
+
+def freeze_ast(ast):
+    """Freeze every interior node in an AST, once it has been parsed."""
+    to_visit = [ast]
+    while to_visit:
+        node = to_visit.pop()
+        if not node.is_leaf:
+            node.freeze()
+            to_visit.extend(node.children)
+
+def same_ast(ast, other):
+    """Check two ASTs, or lists of them, have nodes of the same classes in
+    the same places, holding the same attributes.
+    """
+    to_visit = [(ast, other)]
+    while to_visit:
+        node, other = to_visit.pop()
+        if isinstance(node, list) and isinstance(other, list):
+            if len(node) != len(other):
+                return False
+            to_visit.extend(zip(node, other))
+            continue
+        if not isinstance(node, TreeNode):
+            if node != other:
+                return False
+            continue
+        if type(node) is not type(other):
+            return False
+        for class_ in type(node).__mro__:
+            for slot in getattr(class_, '__slots__', ()):
+                if slot == '_children':
+                    to_visit.append((list(node.children),
+                                     list(other.children)))
+                else:
+                    to_visit.append((getattr(node, slot),
+                                     getattr(other, slot)))
+    return True
@@ -0,0 +1,109 @@
+"""Module to run the compiler benchmarks, and compare the results with the
+stored baseline.  Exits with status 1 if any phase has become slower.  With
+--runtime, the runtime benchmarks are run instead, comparing the speed of the
+generated code with hand written Java.  With --memory, the memory taken by the
+ASTs of large programs is measured instead.
+
+Usage: run_benchmarks [options]
+"""
+import json
+import sys
+from optparse import OptionParser
+from benchmarks.harness import (run_benchmarks, load_baseline, save_baseline,
+                                compare, format_results, BASELINE_PATH)
+from benchmarks.memory import run_memory_benchmarks, format_memory_results
+from benchmarks.runtime import (run_runtime_benchmarks, format_runtime_results,
+                                write_runtime_results)
+
+if __name__ == '__main__':
+    usage = 'Usage: run_benchmarks [options]'
+    opt_parser = OptionParser(usage)
+    opt_parser.add_option('--offline', action = 'store_true',
+                          dest = 'offline', default = False,
+                          help = 'do not run the JVM: the programs make no ' +
+                          'library calls, and are not assembled')
+    opt_parser.add_option('--only', action = 'append', dest = 'only',
+                          default = [], metavar = 'NAME',
+                          help = 'only run the benchmark, or runtime ' +
+                          'kernel, NAME, can be given more than once')
+    opt_parser.add_option('--runtime', action = 'store_true',
+                          dest = 'runtime', default = False,
+                          help = 'run the runtime benchmarks, which need ' +
+                          'java and javac')
+    opt_parser.add_option('--memory', action = 'store_true',
+                          dest = 'memory', default = False,
+                          help = 'measure the memory taken by the ASTs of ' +
+                          'large programs')
+    opt_parser.add_option('--warmup-ms', type = 'int', dest = 'warmup_ms',
+                          default = 1000,
+                          help = 'how long each runtime kernel is run ' +
+                          'before being measured [default: %default]')
+    opt_parser.add_option('--measure-ms', type = 'int', dest = 'measure_ms',
+                          default = 2000,
+                          help = 'how long each runtime kernel is measured ' +
+                          'for [default: %default]')
+    opt_parser.add_option('--parser', type = 'choice', dest = 'parser',
+                          choices = ['earley', 'lalr', 'hybrid'],
+                          default = 'earley',
+                          help = 'the parser backend to compile with ' +
+                          '[default: %default]')
+    opt_parser.add_option('--repeats', type = 'int', dest = 'repeats',
+                          default = 3,
+                          help = 'the number of times each program is ' +
+                          'compiled [default: %default]')
+    opt_parser.add_option('--tolerance', type = 'float', dest = 'tolerance',
+                          default = 0.25,
+                          help = 'the fraction a phase can be slower than ' +
+                          'the baseline without being flagged ' +
+                          '[default: %default]')
+    opt_parser.add_option('--baseline', dest = 'baseline',
+                          default = BASELINE_PATH, metavar = 'FILE',
+                          help = 'the baseline file [default: %default]')
+    opt_parser.add_option('--save-baseline', action = 'store_true',
+                          dest = 'save_baseline', default = False,
+                          help = 'store the results as the new baseline')
+    opt_parser.add_option('--json', dest = 'json', default = None,
+                          metavar = 'FILE',
+                          help = 'write the results to FILE as JSON')
+    options, args = opt_parser.parse_args()
+    if options.runtime and options.offline:
+        opt_parser.error('the runtime benchmarks need the JVM')
+    print 'running benchmarks, this can take some time'
+    if options.memory:
+        results = run_memory_benchmarks()
+        print format_memory_results(results)
+        if options.json is not None:
+            out_file = open(options.json, 'w')
+            json.dump(results, out_file, indent = 1, sort_keys = True)
+            out_file.close()
+        sys.exit(0)
+    if options.runtime:
+        results = run_runtime_benchmarks(options.only, options.warmup_ms,
+                                         options.measure_ms)
+        print format_runtime_results(results)
+        if options.json is not None:
+            write_runtime_results(results, options.json)
+        sys.exit(0)
+    results = run_benchmarks(options.only, options.offline, options.repeats,
+                             options.parser)
+    print format_results(results)
+    if options.json is not None:
+        out_file = open(options.json, 'w')
+        json.dump(results, out_file, indent = 1, sort_keys = True)
+        out_file.close()
+    if options.save_baseline:
+        save_baseline(results, options.offline, options.baseline)
+        print 'Baseline saved to ' + options.baseline
+    else:
+        regressions, changed_counts = compare(results,
+                                              load_baseline(options.baseline),
+                                              options.offline,
+                                              options.tolerance)
+        for name, counter, base_count, count in changed_counts:
+            print ('Counter changed: %s %s %d -> %d' %
+                   (name, counter, base_count, count))
+        for name, phase, base_time, time in regressions:
+            print ('REGRESSION: %s %s %.4fs -> %.4fs' %
+                   (name, phase, base_time, time))
+        if regressions:
+            sys.exit(1)
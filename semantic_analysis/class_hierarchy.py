@@ -0,0 +1,111 @@
+"""This module contains the ClassHierarchy, which answers questions about the
+inheritance relationships between the classes and interfaces of a program.
+Since the whole program is compiled at once, and there is no dynamic class
+loading, the hierarchy is known to be complete.  The code generator uses it
+to find method calls which can only ever reach one implementation.
+"""
+from exceptions import SymbolNotFoundError
+
+class ClassHierarchy(object):
+    """Class hierarchy analysis over the classes and interfaces held in the
+    top environment.
+    """
+    def __init__(self, t_env):
+        self._t_env = t_env
+        # Maps each class name to the names of its direct subclasses
+        self._subclasses = dict()
+        for class_s in t_env.classes.values():
+            self._subclasses.setdefault(class_s.name, [])
+            self._subclasses.setdefault(class_s.super_class, [])
+            self._subclasses[class_s.super_class].append(class_s.name)
+
+    def get_subclasses(self, class_name):
+        """Get the names of all direct and indirect subclasses of a class."""
+        subclasses = []
+        to_visit = list(self._subclasses.get(class_name, []))
+        while len(to_visit) != 0:
+            name = to_visit.pop()
+            subclasses.append(name)
+            to_visit.extend(self._subclasses.get(name, []))
+        return subclasses
+
+    def get_interfaces(self, class_name):
+        """Get the names of all interfaces a class implements, including those
+        implemented by its super classes and the super interfaces of those.
+        """
+        interfaces = []
+        class_s = self._get_class_s(class_name)
+        while class_s is not None:
+            for interface in class_s.interfaces:
+                while interface != '' and interface not in interfaces:
+                    interfaces.append(interface)
+                    interface = self._t_env.get_interface_s(
+                        interface).super_interface
+            class_s = self._get_class_s(class_s.super_class)
+        return interfaces
+
+    def get_implementors(self, interface_name):
+        """Get the names of all classes which implement an interface."""
+        return [name for name in self._t_env.classes
+                if interface_name in self.get_interfaces(name)]
+
+    def get_implementation(self, class_name, method_name):
+        """Get the symbols of the class and method which will be invoked when
+        the method is called on an instance of the class.
+        """
+        class_s = self._get_class_s(class_name)
+        while class_s is not None:
+            try:
+                return class_s, class_s.get_method(method_name)
+            except SymbolNotFoundError:
+                class_s = self._get_class_s(class_s.super_class)
+        msg = ('Method "' + method_name + '" is not implemented in class "' +
+               class_name + '".')
+        raise SymbolNotFoundError(msg)
+
+    def is_overridden(self, class_name, method_name):
+        """Check if any subclass of the class declares a method with the given
+        name, which would override the one visible in the class.
+        """
+        for subclass in self.get_subclasses(class_name):
+            try:
+                self._t_env.get_class_s(subclass).get_method(method_name)
+                return True
+            except SymbolNotFoundError:
+                pass
+        return False
+
+    def is_effectively_final(self, class_name, method_name):
+        """Check if a call to the method on an instance of the class can only
+        invoke a single implementation.
+        """
+        method_s = self.get_implementation(class_name, method_name)[1]
+        for modifier in ['private', 'static', 'final']:
+            if modifier in method_s.modifiers:
+                return True
+        return not self.is_overridden(class_name, method_name)
+
+    def get_single_implementation(self, interface_name, method_name):
+        """If every class implementing the interface shares the same
+        implementation of the method, return the symbol of the class it is
+        declared in.  Otherwise return None.
+        """
+        impl_class_s = None
+        implementors = self.get_implementors(interface_name)
+        for class_name in implementors:
+            try:
+                class_s = self.get_implementation(class_name, method_name)[0]
+            except SymbolNotFoundError:
+                # It's implemented in a library class
+                return None
+            if impl_class_s is not None and class_s is not impl_class_s:
+                return None
+            impl_class_s = class_s
+        return impl_class_s
+
+    def _get_class_s(self, class_name):
+        """Get a class symbol, or None if it's a library class."""
+        try:
+            return self._t_env.get_class_s(class_name)
+        except SymbolNotFoundError:
+            return None
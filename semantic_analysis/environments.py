@@ -135,9 +135,29 @@ class TopEnvironment(object):
         """Add a library field symbol to the list."""
         self._lib_fields.append(symbol)
 
+    def swap_lib_symbols(self, lib_symbols):
+        """Replace the library method, field and constructor symbols found
+        so far with those given, and return the ones replaced.
+        """
+        old = (self._lib_methods, self._lib_fields, self._lib_cons)
+        self._lib_methods, self._lib_fields, self._lib_cons = lib_symbols
+        return old
+
+    def _get_lib_methods(self):
+        return self._lib_methods
+
+    def _get_lib_fields(self):
+        return self._lib_fields
+
+    def _get_lib_cons(self):
+        return self._lib_cons
+
     classes = property(get_classes)
     interfaces = property(_get_interfaces)
     lib_classes = property(get_lib_classes)
+    lib_methods = property(_get_lib_methods)
+    lib_fields = property(_get_lib_fields)
+    lib_cons = property(_get_lib_cons)
     types = property(get_types)
     nums = property (get_nums)
 
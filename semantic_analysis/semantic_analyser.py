@@ -1,14 +1,17 @@
 """This module allows for type checking to be performed to check the program is
 semantically correct.
 """
+import multiprocessing
 import os
 import subprocess
+import threading
 from parser_.parser_ import Parser
 import parser_.tree_nodes as nodes
 from symbols import (ArraySymbol, VarSymbol, LibMethodSymbol, LibFieldSymbol,
                      LibConsSymbol)
 from environments import TopEnvironment, Environment
 from class_interface_method_scanner import ClassInterfaceMethodScanner
+from signatures import SignatureLoader, get_dependencies, hash_signature
 from exceptions import (NotInitWarning, NoReturnError, SymbolNotFoundError,
                         MethodSignatureError, DimensionsError,
                         ConstructorError, ClassSignatureError, AssignmentError,
@@ -16,12 +19,43 @@ from exceptions import (NotInitWarning, NoReturnError, SymbolNotFoundError,
                         FinalError)
 from utilities.utilities import (ArrayType, visit, get_full_type, is_main,
                                  get_jvm_type)
+from utilities.profiler import profiler
+
+# The library classes read from the class list, and the output of the library
+# checker indexed by its arguments.  The Java library does not change while the
+# compiler is running, so these are shared by every compile in the process.
+# Entries are only ever added, so at worst two threads run the same check
+_lib_classes = None
+_lib_classes_lock = threading.Lock()
+_lib_checker_outputs = dict()
+# The library checker runs which have been started ahead of time, but whose
+# output has not been read, indexed by their arguments
+_lib_checker_pending = dict()
+_lib_checker_pending_lock = threading.Lock()
+
+# The checker and ASTs used by a worker process when classes are checked in
+# parallel.  They are only set in the workers, by _init_worker, so compiles run
+# at once in different threads each give their own to their workers
+_worker_checker = None
+_worker_asts = None
+
+def clear_lib_checker_cache():
+    """Forget the output of the library checks run so far, so they are run
+    again by the next compile.
+    """
+    _lib_checker_outputs.clear()
 
 class TypeChecker(object):
     """This class allows for type checking of a particular program.
     Also tags nodes in the AST with type information if applicable.
     """
     def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        """Create a new top level environment, so the checker can be used for
+        another program.
+        """
         # Get the possible classes from java.lang and create a top level
         # environment
         lib_classes = self._scan_lib_classes()
@@ -31,24 +65,298 @@ class TypeChecker(object):
         self._get_interface_s = self._t_env.get_interface_s
         # Used to make sure there aren't two main methods
         self._seen_main = False
+        self._is_used = False
 
-    def analyse(self, program):
+    def analyse(self, program, sig_dir = None, jobs = 1,
+                parser_backend = 'earley', ast_cache = None,
+                needs_body = None, is_file = None):
         """Type check a given program as a string, or a program as a
-        text file.
+        text file.  is_file says which program is; if it is not given, it is
+        True when program is the path of a file.  If sig_dir is given,
+        referenced classes which have already been compiled there are not
+        parsed or checked; their symbols are loaded from their signature
+        files instead.  If jobs is more than 1, the classes are checked in
+        that many worker processes.  The program is parsed with the given
+        parser backend.  If an AST cache is given, the parsed and type checked
+        ASTs of files are loaded from it when they are up to date, and stored
+        in it when they are not.  If needs_body is given, the classes the
+        main class refers to are first parsed only for their signatures;
+        needs_body is called with the names of these classes, the references
+        between classes, and the top environment.  It returns the names of
+        those whose bodies are needed, which are then parsed and checked, and
+        the names of any other classes which must be loaded.  The rest are
+        left in the signature_asts of the ASTs returned.
         """
-        p = Parser('file')
-        asts = p.run_parser(program, self._t_env.lib_classes)
-        # Add all global entities (classes and their methods) to the top level
-        # environment
-        self._scanner = ClassInterfaceMethodScanner(self._t_env)
-        self._scanner.scan(asts)
-        for ast in asts:
-            env = Environment(None)
-            visit(self, ast, env)
+        if self._is_used:
+            self._reset()
+        self._is_used = True
+        p = Parser('file', parser_backend)
+        sig_loader = None
+        if sig_dir is not None:
+            sig_loader = SignatureLoader(sig_dir)
+        if is_file is None:
+            is_file = os.path.isfile(program)
+        if is_file:
+            asts = p.parse_file(program, self._t_env.lib_classes, sig_loader,
+                                ast_cache, needs_body is not None)
+        else:
+            asts = p.parse_source(program)
+        prefetched = []
+        if ast_cache is None:
+            # Start the JVM for the library checks which are already known,
+            # so they run while the rest of the program is checked
+            prefetched = self._prefetch_lib_checks(asts)
+        try:
+            if sig_loader is not None:
+                sig_loader.populate(self._t_env)
+            # Add all global entities (classes and their methods) to the top
+            # level environment
+            self._scanner = ClassInterfaceMethodScanner(self._t_env)
+            profiler.start('class scan')
+            try:
+                self._scanner.scan(asts + asts.signature_asts)
+                if needs_body is not None:
+                    self._load_bodies(p, asts, needs_body)
+            finally:
+                profiler.stop()
+            profiler.start('type check')
+            try:
+                to_check = range(len(asts))
+                if ast_cache is not None:
+                    to_check = self._load_checked(asts, ast_cache)
+                    # Only the classes not loaded need the library checks
+                    prefetched = self._prefetch_lib_checks(
+                        [asts[idx] for idx in to_check])
+                if jobs > 1 and len(to_check) > 1:
+                    # Worker processes can't wait for the checks started here
+                    self._finish_lib_checks(prefetched)
+                    self._check_parallel(asts, to_check, jobs, ast_cache)
+                elif ast_cache is not None:
+                    for idx in to_check:
+                        lib_symbols = self._check_alone(asts[idx])
+                        self._merge_lib_symbols(*lib_symbols)
+                        self._store_checked(asts, idx, ast_cache,
+                                            lib_symbols)
+                else:
+                    for ast in asts:
+                        env = Environment(None)
+                        visit(self, ast, env)
+            finally:
+                profiler.stop()
+        finally:
+            # Read the output of any checks which were not needed after all
+            self._finish_lib_checks(prefetched)
         return asts, self._t_env
 
+    def _load_bodies(self, p, asts, needs_body):
+        """Parse the bodies of the classes only parsed for their signatures
+        which needs_body says are needed, and scan the classes their bodies
+        and needs_body refer to, until no more classes are needed.  The
+        classes already scanned need not be scanned again, as their
+        signatures are unchanged.
+        """
+        while True:
+            names = [ast.children[0].value for ast in asts.signature_asts]
+            names, refed_names = needs_body(names, asts.refs, self._t_env)
+            new = p.load_bodies(asts, names, refed_names)
+            if new:
+                self._scanner.scan(new)
+            elif not names:
+                return
+
+    def _prefetch_lib_checks(self, asts):
+        """Start the library checker for each library field referenced
+        through its class, and each library object created without arguments.
+        The arguments of these checks do not depend on the types of any
+        expressions, so they can be found from the ASTs alone.  Returns the
+        arguments of the checks started.
+        """
+        lib_classes = self._t_env.lib_classes
+        prefetched = []
+        to_visit = list(asts)
+        while to_visit:
+            node = to_visit.pop()
+            if node.is_leaf:
+                continue
+            children = node.children
+            args = None
+            if (isinstance(node, nodes.FieldRefNode) and
+                    children[0].value in lib_classes):
+                args = ['-field', lib_classes[children[0].value],
+                        children[1].value]
+            elif (isinstance(node, nodes.ObjectCreatorNode) and
+                    len(children) == 1 and children[0].value in lib_classes):
+                args = ['-cons', lib_classes[children[0].value]]
+            if args is not None:
+                args[1] = args[1].replace('/', '.')
+                try:
+                    if self._start_lib_checker(args):
+                        prefetched.append(tuple(args))
+                except OSError:
+                    # The error is raised when the check is needed
+                    pass
+            to_visit.extend(children)
+        return prefetched
+
+    def _load_checked(self, asts, ast_cache):
+        """Replace each AST whose type checked AST is in the cache, up to
+        date with the signatures of the classes it depends upon, with the
+        cached AST.  Returns the indices of the ASTs still to be checked.
+        """
+        to_check = []
+        for idx, ast in enumerate(asts):
+            entry = None
+            key = self._get_cache_key(asts, idx)
+            if key is not None:
+                entry = ast_cache.load_checked(*key)
+            if entry is None:
+                to_check.append(idx)
+            else:
+                asts[idx], lib_symbols = entry
+                self._merge_lib_symbols(*lib_symbols)
+        return to_check
+
+    def _store_checked(self, asts, idx, ast_cache, lib_symbols):
+        """Store a type checked AST in the cache, along with the library
+        symbols found while checking it.
+        """
+        key = self._get_cache_key(asts, idx)
+        if key is not None:
+            ast_cache.store_checked(key[0], key[1], asts[idx], lib_symbols)
+
+    def _get_cache_key(self, asts, idx):
+        """Get the hash of the source of a class, and the signature hashes
+        of the classes it depends upon, under which its type checked AST is
+        cached.  Returns None if it has no source file.
+        """
+        class_name = asts[idx].children[0].value
+        source_hash = asts.source_hashes.get(class_name)
+        if source_hash is None:
+            return None
+        dep_hashes = dict()
+        for dep in get_dependencies(asts.refs, class_name):
+            symbol = self._t_env.get_class_or_interface_s(dep)
+            dep_hashes[dep] = hash_signature(symbol)
+        return source_hash, dep_hashes
+
+    def _check_alone(self, ast):
+        """Type check a class as though no library symbols had been found
+        yet, and return all those it needs.  The symbols found by the classes
+        checked before it would otherwise be missing.
+        """
+        prev = self._t_env.swap_lib_symbols(([], [], []))
+        try:
+            visit(self, ast, Environment(None))
+        finally:
+            lib_symbols = self._t_env.swap_lib_symbols(prev)
+        return lib_symbols
+
+    def _finish_lib_checks(self, prefetched):
+        """Wait for the library checks started ahead of time to finish."""
+        for key in prefetched:
+            self._get_lib_checker_output(key)
+
+    def _start_lib_checker(self, args):
+        """Start running the library class type checker program with the
+        specified arguments, without waiting for its output.  Returns False
+        if it has already been run, or started.
+        """
+        key = tuple(args)
+        _lib_checker_pending_lock.acquire()
+        try:
+            if key in _lib_checker_outputs or key in _lib_checker_pending:
+                return False
+            file_dir = os.path.dirname(__file__)
+            checker_dir = os.path.join(file_dir, 'lib_checker')
+            cmd = ['java', '-cp', checker_dir, 'LibChecker'] + args
+            _lib_checker_pending[key] = subprocess.Popen(
+                cmd, stdout = subprocess.PIPE)
+            profiler.count('jvm processes')
+            return True
+        finally:
+            _lib_checker_pending_lock.release()
+
+    def _get_lib_checker_output(self, key):
+        """Get the output of the library checker run with the arguments in
+        key, waiting for it if it has been started but not finished.
+        """
+        _lib_checker_pending_lock.acquire()
+        try:
+            process = _lib_checker_pending.pop(key, None)
+        finally:
+            _lib_checker_pending_lock.release()
+        if process is not None:
+            profiler.start('lib check')
+            try:
+                output = process.communicate()[0]
+            finally:
+                profiler.stop()
+            _lib_checker_outputs[key] = output.rstrip(os.linesep)
+        return _lib_checker_outputs.get(key)
+
+    def _check_parallel(self, asts, to_check, jobs, ast_cache = None):
+        """Check the classes in worker processes.  Once the top environment
+        has been built by the scanner, checking a class only reads it, except
+        for the library symbols found, so each class can be checked on its
+        own.  The results are merged back in the order of the ASTs, so the
+        outcome does not depend on which worker finishes first.  Only the
+        ASTs with the indices in to_check are checked; if an AST cache is
+        given, they are stored in it.  Checking only sets the types of the
+        nodes, so a worker sends back just the types, rather than the whole
+        AST, which can be too deep to pickle.
+        """
+        pool = multiprocessing.Pool(min(jobs, len(to_check)), _init_worker,
+                                    (self, asts, profiler.enabled))
+        try:
+            results = pool.map(_check_class, to_check)
+        finally:
+            pool.close()
+            pool.join()
+        for idx, result in zip(to_check, results):
+            error, types, lib_symbols, lib_outputs, counts = result
+            profiler.add_counts(counts)
+            if error is not None:
+                raise error
+            _set_types(asts[idx], types)
+            self._merge_lib_symbols(*lib_symbols)
+            _lib_checker_outputs.update(lib_outputs)
+            if ast_cache is not None:
+                self._store_checked(asts, idx, ast_cache, lib_symbols)
+
+    def _merge_lib_symbols(self, lib_methods, lib_fields, lib_cons):
+        """Add the library symbols found by a worker to the top environment,
+        unless another worker has already found them.
+        """
+        for symbol in lib_methods:
+            try:
+                self._t_env.get_lib_method(symbol.invoked_class, symbol.name,
+                                           symbol.arg_types)
+            except SymbolNotFoundError:
+                self._t_env.add_lib_method(symbol)
+        for symbol in lib_fields:
+            try:
+                self._t_env.get_lib_field(symbol.refed_class, symbol.name)
+            except SymbolNotFoundError:
+                self._t_env.add_lib_field(symbol)
+        for symbol in lib_cons:
+            try:
+                self._t_env.get_lib_cons(symbol.class_, symbol.arg_types)
+            except SymbolNotFoundError:
+                self._t_env.add_lib_cons(symbol)
+
     def _scan_lib_classes(self):
         """Scan classes which can be used from the java library."""
+        global _lib_classes
+        _lib_classes_lock.acquire()
+        try:
+            if _lib_classes is None:
+                _lib_classes = self._read_class_list()
+        finally:
+            _lib_classes_lock.release()
+        return dict(_lib_classes)
+
+    def _read_class_list(self):
+        """Read the names of the java library classes from the class list."""
         root = os.path.dirname(__file__)
         class_list_path = os.path.join(root, 'classlist')
         class_list = open(class_list_path)
@@ -1311,12 +1619,14 @@ class TypeChecker(object):
         """Run the library class type checker program with the
         specified arguments.
         """
-        file_dir = os.path.dirname(__file__)
-        checker_dir = os.path.join(file_dir, 'lib_checker')
-        cmd = ['java', '-cp', checker_dir, 'LibChecker'] + args
-        process = subprocess.Popen(cmd, stdout = subprocess.PIPE)
-        output = process.communicate()[0]
-        output = output.rstrip(os.linesep)
+        key = tuple(args)
+        profiler.count('lib lookups')
+        output = None
+        while output is None:
+            # If another thread is reading the output of the same check, it's
+            # run again
+            self._start_lib_checker(args)
+            output = self._get_lib_checker_output(key)
         # Check for an error
         if output[0] == 'E':
             # Remove leading "E - " from the output
@@ -1368,3 +1678,56 @@ class TypeChecker(object):
             # Remove the leading L and trailing ;
             type_ = jvm_type[1:-1]
         return ArrayType(type_, num_d)
+
+def _init_worker(checker, asts, profiling):
+    """Set the checker and ASTs of the compile in a new worker process.  If
+    profiling is True, the work done in the worker is counted.
+    """
+    global _worker_checker, _worker_asts
+    _worker_checker = checker
+    _worker_asts = asts
+    profiler.reset()
+    profiler.enabled = profiling
+
+def _check_class(idx):
+    """Type check one class in a worker process, and return the error raised,
+    if any, the types of the nodes of the checked AST, the library symbols it
+    needs, the output of the library checker runs, and the counts of the
+    work done.
+    """
+    checker = _worker_checker
+    prev_outputs = set(_lib_checker_outputs)
+    ast = _worker_asts[idx]
+    try:
+        lib_symbols = checker._check_alone(ast)
+    except Exception as error:
+        return error, None, None, None, profiler.take_counts()
+    lib_outputs = dict((key, value) for key, value in
+                       _lib_checker_outputs.iteritems()
+                       if key not in prev_outputs)
+    return (None, _get_types(ast), lib_symbols, lib_outputs,
+            profiler.take_counts())
+
+def _get_types(ast):
+    """Get the types of the nodes of an AST in pre-order.  The AST is walked
+    without recursion, so it can be of any depth.
+    """
+    types = []
+    to_visit = [ast]
+    while to_visit:
+        node = to_visit.pop()
+        types.append(node.type_)
+        if not node.is_leaf:
+            to_visit.extend(reversed(node.children))
+    return types
+
+def _set_types(ast, types):
+    """Set the types of the nodes of an AST to those got by _get_types from
+    an AST of the same shape.
+    """
+    to_visit = [ast]
+    for type_ in types:
+        node = to_visit.pop()
+        node.type_ = type_
+        if not node.is_leaf:
+            to_visit.extend(reversed(node.children))
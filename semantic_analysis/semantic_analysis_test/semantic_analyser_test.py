@@ -1,7 +1,14 @@
 """The test class for the the semantic analysis module."""
 import unittest
 import os
+import shutil
+import subprocess
+import tempfile
+import semantic_analysis.semantic_analyser as semantic_analyser
 from semantic_analysis.semantic_analyser import TypeChecker
+from parser_.parser_ import Parser
+from parser_.ast_cache import ASTCache
+import parser_.tree_nodes as nodes
 from semantic_analysis.exceptions import (NotInitWarning, NoReturnError,
                                           SymbolNotFoundError,
                                           MethodSignatureError,
@@ -11,6 +18,32 @@ from semantic_analysis.exceptions import (NotInitWarning, NoReturnError,
                                           AssignmentError, ObjectCreationError,
                                           ClassSignatureError, StaticError)
 
+# The output of the library checker for System.out
+SYSTEM_OUT = 'java.io.PrintStream|java.lang.System|true'
+
+class FakeLibChecker(object):
+    """Stands in for subprocess.Popen when running the library checker.  It
+    records the arguments of each check started, and gives output as the
+    output of every check.
+    """
+    def __init__(self, output):
+        self.started = []
+        self._output = output
+
+    def __call__(self, cmd, stdout = None):
+        # The arguments follow java -cp checker_dir LibChecker
+        self.started.append(tuple(cmd[4:]))
+        return FakeLibCheckerProcess(self._output)
+
+class FakeLibCheckerProcess(object):
+    """A library checker process which has already finished."""
+    def __init__(self, output):
+        self.returncode = 0
+        self._output = output
+
+    def communicate(self):
+        return self._output + os.linesep, None
+
 class TestSemanticAnalyser(unittest.TestCase):
     def setUp(self):
         unittest.TestCase.setUp(self)
@@ -28,6 +61,83 @@ class TestSemanticAnalyser(unittest.TestCase):
         self.assertEqual(asts[0][1].children[0].value,
                          'test_scan_classes_methods2')
 
+    def test_parallel_deep_ast(self):
+        """Test classes with expressions too deep to pickle are checked in
+        worker processes, with the same types as when checked one at a time.
+        """
+        expr = '1'
+        for _ in range(400):
+            expr = '(1 + ' + expr + ')'
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            out_file = open(os.path.join(tmp_dir, 'A.jml'), 'w')
+            out_file.write('class A { static void main(String[] args) { ' +
+                           'B b = new B(); int x = ' + expr + '; } }')
+            out_file.close()
+            out_file = open(os.path.join(tmp_dir, 'B.jml'), 'w')
+            out_file.write('class B { void f() { int y = ' + expr + '; } }')
+            out_file.close()
+            path = os.path.join(tmp_dir, 'A.jml')
+            asts = TypeChecker().analyse(path)[0]
+            parallel_asts = TypeChecker().analyse(path, jobs = 2)[0]
+            self.assertTrue(nodes.same_ast(list(parallel_asts), list(asts)))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_ast_cache(self):
+        """Test the type checked ASTs of unchanged files are loaded from the
+        AST cache, with the same types as when they are checked.
+        """
+        path = os.path.join(self._file_dir, 'test_scan_classes_methods.jml')
+        cache_dir = tempfile.mkdtemp()
+        try:
+            cache = ASTCache(cache_dir)
+            asts = TypeChecker().analyse(path, ast_cache = cache)[0]
+            self.assertEqual((cache.parse_misses, cache.check_misses), (2, 2))
+            cached_asts = TypeChecker().analyse(path, ast_cache = cache)[0]
+            self.assertEqual((cache.parse_hits, cache.check_hits), (2, 2))
+            self.assertTrue(nodes.same_ast(list(cached_asts), list(asts)))
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_prefetch_lib_checks(self):
+        """Test the library checks which can be found from the ASTs alone
+        are started before the type check, which then waits for them rather
+        than starting them again.
+        """
+        p = ('class X { static void main(String[] args) { ' +
+             'PrintStream ps = System.out; } }')
+        key = ('-field', 'java.lang.System', 'out')
+        checker = FakeLibChecker(SYSTEM_OUT)
+        def check():
+            asts = Parser('file').parse_source(p)
+            self.assertEqual(TypeChecker()._prefetch_lib_checks(asts), [key])
+            self.assertTrue(key in semantic_analyser._lib_checker_pending)
+            TypeChecker().analyse(p)
+        self._with_lib_checker(checker, check)
+        self.assertEqual(checker.started, [key])
+
+    def test_pending_lib_check(self):
+        """Test a library check which has been started is waited for, and
+        its output is kept for later checks.
+        """
+        args = ['-field', 'java.lang.System', 'out']
+        checker = FakeLibChecker(SYSTEM_OUT)
+        def check():
+            type_checker = TypeChecker()
+            self.assertTrue(type_checker._start_lib_checker(args))
+            self.assertFalse(type_checker._start_lib_checker(args))
+            self.assertTrue(tuple(args) in
+                            semantic_analyser._lib_checker_pending)
+            for _ in range(2):
+                self.assertEqual(type_checker._run_lib_checker(args),
+                                 ('java/io/PrintStream', 'java/lang/System',
+                                  True))
+            self.assertFalse(tuple(args) in
+                             semantic_analyser._lib_checker_pending)
+        self._with_lib_checker(checker, check)
+        self.assertEqual(checker.started, [tuple(args)])
+
     def test_extends_pass(self):
         """Test a subclass can be assigned to a superclass."""
         self.analyse_file('test_extends_pass.jml')
@@ -636,6 +746,26 @@ class TestSemanticAnalyser(unittest.TestCase):
                              }
                              """)
 
+    def _with_lib_checker(self, checker, run):
+        """Call run with checker in place of subprocess.Popen, and none of
+        the library checks run by other tests known.
+        """
+        outputs = semantic_analyser._lib_checker_outputs
+        pending = semantic_analyser._lib_checker_pending
+        saved = dict(outputs), dict(pending)
+        outputs.clear()
+        pending.clear()
+        popen = subprocess.Popen
+        subprocess.Popen = checker
+        try:
+            run()
+        finally:
+            subprocess.Popen = popen
+            outputs.clear()
+            outputs.update(saved[0])
+            pending.clear()
+            pending.update(saved[1])
+
     def analyse_file(self, file_name):
         """Helper method to allow the semantic analyser to be run on a
         particular file in the test_files folder.
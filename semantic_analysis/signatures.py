@@ -0,0 +1,262 @@
+"""This module summarises the parts of classes and interfaces which other
+classes can depend upon, so it can be detected when a change to a class
+requires the classes which refer to it to be recompiled.  A change to a method
+body leaves the signature of its class unchanged; a change to the type of a
+field, or the parameters of a method, does not.
+
+The symbols of a class can also be written to a signature file alongside its
+class file, so that other classes can be compiled against it without parsing
+its source again.
+"""
+import hashlib
+import json
+import os
+from symbols import (ClassSymbol, InterfaceSymbol, MethodSymbol,
+                     ConstructorSymbol, ArraySymbol, VarSymbol, FieldSymbol,
+                     ArrayFieldSymbol)
+from utilities.utilities import ArrayType, get_jvm_type
+
+# Increase this whenever the format of signature files changes
+SIGNATURE_VERSION = 1
+
+class SignatureLoader(object):
+    """Loads the symbols of classes which have already been compiled from the
+    signature files in sig_dir, instead of parsing their source.
+    """
+    def __init__(self, sig_dir):
+        self._sig_dir = sig_dir
+        self._symbols = []
+
+    def load(self, class_name, src_dir):
+        """If the signature file of the class is up to date with its source in
+        src_dir, load its symbol and return the names of the classes it refers
+        to.  Otherwise return None, and the class must be parsed.
+        """
+        try:
+            data = json.load(open(get_signature_path(self._sig_dir,
+                                                     class_name)))
+        except (IOError, ValueError):
+            return None
+        source_hash = hash_file(os.path.join(src_dir, class_name + '.jml'))
+        if (data.get('version') != SIGNATURE_VERSION or
+                data.get('source') != source_hash):
+            return None
+        self._symbols.append(symbol_from_dict(data['symbol']))
+        return [str(ref) for ref in data['refs']]
+
+    def populate(self, t_env):
+        """Add the types and symbols of the loaded classes and interfaces to
+        the top environment.
+        """
+        for symbol in self._symbols:
+            t_env.add_type(symbol.name)
+        for symbol in self._symbols:
+            if isinstance(symbol, ClassSymbol):
+                t_env.put_class_s(symbol)
+            else:
+                t_env.put_interface_s(symbol)
+
+    def _get_symbols(self):
+        return self._symbols
+
+    symbols = property(_get_symbols)
+
+def get_signature_path(sig_dir, class_name):
+    """Get the path of the signature file of a class."""
+    return os.path.join(sig_dir, class_name + '.jsig')
+
+def write_signature(sig_dir, symbol, source_hash, refs):
+    """Write the signature file of a class or interface, which records the
+    hash of the source it was compiled from, and the classes it refers to.
+    """
+    data = {'version': SIGNATURE_VERSION, 'source': source_hash,
+            'refs': refs, 'symbol': symbol_to_dict(symbol)}
+    out_file = open(get_signature_path(sig_dir, symbol.name), 'w')
+    json.dump(data, out_file, sort_keys = True)
+    out_file.close()
+
+def hash_file(path):
+    """Get the hash of the contents of a file, or None if it can't be read."""
+    try:
+        in_file = open(path, 'rb')
+    except IOError:
+        return None
+    try:
+        return hashlib.sha1(in_file.read()).hexdigest()
+    finally:
+        in_file.close()
+
+def symbol_to_dict(symbol):
+    """Convert a class or interface symbol, and its members, to a dict which
+    can be written as JSON.
+    """
+    data = {'name': symbol.name,
+            'methods': [_method_to_dict(method) for method in symbol.methods]}
+    if isinstance(symbol, ClassSymbol):
+        data['kind'] = 'class'
+        data['modifiers'] = _get_modifiers(symbol)
+        data['super_class'] = symbol.super_class
+        data['interfaces'] = symbol.interfaces
+        data['fields'] = [{'name': field.name, 'modifiers': field.modifiers,
+                           'type': _type_to_json(field.type_)}
+                          for field in symbol.fields]
+        data['constructor'] = None
+        if symbol.constructor is not None:
+            cons = symbol.constructor
+            data['constructor'] = {'modifiers': _get_modifiers(cons),
+                                   'params': _params_to_json(cons.params)}
+    else:
+        data['kind'] = 'interface'
+        data['super_interface'] = symbol.super_interface
+    return data
+
+def symbol_from_dict(data):
+    """Create a class or interface symbol from a dict made by
+    symbol_to_dict.
+    """
+    name = str(data['name'])
+    if data['kind'] == 'class':
+        symbol = ClassSymbol(name)
+        symbol.modifiers = [str(mod) for mod in data['modifiers']]
+        symbol.super_class = str(data['super_class'])
+        for interface in data['interfaces']:
+            symbol.add_interface(str(interface))
+        for field in data['fields']:
+            type_ = _type_from_json(field['type'])
+            if isinstance(type_, ArrayType):
+                field_s = ArrayFieldSymbol(str(field['name']), type_,
+                                           type_.dimensions)
+            else:
+                field_s = FieldSymbol(str(field['name']), type_)
+            field_s.modifiers = [str(mod) for mod in field['modifiers']]
+            symbol.add_field(field_s)
+        cons = data['constructor']
+        if cons is not None:
+            symbol.constructor = ConstructorSymbol(
+                name, _params_from_json(cons['params']))
+            symbol.constructor.modifiers = [str(mod)
+                                            for mod in cons['modifiers']]
+    else:
+        symbol = InterfaceSymbol(name)
+        symbol.super_interface = str(data['super_interface'])
+    for method in data['methods']:
+        method_s = MethodSymbol(str(method['name']),
+                                _type_from_json(method['type']),
+                                _params_from_json(method['params']))
+        method_s.modifiers = [str(mod) for mod in method['modifiers']]
+        symbol.add_method(method_s)
+    return symbol
+
+def _method_to_dict(method_s):
+    return {'name': method_s.name, 'modifiers': _get_modifiers(method_s),
+            'type': _type_to_json(method_s.type_),
+            'params': _params_to_json(method_s.params)}
+
+def _params_to_json(params):
+    return [[param.name, _type_to_json(param.type_)] for param in params]
+
+def _params_from_json(params):
+    """Create the variable symbols of a method or constructor's
+    parameters.
+    """
+    symbols = []
+    for name, type_ in params:
+        type_ = _type_from_json(type_)
+        if isinstance(type_, ArrayType):
+            symbols.append(ArraySymbol(str(name), type_, type_.dimensions))
+        else:
+            symbols.append(VarSymbol(str(name), type_))
+    return symbols
+
+def _type_to_json(type_):
+    """Array types are stored as a [type, dimensions] list."""
+    if isinstance(type_, ArrayType):
+        return [type_.type_, type_.dimensions]
+    return type_
+
+def _type_from_json(type_):
+    if isinstance(type_, list):
+        return ArrayType(str(type_[0]), type_[1])
+    return str(type_)
+
+def get_signature(symbol):
+    """Get the text of the signature of a class or interface symbol: its
+    super types, and the types of all its members which are not private.
+    """
+    lines = []
+    if isinstance(symbol, ClassSymbol):
+        lines.append('class ' + symbol.name + ' ' +
+                     ' '.join(_get_modifiers(symbol)))
+        lines.append('extends ' + str(symbol.super_class))
+        lines.append('implements ' + ' '.join(symbol.interfaces))
+        cons = symbol.constructor
+        if cons is not None:
+            lines.append('<init>' + _get_params_descriptor(cons))
+        for field in symbol.fields:
+            if 'private' not in field.modifiers:
+                lines.append('field ' + ' '.join(field.modifiers) + ' ' +
+                             field.name + ' ' + get_jvm_type(field))
+    else:
+        lines.append('interface ' + symbol.name)
+        lines.append('extends ' + symbol.super_interface)
+    for method in symbol.methods:
+        if 'private' not in _get_modifiers(method):
+            lines.append('method ' + ' '.join(_get_modifiers(method)) + ' ' +
+                         method.name + _get_params_descriptor(method) +
+                         get_jvm_type(method))
+    return '\n'.join(lines)
+
+def get_dependencies(refs, class_name):
+    """Get the names of all the classes a class refers to, directly or
+    through the classes it refers to, given the names of the classes each
+    class refers to.
+    """
+    deps = []
+    to_visit = list(refs.get(class_name, []))
+    while to_visit:
+        name = to_visit.pop()
+        if name not in deps and name != class_name:
+            deps.append(name)
+            to_visit.extend(refs.get(name, []))
+    return deps
+
+def hash_signature(symbol):
+    """Get a hash of the signature of a class or interface symbol."""
+    return hashlib.sha1(get_signature(symbol)).hexdigest()
+
+def hash_hierarchy(t_env):
+    """Get a hash of the inheritance relationships between all the classes and
+    interfaces in the top environment, and the names and modifiers of the
+    methods declared in each.  The methods which calls can be devirtualized to
+    depend on all of these, rather than on the classes a class refers to.
+    """
+    lines = []
+    for name in sorted(t_env.classes.keys()):
+        class_s = t_env.classes[name]
+        lines.append(name + ' ' + str(class_s.super_class) + ' ' +
+                     ' '.join(class_s.interfaces))
+        lines.extend(_get_method_names(class_s))
+    for name in sorted(t_env.interfaces.keys()):
+        interface_s = t_env.interfaces[name]
+        lines.append(name + ' ' + interface_s.super_interface)
+        lines.extend(_get_method_names(interface_s))
+    return hashlib.sha1('\n'.join(lines)).hexdigest()
+
+def _get_method_names(symbol):
+    """Get a line for each method of a class or interface, holding its name
+    and modifiers.
+    """
+    return ['\t' + method.name + ' ' + ' '.join(_get_modifiers(method))
+            for method in symbol.methods]
+
+def _get_params_descriptor(method_s):
+    """Get the JVM types of a method or constructor's parameters."""
+    return '(' + ''.join([get_jvm_type(param)
+                          for param in method_s.params]) + ')'
+
+def _get_modifiers(symbol):
+    """Get the modifiers of a symbol, interface methods have none."""
+    try:
+        return symbol.modifiers
+    except AttributeError:
+        return []
@@ -5,6 +5,7 @@ from semantic_analysis.semantic_analysis_test.semantic_analyser_test \
     import TestSemanticAnalyser
 from code_generation.code_generation_test.code_generator_test \
     import TestCodeGenerator
+from jaml_server_test import TestJamlServer
 
 if __name__ == '__main__':
     print 'running tests, this can take some time (over a minute)'
@@ -12,9 +13,10 @@ if __name__ == '__main__':
     parser_suite = unittest.makeSuite(TestParser, 'test')
     semantic_analyser_suite = unittest.makeSuite(TestSemanticAnalyser, 'test')
     code_generator_suite = unittest.makeSuite(TestCodeGenerator, 'test')
+    jaml_server_suite = unittest.makeSuite(TestJamlServer, 'test')
     # Combine all the suites into one suite
     all_suites = unittest.TestSuite((parser_suite, semantic_analyser_suite,
-                                     code_generator_suite))
+                                     code_generator_suite, jaml_server_suite))
     # Create a runner and use it to run all the tests in all the combined suites
     runner = unittest.TextTestRunner()
     runner.run(all_suites)
\ No newline at end of file
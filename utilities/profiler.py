@@ -0,0 +1,142 @@
+"""This module contains the Profiler, which records how long each phase of a
+compile takes, and counts of the work done in it.  The compiler reports to the
+single profiler instance in this module, which does nothing until it is
+enabled, so normal compiles are not slowed down.
+
+Phases can be nested, for example the library checks run during type
+checking; the time and memory of a phase do not include those of the phases
+nested in it.  Worker processes (see the jobs option of the CodeGenerator)
+send the counts of the work they do back with their results, to be added to
+the counts of the compile; their time is part of the phase which started
+them.
+"""
+import json
+import resource
+import time
+
+# The phases of a compile, in the order they are reported
+PHASES = ['scan', 'parse', 'class scan', 'type check', 'lib check',
+          'codegen', 'assembly']
+
+class Profiler(object):
+    """Records the time spent in each phase of a compile, how much the peak
+    memory use of the process grew during each phase, and counts of events
+    such as the number of tokens scanned.  It is not thread safe, so should
+    only be used for a single compile at a time.
+    """
+    def __init__(self):
+        self._enabled = False
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        # The total time spent in each phase, in seconds
+        self._times = dict()
+        # How much the peak memory use of the process grew during each
+        # phase, in KB
+        self._memory = dict()
+        self._counts = dict()
+        # The phases currently running, innermost last
+        self._stack = []
+        # When the innermost phase was started, or resumed
+        self._started = None
+        # The peak memory use of the process at that time
+        self._peak = None
+
+    def start(self, phase):
+        """Start timing a phase, pausing the phase it's nested in."""
+        if not self._enabled:
+            return
+        now = time.time()
+        peak = self._get_peak()
+        if self._stack:
+            self._add_time(self._stack[-1], now)
+            self._add_memory(self._stack[-1], peak)
+        self._stack.append(phase)
+        self._started = now
+        self._peak = peak
+
+    def stop(self):
+        """Stop timing the innermost phase, and resume the one it's nested
+        in.
+        """
+        if not self._enabled or not self._stack:
+            return
+        now = time.time()
+        peak = self._get_peak()
+        phase = self._stack.pop()
+        self._add_time(phase, now)
+        self._add_memory(phase, peak)
+        self._started = now
+        self._peak = peak
+
+    def count(self, name, amount = 1):
+        """Add to the count of an event."""
+        if self._enabled:
+            self._counts[name] = self._counts.get(name, 0) + amount
+
+    def take_counts(self):
+        """Get the counts recorded since they were last taken, and start
+        counting again from zero.  A worker process sends these back with its
+        results.
+        """
+        counts = self._counts
+        self._counts = dict()
+        return counts
+
+    def add_counts(self, counts):
+        """Add counts taken from the profiler of a worker process."""
+        for name, amount in counts.iteritems():
+            self.count(name, amount)
+
+    def to_dict(self):
+        """Get everything recorded as a dict, which can be written as JSON."""
+        phases = [phase for phase in PHASES if phase in self._times]
+        phases += sorted(phase for phase in self._times if phase not in PHASES)
+        return {'phases': [{'name': phase, 'time': self._times[phase],
+                            'memory_growth_kb': self._memory.get(phase, 0)}
+                           for phase in phases],
+                'total_time': sum(self._times.values()),
+                'counts': self._counts}
+
+    def write_json(self, path):
+        """Write everything recorded to a JSON file."""
+        out_file = open(path, 'w')
+        json.dump(self.to_dict(), out_file, indent = 1, sort_keys = True)
+        out_file.close()
+
+    def summary(self):
+        """Get a human readable summary of everything recorded."""
+        data = self.to_dict()
+        lines = ['%-12s %10s %16s' % ('Phase', 'Time (s)',
+                                      'Mem growth (KB)')]
+        for phase in data['phases']:
+            lines.append('%-12s %10.4f %16d' % (phase['name'], phase['time'],
+                                                 phase['memory_growth_kb']))
+        lines.append('%-12s %10.4f' % ('total', data['total_time']))
+        lines.append('')
+        lines.append('%-20s %10s' % ('Counter', 'Value'))
+        for name in sorted(data['counts']):
+            lines.append('%-20s %10d' % (name, data['counts'][name]))
+        return '\n'.join(lines)
+
+    def _add_time(self, phase, now):
+        self._times[phase] = self._times.get(phase, 0) + now - self._started
+
+    def _add_memory(self, phase, peak):
+        # The peak never goes down, so only its growth belongs to the phase
+        self._memory[phase] = self._memory.get(phase, 0) + peak - self._peak
+
+    def _get_peak(self):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def _get_enabled(self):
+        return self._enabled
+
+    def _set_enabled(self, enabled):
+        self._enabled = enabled
+
+    enabled = property(_get_enabled, _set_enabled)
+
+# The profiler the compiler reports to
+profiler = Profiler()
@@ -1,6 +1,7 @@
 """An assortment of classes and scripts used throughout the program."""
 import re
 import parser_.tree_nodes as nodes
+from profiler import profiler
 
 class ArrayType(object):
     """A special type representing arrays."""
@@ -72,6 +73,7 @@ def visit(source_object, node, env = None):
     Code from: http://peter-hoffmann.com/2010
     extrinsic-visitor-pattern-python-inheritance.html
     """
+    profiler.count('visits')
     method = None
     # Search through super classes of the nodes type
     for class_ in node.__class__.__mro__: